@@ -0,0 +1,112 @@
+"""
+Benchmark the memory used by CPIX objects
+
+Creates the requested number of each model class from values made
+beforehand, so only the objects themselves are counted, and reports the
+bytes allocated per object as traced by tracemalloc. Also reports the memory
+held by a parsed document with a Widevine DRM system and a usage rule per
+content key, and by its content keys parsed into a ContentKeyList and a
+ContentKeyTable
+"""
+import argparse
+import gc
+import os
+import tracemalloc
+import uuid
+from base64 import b64encode
+from datetime import datetime, timezone
+import cpix
+from bench_parse import make_cpix
+
+
+def traced(make):
+    """
+    Returns what make() returns and the bytes allocated by it which are
+    still in use
+    """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = make()
+        gc.collect()
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return result, after - before
+
+
+def factories(count):
+    """
+    Returns a list of (name, function making count objects of that class)
+    """
+    kids = [uuid.UUID(bytes=os.urandom(16)) for _ in range(count)]
+    ceks = [b64encode(os.urandom(16)).decode("ascii") for _ in range(count)]
+    pssh = b64encode(os.urandom(64)).decode("ascii")
+    certificate = b64encode(os.urandom(256)).decode("ascii")
+    cipher_value = b64encode(os.urandom(64)).decode("ascii")
+    period_ids = ["period{}".format(i) for i in range(count)]
+    start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    end = datetime(2020, 1, 2, tzinfo=timezone.utc)
+    filters = [cpix.VideoFilter(max_pixels=442368) for _ in range(count)]
+
+    return [
+        ("ContentKey", lambda: [
+            cpix.ContentKey(kid, cek) for kid, cek in zip(kids, ceks)]),
+        ("DRMSystem", lambda: [
+            cpix.DRMSystem(kid, cpix.WIDEVINE_SYSTEM_ID, pssh)
+            for kid in kids]),
+        ("Period", lambda: [
+            cpix.Period(period_id, start=start, end=end)
+            for period_id in period_ids]),
+        ("UsageRule", lambda: [
+            cpix.UsageRule(kid, [filter])
+            for kid, filter in zip(kids, filters)]),
+        ("VideoFilter", lambda: [
+            cpix.VideoFilter(max_pixels=442368) for _ in range(count)]),
+        ("LabelFilter", lambda: [
+            cpix.LabelFilter(period_id) for period_id in period_ids]),
+        ("DeliveryKey", lambda: [
+            cpix.DeliveryKey(certificate) for _ in range(count)]),
+        ("DocumentKey", lambda: [
+            cpix.DocumentKey(cipher_value) for _ in range(count)]),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--count",
+        type=int,
+        default=10000,
+        help="number of objects of each class")
+    parser.add_argument(
+        "--keys",
+        type=int,
+        default=10000,
+        help="number of content keys in the parsed document")
+    args = parser.parse_args()
+
+    # the list holding the objects is allocated by make() too
+    _, list_size = traced(lambda: [None for _ in range(args.count)])
+
+    for name, make in factories(args.count):
+        _, size = traced(make)
+        print("{name:<24} {size:8.1f} bytes per object".format(
+            name=name, size=(size - list_size) / args.count))
+
+    xml = make_cpix(args.keys).pretty_print()
+    _, size = traced(lambda: cpix.CPIX.parse(xml, trusted=True))
+    print("{name:<24} {size:8.1f} bytes per key".format(
+        name="CPIX.parse trusted", size=size / args.keys))
+
+    content_keys = cpix.CPIX.parse(xml).content_keys.element()
+    for name, cls in (("ContentKeyList.parse", cpix.ContentKeyList),
+                      ("ContentKeyTable.parse", cpix.ContentKeyTable)):
+        _, size = traced(lambda: cls.parse(content_keys, trusted=True))
+        print("{name:<24} {size:8.1f} bytes per key".format(
+            name=name, size=size / args.keys))
+
+
+if (__name__ == "__main__"):
+    main()
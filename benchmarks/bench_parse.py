@@ -0,0 +1,71 @@
+"""
+Benchmark parsing of large CPIX documents
+
+Generates a CPIX document with the requested number of content keys, each
+with a Widevine DRM system and a usage rule, and times parsing it with and
+without trusted=True
+"""
+import argparse
+import os
+import timeit
+import uuid
+from base64 import b64encode
+import cpix
+
+
+def make_cpix(keys):
+    """
+    Make a CPIX document with the given number of keys
+    """
+    kids = [uuid.UUID(bytes=os.urandom(16)) for _ in range(keys)]
+    pssh = b64encode(os.urandom(64)).decode("ascii")
+
+    return cpix.CPIX(
+        content_keys=cpix.ContentKeyList([
+            cpix.ContentKey(
+                kid=kid,
+                cek=b64encode(os.urandom(16)).decode("ascii"))
+            for kid in kids
+        ]),
+        drm_systems=cpix.DRMSystemList([
+            cpix.DRMSystem(
+                kid=kid,
+                system_id=cpix.WIDEVINE_SYSTEM_ID,
+                pssh=pssh)
+            for kid in kids
+        ]),
+        usage_rules=cpix.UsageRuleList([
+            cpix.VideoUsageRule(kid=kid) for kid in kids
+        ])
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--keys",
+        type=int,
+        default=10000,
+        help="number of content keys in the document")
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="number of times to repeat each measurement")
+    args = parser.parse_args()
+
+    xml = make_cpix(args.keys).pretty_print()
+
+    print("{keys} keys, {size} bytes".format(keys=args.keys, size=len(xml)))
+
+    for name, kwargs in (("CPIX.parse", {}),
+                         ("CPIX.parse trusted", {"trusted": True})):
+        best = min(timeit.repeat(
+            lambda: cpix.CPIX.parse(xml, **kwargs),
+            number=1,
+            repeat=args.repeat))
+        print("{name:<24} {best:8.3f}s".format(name=name, best=best))
+
+
+if (__name__ == "__main__"):
+    main()
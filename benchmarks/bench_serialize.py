@@ -0,0 +1,43 @@
+"""
+Benchmark serializing CPIX documents with the lxml and fast backends
+
+Generates CPIX documents with each of the requested numbers of content keys,
+each key with a Widevine DRM system and a usage rule, and times
+CPIX.to_bytes() with both backends
+"""
+import argparse
+import timeit
+from bench_parse import make_cpix
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--keys",
+        type=int,
+        nargs="+",
+        default=[100, 10000, 100000],
+        help="numbers of content keys in the documents")
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="number of times to repeat each measurement")
+    args = parser.parse_args()
+
+    for keys in args.keys:
+        document = make_cpix(keys)
+        size = len(document.to_bytes(backend="fast"))
+        print("{keys} keys, {size} bytes".format(keys=keys, size=size))
+
+        for backend in ("lxml", "fast"):
+            best = min(timeit.repeat(
+                lambda: document.to_bytes(backend=backend),
+                number=1,
+                repeat=args.repeat))
+            print("{name:<24} {best:8.3f}s".format(
+                name="to_bytes " + backend, best=best))
+
+
+if (__name__ == "__main__"):
+    main()
@@ -6,7 +6,9 @@ from lxml import etree
 from base64 import b64decode
 from binascii import Error as BinasciiError
 import pkg_resources
-import sys
+from . import parser
+from . import compression
+from .parser import fromstring
 
 
 CPIX_SCHEMA_DOC = pkg_resources.resource_stream("cpix", "schema/cpix.xsd")
@@ -33,8 +35,9 @@ PSKC = "urn:ietf:params:xml:ns:keyprov:pskc"
 XSI = "http://www.w3.org/2001/XMLSchema-instance"
 DS = "http://www.w3.org/2000/09/xmldsig#"
 ENC = "http://www.w3.org/2001/04/xmlenc#"
+CPIX_NS = "urn:dashif:org:cpix"
 NSMAP = {
-    None: "urn:dashif:org:cpix",
+    None: CPIX_NS,
     "xsi": XSI,
     "pskc": PSKC,
     "ds": DS,
@@ -48,19 +51,30 @@ DOCUMENT_KEY_WRAPPING_ALGORITHM = \
 ENCRYPTED_KEY_MAC_ALGORITHM = \
     "http://www.w3.org/2001/04/xmldsig-more#hmac-sha512"
 
-def parse(xml):
+# Clark notation tag (both in the CPIX namespace and without a namespace) to
+# the class which parses that element, filled in once the classes are defined
+TAG_CLASSES = {}
+
+def parse(xml, **kwargs):
     """
     Parse function, does an initial read to figure out the root element then
     attempts to call the relevant parser
+
+    Keyword arguments, e.g. trusted=True, are passed on to that parser
     """
     if isinstance(xml, (str, bytes)):
-        xml = etree.fromstring(xml)
+        xml = fromstring(xml)
     if not isinstance(xml, etree._Element):
         raise TypeError("not valid xml")
 
-    tag = etree.QName(xml).localname
+    cls = TAG_CLASSES.get(xml.tag)
+    if cls is None:
+        # element in another namespace, fall back to the local name
+        cls = TAG_CLASSES.get(etree.QName(xml).localname)
+    if cls is None:
+        raise ValueError("unknown element: {tag}".format(tag=xml.tag))
 
-    return getattr(sys.modules[__name__], tag).parse(xml)
+    return cls.parse(xml, **kwargs)
 
 
 def validate(xml):
@@ -70,7 +84,7 @@ def validate(xml):
     Returns a tuple of valid true/false and if false the error(s)
     """
     if isinstance(xml, (str, bytes)):
-        xml = etree.fromstring(xml)
+        xml = fromstring(xml)
     if not isinstance(xml, etree._Element):
         raise TypeError("not valid xml")
 
@@ -81,9 +95,40 @@ def validate(xml):
     return (True, "")
 
 
+def _parse_file(source):
+    """
+    Parse a filename, path-like object, file object or mmap, letting lxml
+    read from it directly rather than from an in-memory copy. gzip, xz and
+    bz2 compressed files are decompressed as they are read
+    """
+    with compression.open_read(source) as stream:
+        return parser.parse(stream)
+
+
+def parse_file(source, **kwargs):
+    """
+    Parse a CPIX file, source can be a filename, path-like object, file
+    object or mmap, and may be gzip, xz or bz2 compressed
+
+    Keyword arguments are passed on as for parse
+    """
+    return parse(_parse_file(source), **kwargs)
+
+
+def validate_file(source):
+    """
+    Validate a CPIX file against the schema, source can be a filename,
+    path-like object, file object or mmap, and may be compressed
+
+    Returns a tuple of valid true/false and if false the error(s)
+    """
+    return validate(_parse_file(source))
+
+
 from .delivery_data import DeliveryData, DeliveryDataList, DeliveryKey,\
     DocumentKey, MACMethod
 from .content_key import ContentKey, ContentKeyList
+from .content_key_table import ContentKeyTable
 from .drm_system import DRMSystem, DRMSystemList
 from .filters import AudioFilter, BitrateFilter, VideoFilter, KeyPeriodFilter,\
     LabelFilter
@@ -91,4 +136,30 @@ from .usage_rule import UsageRule, UsageRuleList, AudioUsageRule, \
     VideoUsageRule, SDVideoUsageRule, HDVideoUsageRule, UHD1VideoUsageRule, \
     UHD2VideoUsageRule
 from .period import Period, PeriodList
-from .cpix import CPIX
+from .cpix import CPIX, CPIXWriter
+
+for _cls, _tag in ((CPIX, "CPIX"),
+                   (DeliveryDataList, "DeliveryDataList"),
+                   (DeliveryData, "DeliveryData"),
+                   (DeliveryKey, "DeliveryKey"),
+                   (DocumentKey, "DocumentKey"),
+                   (MACMethod, "MACMethod"),
+                   (ContentKeyList, "ContentKeyList"),
+                   (ContentKey, "ContentKey"),
+                   (DRMSystemList, "DRMSystemList"),
+                   (DRMSystem, "DRMSystem"),
+                   (PeriodList, "ContentKeyPeriodList"),
+                   (Period, "ContentKeyPeriod"),
+                   (UsageRuleList, "ContentKeyUsageRuleList"),
+                   (UsageRule, "ContentKeyUsageRule"),
+                   (KeyPeriodFilter, "KeyPeriodFilter"),
+                   (LabelFilter, "LabelFilter"),
+                   (VideoFilter, "VideoFilter"),
+                   (AudioFilter, "AudioFilter"),
+                   (BitrateFilter, "BitrateFilter")):
+    TAG_CLASSES[_tag] = _cls
+    TAG_CLASSES["{{{ns}}}{tag}".format(ns=CPIX_NS, tag=_tag)] = _cls
+del _cls, _tag
+
+from .streaming import iterparse, CPIXFeedParser
+from .batch import BatchResult, parse_many, validate_many
@@ -0,0 +1,124 @@
+"""
+Asyncio API, parsing, validation and serialization run in an executor so
+large documents do not block the event loop
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from . import etree, parse, validate, parser
+
+DEFAULT_MAX_WORKERS = 4
+# size of reads from stream sources with a read() coroutine
+CHUNK_SIZE = 64 * 1024
+
+_executor = None
+
+
+def get_executor():
+    """
+    Returns the executor used when none is passed, by default a thread pool
+    of DEFAULT_MAX_WORKERS threads created on first use
+    """
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=DEFAULT_MAX_WORKERS, thread_name_prefix="cpix")
+    return _executor
+
+
+def set_executor(executor):
+    """
+    Set the executor used when none is passed, None restores the default
+    """
+    global _executor
+    _executor = executor
+
+
+async def _run(executor, function, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        executor or get_executor(), partial(function, *args, **kwargs))
+
+
+def _is_stream(source):
+    return hasattr(source, "read") or hasattr(source, "__aiter__")
+
+
+async def _chunks(source):
+    if hasattr(source, "__aiter__"):
+        async for chunk in source:
+            yield chunk
+    else:
+        while True:
+            chunk = await source.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+
+def _new_feed_parser():
+    return etree.XMLParser(**parser.settings.options())
+
+
+async def _from_stream(source, function, **kwargs):
+    """
+    Feed an async byte stream to an XML parser as it arrives and return
+    function called with the root element and keyword arguments
+
+    lxml parsers and the trees they build can't be shared between threads,
+    so the parser is created, fed and closed and the tree used in a thread
+    of its own rather than in whichever thread of the executor is free
+    """
+    with ThreadPoolExecutor(max_workers=1,
+                            thread_name_prefix="cpix-feed") as feeder:
+        feed_parser = await _run(feeder, _new_feed_parser)
+        async for chunk in _chunks(source):
+            await _run(feeder, feed_parser.feed, chunk)
+        root = await _run(feeder, feed_parser.close)
+        return await _run(feeder, function, root, **kwargs)
+
+
+async def aparse(source, executor=None, **kwargs):
+    """
+    Coroutine version of cpix.parse
+
+    source can be anything cpix.parse accepts, an async iterable of bytes
+    or an object with a read() coroutine such as an asyncio.StreamReader,
+    which is parsed in a thread of its own rather than by the executor.
+    Keyword arguments are passed on to cpix.parse
+    """
+    if _is_stream(source):
+        return await _from_stream(source, parse, **kwargs)
+    return await _run(executor, parse, source, **kwargs)
+
+
+async def avalidate(source, executor=None):
+    """
+    Coroutine version of cpix.validate, takes the same sources as aparse
+
+    Returns a tuple of valid true/false and if false the error(s)
+    """
+    if _is_stream(source):
+        return await _from_stream(source, validate)
+    return await _run(executor, validate, source)
+
+
+async def aserialize(cpix, executor=None, **kwargs):
+    """
+    Coroutine version of pretty_print on any CPIX object, keyword arguments
+    are passed on to pretty_print
+    """
+    return await _run(executor, cpix.pretty_print, **kwargs)
+
+
+async def awrite(cpix, writer, executor=None, **kwargs):
+    """
+    Serialize a CPIX object and write it to writer, e.g. an
+    asyncio.StreamWriter, waiting for it to drain
+    """
+    data = await aserialize(cpix, executor, **kwargs)
+    result = writer.write(data)
+    if asyncio.iscoroutine(result):
+        await result
+    if hasattr(writer, "drain"):
+        await writer.drain()
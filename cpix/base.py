@@ -1,33 +1,674 @@
 """
 Base classes to be extended
 """
+import hashlib
+import json
+import uuid
+import weakref
 from abc import abstractmethod, ABC
-from collections.abc import MutableSequence
+from base64 import b64decode, b64encode
+from binascii import Error as BinasciiError
+from collections.abc import Mapping, MutableSequence
 from lxml import etree
+from . import NSMAP
+from .parser import fromstring
+
+# types of raw binary values, which are stored without copying
+BINARY_TYPES = (bytes, bytearray, memoryview)
+# lists whose items are written in key ID order in canonical XML
+KID_LISTS = ("ContentKeyList", "DRMSystemList", "ContentKeyUsageRuleList")
+
+
+def normalize_kids(kids):
+    """
+    Convert an iterable of key IDs (strings or UUIDs) to a set of lower case
+    hyphenated strings, the form kid attributes are normally written in
+    """
+    return {str(kid if isinstance(kid, uuid.UUID) else uuid.UUID(kid))
+            for kid in kids}
+
+
+def kid_selected(element, kids):
+    """
+    Check if the kid attribute of an element is in a set of key IDs from
+    normalize_kids, without building a UUID for the usual form
+    """
+    kid = element.get("kid", "").lower()
+    if kid in kids:
+        return True
+    if len(kid) != 36:
+        # e.g. without hyphens or in braces
+        try:
+            return str(uuid.UUID(kid)) in kids
+        except ValueError:
+            return False
+    return False
+
+
+class Base64Bytes(bytes):
+    """
+    Base64 set as ASCII bytes rather than text, told apart from raw bytes
+    so it reads back as it was set
+    """
+    __slots__ = ()
+
+
+def base64_value(value):
+    """Returns a checked base64 str or bytes value as it is stored"""
+    if isinstance(value, bytes):
+        return Base64Bytes(value)
+    return value
+
+
+def to_base64(value):
+    """
+    Returns a binary value stored as raw bytes or base64 as base64, encoding
+    it only if it is raw bytes. Base64 set as bytes is returned as bytes
+    """
+    if value is None or isinstance(value, (str, Base64Bytes)):
+        return value
+    return b64encode(value).decode("ascii")
+
+
+def to_bytes(value):
+    """
+    Returns a binary value stored as raw bytes or base64 as bytes, decoding
+    it only if it is base64
+    """
+    if isinstance(value, (str, Base64Bytes)):
+        return b64decode(value)
+    return value
+
+
+def check_bytes(value, name, optional=True):
+    """
+    Check a raw bytes value set by a *_bytes property, None is allowed if
+    optional is True
+    """
+    if not (optional and value is None or isinstance(value, BINARY_TYPES)):
+        raise TypeError("{name} should be bytes, bytearray or "
+                        "memoryview".format(name=name))
+    return value
+
+
+def picklable(value):
+    """Returns a stored value as something pickle can handle"""
+    if isinstance(value, memoryview):
+        return bytes(value)
+    return value
+
+
+def as_text(value):
+    """
+    Returns a value as the text it is written as in XML, base64 values may
+    be given as ASCII bytes
+    """
+    if isinstance(value, bytes):
+        return value.decode("ascii")
+    return value
+
+
+def record_columns(records, length):
+    """
+    Transpose an iterable of records, tuples of 1 to length values, to a list
+    of length columns, padding short records with None
+    """
+    rows = [tuple(record) for record in records]
+    lengths = set(map(len, rows))
+    if lengths and not lengths <= set(range(1, length + 1)):
+        index = next(index for index, row in enumerate(rows)
+                     if not 1 <= len(row) <= length)
+        raise ValueError(
+            "record {index}: should have 1 to {length} values".format(
+                index=index, length=length))
+    if lengths and min(lengths) < length:
+        rows = [row + (None,) * (length - len(row)) for row in rows]
+    return list(zip(*rows)) or [()] * length
+
+
+def convert_column(values, convert, *args):
+    """
+    Returns [convert(value, *args) for value in values], an error converting
+    a value gives the index of its record
+    """
+    if values.count(None) == len(values):
+        # e.g. an optional value no record has, None converts to None
+        return list(values)
+    try:
+        return [convert(value, *args) for value in values]
+    except (TypeError, ValueError):
+        for index, value in enumerate(values):
+            try:
+                convert(value, *args)
+            except (TypeError, ValueError) as error:
+                raise type(error)("record {index}: {error}".format(
+                    index=index, error=error)) from error
+        raise
+
+
+def check_column(values, valid, exception, message):
+    """
+    Check the distinct values of a column are all in valid, otherwise raise
+    exception with message and the index of the first record which is not
+    """
+    invalid = set(values).difference(valid)
+    if invalid:
+        index = min(values.index(value) for value in invalid)
+        raise exception("record {index}: {message}".format(
+            index=index, message=message))
+
+
+def record_uuid(value, name="kid"):
+    """Convert a UUID in a record, 16 bytes, a UUID or a string, to a UUID"""
+    if type(value) is bytes:
+        return uuid.UUID(bytes=value)
+    if isinstance(value, (bytearray, memoryview)):
+        return uuid.UUID(bytes=bytes(value))
+    if isinstance(value, uuid.UUID):
+        return value
+    if isinstance(value, str):
+        return uuid.UUID(value)
+    raise TypeError("{name} should be a uuid".format(name=name))
+
+
+def record_binary(value, name, trusted=False):
+    """
+    Check a binary value in a record, raw bytes are kept as they are and
+    base64 strings are checked unless trusted is True
+    """
+    if isinstance(value, BINARY_TYPES):
+        return value
+    return record_base64(value, name, trusted)
+
+
+def record_base64(value, name, trusted=False):
+    """
+    Convert a value in a record to the base64 string it is stored as, raw
+    bytes are encoded and strings are checked unless trusted is True
+    """
+    if value is None:
+        return None
+    if isinstance(value, BINARY_TYPES):
+        return b64encode(value).decode("ascii")
+    if not isinstance(value, str):
+        raise TypeError("{name} should be bytes or a base64 string".format(
+            name=name))
+    if not trusted:
+        try:
+            b64decode(value)
+        except BinasciiError:
+            raise ValueError("{name} is not a valid base64 string".format(
+                name=name))
+    return value
+
+
+def index_key(key):
+    """
+    Convert a key to the form indexes use, UUIDs (also within tuples) may
+    be given as strings
+    """
+    if isinstance(key, str):
+        return uuid.UUID(key)
+    if isinstance(key, tuple):
+        return tuple(index_key(part) for part in key)
+    return key
+
+
+class Index(Mapping):
+    """
+    Read only mapping of a value of the items of a list to the first item
+    with that value, or if not unique to a list of all of them in list order
+    """
+    __slots__ = ("_key", "_unique", "_items")
+
+    def __init__(self, key, unique, items=()):
+        self._key = key
+        self._unique = unique
+        self._items = {}
+        for item in items:
+            self.add(item)
+
+    def add(self, item):
+        """Add an item after those already indexed"""
+        if self._unique:
+            self._items.setdefault(self._key(item), item)
+        else:
+            self._items.setdefault(self._key(item), []).append(item)
+
+    def __getitem__(self, key):
+        try:
+            items = self._items[index_key(key)]
+        except ValueError:
+            # not a valid UUID string, so not in the index
+            raise KeyError(key)
+        return items if self._unique else list(items)
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __len__(self):
+        return len(self._items)
+
+
+class IndexView(Mapping):
+    """
+    Read only mapping returned by the index properties of lists, e.g.
+    ContentKeyList.by_kid, which looks items up in the list's current Index
+    of that name, so one held while the list changes stays up to date
+    """
+    __slots__ = ("_list", "_name")
+
+    def __init__(self, items, name):
+        self._list = items
+        self._name = name
+
+    def __getitem__(self, key):
+        return self._list._index(self._name)[key]
+
+    def __contains__(self, key):
+        return key in self._list._index(self._name)
+
+    def __iter__(self):
+        return iter(self._list._index(self._name))
+
+    def __len__(self):
+        return len(self._list._index(self._name))
+
+
+def drop_none(data):
+    """Returns a dict without the items whose value is None"""
+    return {key: value for key, value in data.items() if value is not None}
+
+
+def field_digest(*fields):
+    """
+    SHA-256 digest of a sequence of str, bytes or None fields, each field is
+    length prefixed so different fields can't give the same input
+    """
+    sha = hashlib.sha256()
+    for field in fields:
+        if field is None:
+            sha.update(b"\x00")
+            continue
+        if isinstance(field, str):
+            field = field.encode("utf-8")
+        sha.update(b"\x01" + len(field).to_bytes(8, "big") + field)
+    return sha.digest()
+
+
+def _orderable_key(key):
+    """
+    Returns a comparison key as a value which can be ordered against any
+    other: text, then tuples compared by their values, then None
+    """
+    if key is None:
+        return (2,)
+    if isinstance(key, tuple):
+        return (1, tuple(_orderable_key(value) for value in key))
+    return (0, str(key))
+
+
+def _canonical_order(element):
+    # by key ID, then system ID for DRM systems, then content so the order
+    # never depends on the order items were added
+    return (element.get("kid", ""), element.get("systemId", ""),
+            etree.tostring(element))
+
+
+def sort_by_kid(element):
+    """Sort the items of the key ID lists in a tree, in place"""
+    for el in element.iter(etree.Element):
+        if etree.QName(el).localname in KID_LISTS:
+            el[:] = sorted(el, key=_canonical_order)
+
+
+def unpickle(cls, state):
+    """Rebuild an object pickled as its class and _pickle_state()"""
+    return cls._from_pickle_state(state)
+
+
+# the namespace declarations lxml writes on an element made with
+# nsmap=NSMAP, left out of cached fragments
+NS_DECLARATIONS = etree.tostring(etree.Element("x", nsmap=NSMAP))[2:-2]
+# and the ones fragments are parsed in. Elements are built with tags in no
+# namespace even where NSMAP declares a default one, declaring it would put
+# the parsed tags in it
+NS_PREFIXES = etree.tostring(etree.Element("x", nsmap={
+    prefix: uri for prefix, uri in NSMAP.items() if prefix is not None
+}))[2:-2]
+
+
+def _fragment(element):
+    """
+    Serialize an element for the fragment cache, returns the namespace
+    declarations to parse it in and the XML, without the declarations on its
+    start tag if it was made with nsmap=NSMAP
+    """
+    fragment = etree.tostring(element)
+    start = fragment.find(NS_DECLARATIONS)
+    if start > 0 and b" " not in fragment[:start]:
+        return NS_PREFIXES, (fragment[:start] +
+                             fragment[start + len(NS_DECLARATIONS):])
+    # declares the namespaces it uses itself
+    return b"", fragment
+
+
+def _parse_fragments(fragments):
+    """
+    Returns the elements parsed from a sequence of cached fragments, each
+    run of fragments with the same declarations is parsed at once with this
+    thread's configured parser
+    """
+    elements = []
+    start = 0
+    while start < len(fragments):
+        declarations = fragments[start][0]
+        end = start + 1
+        while end < len(fragments) and fragments[end][0] == declarations:
+            end += 1
+        elements.extend(fromstring(
+            b"".join([b"<fragments", declarations, b">",
+                      *(fragment for _, fragment in fragments[start:end]),
+                      b"</fragments>"])))
+        start = end
+    return elements
+
+
+def append_elements(parent, items, owner=None):
+    """
+    Append the elements of items to parent, items being a list or some of
+    the items of the list owner
+
+    Items with a cached fragment (see CPIXComparableBase._cache_fragment)
+    are parsed from it, together, rather than built again. Items are only
+    serialized for the cache when built again for a list already owning
+    them, so serializing a document once costs no more than building it.
+    Items which aren't part of a list are never cached
+    """
+    if isinstance(items, CPIXListBase):
+        owner, items = items, items._list
+    fragments = []
+    for item in items:
+        fragment = item._cached_fragment()
+        if fragment is not None:
+            fragments.append(fragment)
+            continue
+        if fragments:
+            parent.extend(_parse_fragments(fragments))
+            fragments = []
+        element = item.element()
+        if (owner is not None and not item._add_owner(owner) and
+                item._cache_fragment):
+            item._cached("fragment", lambda: _fragment(element))
+        parent.append(element)
+    parent.extend(_parse_fragments(fragments))
+
+
+def _new_element(self):
+    """Returns XML element"""
+    return self._element()
 
 
 class CPIXComparableBase(ABC):
+    """
+    Base class of all CPIX objects
+
+    pretty_print() output, the comparison key and the digest are cached
+    until the object changes: property setters and list mutations call
+    _invalidate(). Elements aren't cached as trees, the items of the
+    document's lists cache theirs serialized and lists parse the fragments
+    of all their unchanged items at once rather than building them again
+    (see append_elements()), so re-serializing a document only rebuilds the
+    elements of the items which changed. When an object caches anything it
+    registers itself as an owner of its children, so a change to a child
+    also drops the caches of everything containing it. Owners are held by
+    weak reference, an object shared by many documents doesn't keep them
+    alive.
+
+    Objects compare equal when they would serialize to the same XML, by
+    comparing tuples of the values element() writes rather than the XML
+    itself, and are ordered by those values too (see sort_key()).
+
+    Model classes declare their attributes in __slots__, documents can hold
+    hundreds of thousands of them and slots need no per-object __dict__.
+    """
+    __slots__ = ("_cache", "_owners")
+    # _ attributes holding other CPIX objects whose elements are part of
+    # this one's
+    _child_attributes = ()
+    # whether the element is cached serialized when part of a list, for the
+    # items of the document's lists, see append_elements()
+    _cache_fragment = False
+
+    def _set_child(self, name, value):
+        """
+        Set an attribute holding another CPIX object, used by property
+        setters instead of assigning it directly
+        """
+        old = getattr(self, name, None)
+        if old is not None:
+            old._remove_owner(self)
+        setattr(self, name, value)
+        self._invalidate()
+
+    def __new__(cls, *args, **kwargs):
+        # slots can't have class level defaults, objects made with
+        # cls.__new__(cls) (e.g. by _from_trusted) need them set too
+        self = super().__new__(cls)
+        object.__setattr__(self, "_cache", None)
+        object.__setattr__(self, "_owners", ())
+        return self
+
+    def __getstate__(self):
+        # caches hold lxml elements, which can't be pickled, and owners are
+        # weak references
+        state = getattr(self, "__dict__", None)
+        slots = {}
+        for cls in type(self).__mro__:
+            for name in cls.__dict__.get("__slots__", ()):
+                if (name not in ("_cache", "_owners", "__weakref__") and
+                        hasattr(self, name)):
+                    slots[name] = picklable(getattr(self, name))
+        if state is not None:
+            state = state.copy()
+        return state, slots or None
+
+    def _children(self):
+        """The CPIX objects whose elements are part of this one's"""
+        return [child for child in
+                (getattr(self, name) for name in self._child_attributes)
+                if child is not None]
+
+    def _add_owner(self, owner):
+        """Add an owner, returns False if it already was one"""
+        owners = self._owners
+        if not owners:
+            object.__setattr__(self, "_owners", [weakref.ref(owner)])
+            return True
+        owner_ref = weakref.ref(owner)
+        # CPython hands out the same reference for an object, so an owner
+        # adding itself again is usually found without calling all refs
+        if owners and owners[-1] is owner_ref:
+            return False
+        # compared by identity, == compares the content of both objects
+        if any(ref() is owner for ref in owners):
+            return False
+        # references to owners which no longer exist are dropped here
+        owners = [ref for ref in owners if ref() is not None]
+        owners.append(owner_ref)
+        object.__setattr__(self, "_owners", owners)
+        return True
+
+    def _remove_owner(self, owner):
+        if self._owners:
+            object.__setattr__(self, "_owners", [
+                ref for ref in self._owners
+                if ref() is not None and ref() is not owner])
+
+    def _invalidate(self):
+        """
+        Drop the cached serializations of this object and its owners
+
+        Owners are told even if this object has no cache, lists also keep
+        indexes of their items' values (see CPIXListBase._index()) which
+        aren't built from cached values
+        """
+        if self._cache is not None:
+            object.__setattr__(self, "_cache", None)
+        for ref in self._owners:
+            owner = ref()
+            if owner is not None:
+                owner._invalidate()
+
+    def _cached(self, key, build):
+        """Return the cached value for key, calling build() if there is none"""
+        if self._cache is not None and key in self._cache:
+            return self._cache[key]
+        # built before creating the cache, building can change attributes
+        # (e.g. materializing lazy sections) which drops it
+        value = build()
+        if self._cache is None:
+            object.__setattr__(self, "_cache", {})
+            # everything cached is built from the children's cached values
+            for child in self._children():
+                child._add_owner(self)
+        self._cache[key] = value
+        return value
+
+    def _element(self):
+        """Returns a new element of this object"""
+        element = self._build_element()
+        # elements aren't cached, but what owners cache is built from the
+        # children's elements, so changes to them must reach the owners.
+        # lists add themselves to their items in append_elements()
+        if self._child_attributes:
+            for child in self._children():
+                child._add_owner(self)
+        return element
+
+    def _cached_fragment(self):
+        """The cached serialized element of this object, or None"""
+        if self._cache is None:
+            return None
+        return self._cache.get("fragment")
+
+    def _build_key(self):
+        """
+        Returns a hashable value equal for objects which serialize to the
+        same XML, classes override this with a tuple of their tag and the
+        values their element() writes
+        """
+        return str(self)
+
+    def _key(self):
+        """The cached comparison key of this object"""
+        return self._cached("key", self._build_key)
+
+    def _build_digest(self):
+        # objects with children override this to hash their digests
+        return field_digest(*self._key())
+
+    def digest(self):
+        """
+        Returns the SHA-256 digest of the content as bytes, equal for objects
+        which serialize to the same XML
+
+        It is built from the digests of the children and cached until the
+        object or any of its children changes, so it is cheap to call on an
+        unchanged document, e.g. for ETags
+        """
+        return self._cached("digest", self._build_digest)
+
+    def hexdigest(self):
+        """Returns digest() as a hex string"""
+        return self.digest().hex()
+
+    def to_json(self, **kwargs):
+        """
+        Returns to_dict() encoded as JSON, keyword arguments are passed on to
+        json.dumps
+        """
+        return json.dumps(self.to_dict(), **kwargs)
+
+    @classmethod
+    def from_json(cls, data, trusted=False):
+        """
+        Create an object from JSON as returned by to_json()
+
+        If trusted is True the values are not checked
+        """
+        return cls.from_dict(json.loads(data), trusted)
+
+    def sort_key(self):
+        """
+        Returns the key objects are ordered by, e.g. for
+        sorted(content_keys, key=ContentKey.sort_key)
+
+        Objects are ordered by their XML tag, then by the values they are
+        compared by (see _build_key()) one after another, in the order
+        element() writes them. Values are compared as the text written, so
+        numbers too ("10" < "9"), and a value which is set sorts before one
+        which isn't. This isn't the order of their serialized XML, which
+        older versions used: VideoFilter(min_pixels=5) sorts before
+        VideoFilter(max_pixels=7) as its first value is set, and a
+        ContentKey with a cek before the same key without one
+        """
+        return self._cached("sort_key",
+                            lambda: _orderable_key(self._key()))
+
+    def __init_subclass__(cls, **kwargs):
+        # element() methods build a new element, keep them as
+        # _build_element() and have element() also cache it serialized where
+        # the class does
+        super().__init_subclass__(**kwargs)
+        if "element" in cls.__dict__:
+            cls._build_element = cls.__dict__["element"]
+            cls.element = _new_element
+
     def __str__(self):
-        return str(etree.tostring(self.element()), "utf-8")
+        return self._cached(
+            "str", lambda: str(etree.tostring(self._element()), "utf-8"))
 
     def __lt__(self, other):
-        return str(self).__lt__(str(other))
+        if not isinstance(other, CPIXComparableBase):
+            return NotImplemented
+        return self.sort_key() < other.sort_key()
 
     def __le__(self, other):
-        return str(self).__le__(str(other))
+        if not isinstance(other, CPIXComparableBase):
+            return NotImplemented
+        return self.sort_key() <= other.sort_key()
 
     def __gt__(self, other):
-        return str(self).__gt__(str(other))
+        if not isinstance(other, CPIXComparableBase):
+            return NotImplemented
+        return self.sort_key() > other.sort_key()
 
     def __ge__(self, other):
-        return str(self).__ge__(str(other))
+        if not isinstance(other, CPIXComparableBase):
+            return NotImplemented
+        return self.sort_key() >= other.sort_key()
 
     def __eq__(self, other):
-        return str(self).__eq__(str(other))
+        if self is other:
+            return True
+        if not isinstance(other, CPIXComparableBase):
+            return NotImplemented
+        return self._key() == other._key()
+
+    def __hash__(self):
+        # objects are mutable, changing one held in a set or used as a dict
+        # key changes its hash
+        return hash(self._key())
 
     def __repr__(self):
+        # index properties are left out, getting them builds the index.
+        # Classes which look up by_kid another way clear their _index_keys
+        indexes = {name for cls in type(self).__mro__
+                   for name in vars(cls).get("_index_keys", ())}
         props = {p: repr(getattr(self, p)) for p in dir(type(self))
-                 if isinstance(getattr(type(self), p), property)}
+                 if isinstance(getattr(type(self), p), property) and
+                 p not in indexes}
 
         return "{name}({prop})".format(
             name=type(self).__name__,
@@ -35,15 +676,45 @@ class CPIXComparableBase(ABC):
                             for k, v in props.items()])
         )
 
+    def _build_canonical(self):
+        # parsed back so elements are in the namespaces the declarations
+        # written by lxml put them in, as any reader of the document sees them
+        element = fromstring(etree.tostring(self._element()))
+        sort_by_kid(element)
+        return etree.tostring(element, method="c14n2")
+
+    def to_canonical_bytes(self):
+        """
+        Returns Canonical XML 2.0 of this object, with content keys, DRM
+        systems and usage rules ordered by key ID, so the same content gives
+        the same bytes however it was built. Other lists keep their order
+
+        Canonical XML is not indented, and declares each namespace on the
+        elements using it rather than wherever the object declared it
+        """
+        return self._cached("canonical", self._build_canonical)
+
     def pretty_print(self, **kwargs):
         """
         Pretty print XML
+
+        method="c14n2" returns to_canonical_bytes(), other keyword arguments
+        are passed on to lxml's tostring
         """
+        if kwargs.get("method") == "c14n2":
+            return self.to_canonical_bytes()
         if "pretty_print" not in kwargs:
             kwargs["pretty_print"] = True
         if "encoding" not in kwargs:
             kwargs["encoding"] = "utf-8"
-        return etree.tostring(self.element(), **kwargs)
+        key = ("pretty_print",) + tuple(sorted(kwargs.items()))
+        try:
+            hash(key)
+        except TypeError:
+            # e.g. inclusive_ns_prefixes given as a list, not cached
+            return etree.tostring(self._element(), **kwargs)
+        return self._cached(
+            key, lambda: etree.tostring(self._element(), **kwargs))
 
     # Abstract methods element and parse must be overriden
     @abstractmethod
@@ -57,46 +728,141 @@ class CPIXComparableBase(ABC):
 
 class CPIXListBase(MutableSequence, CPIXComparableBase):
     """Base list class to be extended"""
+    # lists own their items, which refer to them weakly
+    __slots__ = ("_list", "_indexes", "__weakref__")
+    # index names mapped to a function returning the value items are indexed
+    # by and whether the index is unique, see _index()
+    _index_keys = {}
 
     def __init__(self, *args, **kwargs):
         self._list = list()
-        self.list = list()
         if len(args) == 1 and len(kwargs) == 0 and isinstance(args[0], list):
-            self.extend(args[0])
+            self.list = args[0]
         elif (len(args) == 0 and len(kwargs) == 1 and
                 "list" in kwargs and
                 isinstance(kwargs["list"], list)):
-            self.extend(kwargs["list"])
+            self.list = kwargs["list"]
         else:
-            self.extend(list(args))
+            self.list = list(args)
 
     def __len__(self):
-        return len(self.list)
+        return len(self._list)
 
     def __getitem__(self, index):
-        return self.list[index]
+        return self._list[index]
 
     def __setitem__(self, index, value):
         self.check(value)
-        self.list[index] = value
+        self._list[index]._remove_owner(self)
+        self._list[index] = value
+        self._invalidate()
 
     def __delitem__(self, index):
-        del self.list[index]
+        removed = self._list[index]
+        del self._list[index]
+        if not isinstance(index, slice):
+            removed = [removed]
+        for value in removed:
+            value._remove_owner(self)
+        self._invalidate()
 
     def insert(self, index, value):
         self.check(value)
-        self.list.insert(index, value)
+        indexes = self._indexes_or_none()
+        appended = index >= len(self._list)
+        self._list.insert(index, value)
+        self._invalidate()
+        if indexes and appended:
+            # appending, e.g. by extend(), updates the indexes rather than
+            # rebuilding them on the next lookup
+            for item_index in indexes.values():
+                item_index.add(value)
+            value._add_owner(self)
+            self._indexes = indexes
+
+    def _children(self):
+        return self._list
+
+    def _indexes_or_none(self):
+        if not self._index_keys:
+            return None
+        return getattr(self, "_indexes", None)
+
+    def _index(self, name):
+        """
+        Returns the Index name of _index_keys, built on first use and kept
+        until the list or one of its items changes, appending keeps it
+        """
+        indexes = self._indexes_or_none()
+        if indexes is None:
+            indexes = self._indexes = {}
+        index = indexes.get(name)
+        if index is None:
+            key, unique = self._index_keys[name]
+            index = indexes[name] = Index(key, unique, self._list)
+            # so changes to the indexed values drop the index
+            for item in self._list:
+                item._add_owner(self)
+        return index
+
+    def _invalidate(self):
+        if self._index_keys:
+            self._indexes = None
+        super()._invalidate()
+
+    def to_dict(self):
+        """Returns a list of the items' to_dict()"""
+        return [item.to_dict() for item in self]
+
+    # lists of this class's items pickle them as their _pickle_state()
+    _item_class = None
+
+    def __reduce__(self):
+        # items are packed into tuples of plain values and rebuilt without
+        # checks, rather than pickling each object's attributes
+        item_class = self._item_class
+        return (self._from_pickled_items, (tuple(
+            item._pickle_state() if type(item) is item_class else item
+            for item in self._list),))
+
+    @classmethod
+    def _from_pickled_items(cls, items):
+        new_list = cls.__new__(cls)
+        new_list._list = [
+            cls._item_class._from_pickle_state(item)
+            if type(item) is tuple else item
+            for item in items]
+        return new_list
+
+    def _build_digest(self):
+        return field_digest(self._key()[0], *(item.digest() for item in self))
 
     @property
     def list(self):
-        return self._list
+        """
+        A copy of the items, changing it doesn't change this list, assign a
+        list to replace them
+        """
+        return list(self._list)
 
     @list.setter
     def list(self, l):
         if not isinstance(l, list):
             raise TypeError("must be a list")
-        elif all([self.check(x) for x in l]):
-            self._list = l
+        for value in l:
+            self.check(value)
+        for value in self._list:
+            value._remove_owner(self)
+        # copied, so changing l afterwards doesn't bypass _invalidate()
+        self._list = list(l)
+        self._invalidate()
+
+    @classmethod
+    def _from_checked(cls, items):
+        """Create a list of items which are known to pass check()"""
+        new_list = cls()
+        new_list._list = items
+        return new_list
 
     # Abstract method check must be overriden
     @abstractmethod
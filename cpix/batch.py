@@ -0,0 +1,127 @@
+"""
+Batch parsing and validation spread over a process pool
+"""
+import os
+import pickle
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from . import parse, parse_file, validate, validate_file
+
+# result of processing a single source, index is its position in the input
+# and error is None unless processing it failed
+BatchResult = namedtuple("BatchResult", ["index", "source", "result", "error"])
+
+
+def _picklable(error):
+    """
+    Errors are sent back from the worker processes, lxml errors can't be
+    pickled so are replaced with a ValueError carrying the same message
+    """
+    try:
+        pickle.dumps(error)
+    except Exception:
+        return ValueError("{name}: {error}".format(
+            name=type(error).__name__, error=error))
+    return error
+
+
+def _is_document(source):
+    """Byte strings are documents, anything else is a file"""
+    return isinstance(source, (bytes, bytearray, memoryview))
+
+
+def _parse_one(source, kwargs):
+    try:
+        if _is_document(source):
+            return (parse(bytes(source), **kwargs), None)
+        return (parse_file(source, **kwargs), None)
+    except Exception as e:
+        return (None, _picklable(e))
+
+
+def _validate_one(source):
+    # CPIX_SCHEMA is compiled once when cpix is imported in each worker
+    try:
+        if _is_document(source):
+            valid, error = validate(bytes(source))
+        else:
+            valid, error = validate_file(source)
+    except Exception as e:
+        return (False, _picklable(e))
+    return (valid, _picklable(error) if not valid else None)
+
+
+def _run(function, args, sources, max_workers, executor, ordered):
+    """
+    Submit function(source, *args) for each source, keeping a bounded number
+    of items in flight, and yield a BatchResult per source
+    """
+    own_executor = executor is None
+    if own_executor:
+        executor = ProcessPoolExecutor(max_workers=max_workers)
+    window = 2 * (max_workers or os.cpu_count() or 1)
+    pending = deque() if ordered else {}
+
+    def result(index, source, future):
+        try:
+            value, error = future.result()
+        except Exception as e:
+            value, error = None, e
+        return BatchResult(index, source, value, error)
+
+    def collect():
+        if ordered:
+            index, source, future = pending.popleft()
+            yield result(index, source, future)
+        else:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index, source = pending.pop(future)
+                yield result(index, source, future)
+
+    try:
+        for index, source in enumerate(sources):
+            future = executor.submit(function, source, *args)
+            if ordered:
+                pending.append((index, source, future))
+            else:
+                pending[future] = (index, source)
+            while len(pending) >= window:
+                yield from collect()
+        while pending:
+            yield from collect()
+    finally:
+        futures = pending if not ordered else [p[2] for p in pending]
+        for future in futures:
+            future.cancel()
+        if own_executor:
+            executor.shutdown()
+
+
+def parse_many(sources, max_workers=None, executor=None, ordered=True,
+               **kwargs):
+    """
+    Parse many CPIX documents in parallel
+
+    sources is an iterable of byte strings containing XML or of filenames
+    (path-like objects and str). Work is spread over a ProcessPoolExecutor
+    with max_workers processes, or over the given executor.
+
+    Yields a BatchResult per source, in input order if ordered is True or as
+    they complete otherwise. A source which fails to parse gives a result
+    with error set rather than stopping the batch. Keyword arguments are
+    passed on to cpix.parse.
+    """
+    return _run(_parse_one, (kwargs,), sources, max_workers, executor,
+                ordered)
+
+
+def validate_many(sources, max_workers=None, executor=None, ordered=True):
+    """
+    Validate many CPIX documents against the schema in parallel
+
+    Takes the same sources and options as parse_many. Yields a BatchResult
+    per source with result True or False, and the validation or parse error
+    for invalid documents.
+    """
+    return _run(_validate_one, (), sources, max_workers, executor, ordered)
@@ -0,0 +1,130 @@
+"""
+Compressed CPIX files, read and written through the standard library codecs
+so neither the XML nor the compressed data has to be held in memory
+"""
+import bz2
+import gzip
+import io
+import lzma
+import os
+from contextlib import contextmanager
+
+# compression name to the function opening a file (name or file object)
+# through its codec
+OPENERS = {
+    "gzip": gzip.open,
+    "xz": lzma.open,
+    "bz2": bz2.open,
+}
+EXTENSIONS = {
+    ".gz": "gzip",
+    ".xz": "xz",
+    ".bz2": "bz2",
+}
+MAGIC_NUMBERS = {
+    "gzip": b"\x1f\x8b",
+    "xz": b"\xfd7zXZ\x00",
+    "bz2": b"BZh",
+}
+MAGIC_LENGTH = max(len(magic) for magic in MAGIC_NUMBERS.values())
+
+
+def _is_path(target):
+    return isinstance(target, (str, bytes, os.PathLike))
+
+
+def from_extension(path):
+    """
+    Returns the compression given by a file name's extension, or None if it
+    is not one of EXTENSIONS
+    """
+    _, extension = os.path.splitext(os.fsdecode(path))
+    return EXTENSIONS.get(extension.lower())
+
+
+def from_magic(data):
+    """
+    Returns the compression of data starting with a compressed stream's magic
+    number, or None
+    """
+    for compression, magic in MAGIC_NUMBERS.items():
+        if data.startswith(magic):
+            return compression
+    return None
+
+
+def _peek(fileobj):
+    """
+    Read the first bytes of a file object without consuming them, returns
+    b"" if that is not possible
+    """
+    if hasattr(fileobj, "peek"):
+        return fileobj.peek(MAGIC_LENGTH)[:MAGIC_LENGTH]
+    try:
+        position = fileobj.tell()
+        data = fileobj.read(MAGIC_LENGTH)
+        fileobj.seek(position)
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        return b""
+    return data
+
+
+def detect(source):
+    """
+    Returns the compression of a file name or binary file object from its
+    magic number, or None if it is not compressed
+    """
+    if _is_path(source):
+        with open(source, "rb") as f:
+            return from_magic(f.read(MAGIC_LENGTH))
+    return from_magic(_peek(source))
+
+
+def check(compression):
+    if compression not in OPENERS:
+        raise ValueError(
+            "unknown compression: {compression}, should be one of "
+            "{names} or auto".format(compression=compression,
+                                     names=", ".join(OPENERS)))
+
+
+@contextmanager
+def open_read(source):
+    """
+    Context manager giving a source to read XML from: the source itself if
+    it is not compressed, otherwise a file object decompressing it as it is
+    read. source can be a file name, path-like object or binary file object
+    """
+    if isinstance(source, os.PathLike):
+        source = os.fspath(source)
+    compression = detect(source)
+    if compression is None:
+        # uncompressed files are still read by lxml directly
+        yield source
+        return
+    with OPENERS[compression](source, "rb") as stream:
+        yield stream
+
+
+@contextmanager
+def open_write(target, compression="auto"):
+    """
+    Context manager giving a binary file object writing to target, a file
+    name, path-like object or binary file object, compressed with gzip, xz,
+    bz2 or None
+
+    "auto" picks the compression from a file name's extension, file objects
+    are not compressed. Files opened by name are closed afterwards, file
+    objects passed in are left open
+    """
+    if compression == "auto":
+        compression = from_extension(target) if _is_path(target) else None
+    if compression is not None:
+        check(compression)
+        with OPENERS[compression](target, "wb") as stream:
+            yield stream
+    elif _is_path(target):
+        with open(target, "wb") as stream:
+            yield stream
+    else:
+        yield target
@@ -1,13 +1,51 @@
 """
 Content key classes
 """
+from operator import attrgetter
 from . import etree, uuid, b64decode, BinasciiError, NSMAP, PSKC, ENC, \
-    CONTENT_KEY_WRAPPING_ALGORITHM
-from .base import CPIXComparableBase, CPIXListBase
+    CONTENT_KEY_WRAPPING_ALGORITHM, TAG_CLASSES
+from .base import CPIXComparableBase, CPIXListBase, append_elements, \
+    as_text, drop_none, normalize_kids, kid_selected, unpickle, \
+    record_columns, convert_column, check_column, record_uuid, \
+    record_binary, to_base64, to_bytes, check_bytes, picklable, IndexView, \
+    base64_value
+from .parser import fromstring
+
+COMMON_ENCRYPTION_SCHEMES = ("cenc", "cbc1", "cens", "cbcs")
+
+XPATH_NAMESPACES = {"pskc": PSKC, "enc": ENC}
+# compiled once rather than re-evaluating path strings for every key,
+# smart_strings=False so the returned text doesn't keep the tree alive
+ENCRYPTED_VALUE_XPATH = etree.XPath(
+    "*/*/pskc:EncryptedValue", namespaces=XPATH_NAMESPACES)
+CIPHER_VALUE_XPATH = etree.XPath(
+    ".//enc:CipherValue/text()", namespaces=XPATH_NAMESPACES,
+    smart_strings=False)
+VALUE_MAC_XPATH = etree.XPath(
+    ".//pskc:ValueMAC/text()", namespaces=XPATH_NAMESPACES,
+    smart_strings=False)
+PLAIN_VALUE_XPATH = etree.XPath(
+    "*/*/pskc:PlainValue/text()", namespaces=XPATH_NAMESPACES,
+    smart_strings=False)
+
+
+def first_or_none(values):
+    """Return the first result of an XPath query or None if there are none"""
+    return values[0] if values else None
 
 
 class ContentKeyList(CPIXListBase):
     """List of ContentKeys"""
+    __slots__ = ()
+    _index_keys = {"by_kid": (attrgetter("kid"), True)}
+
+    @property
+    def by_kid(self):
+        """
+        Mapping of key ID to its ContentKey, kept up to date as the list and
+        its keys change
+        """
+        return IndexView(self, "by_kid")
 
     def check(self, value):
         if not isinstance(value, ContentKey):
@@ -15,27 +53,89 @@ class ContentKeyList(CPIXListBase):
 
     def element(self):
         el = etree.Element("ContentKeyList", nsmap=NSMAP)
-        for content_key in self:
-            el.append(content_key.element())
+        append_elements(el, self)
         return el
 
+    def _build_key(self):
+        return ("ContentKeyList", tuple(item._key() for item in self))
+
     @staticmethod
-    def parse(xml):
+    def parse(xml, trusted=False, kids=None):
         """
         Parse and return new ContentKeyList
+
+        If trusted is True the input is assumed to be valid (e.g. it has
+        passed schema validation) and per value checks are skipped
+
+        If kids is given only content keys for those key IDs are parsed
         """
         if isinstance(xml, (str, bytes)):
-            xml = etree.fromstring(xml)
+            xml = fromstring(xml)
+        if kids is not None:
+            kids = normalize_kids(kids)
 
         new_content_key_list = ContentKeyList()
+        content_keys = []
+
+        for element in xml:
+            if TAG_CLASSES.get(element.tag) is not ContentKey:
+                continue
+            if kids is None or kid_selected(element, kids):
+                content_keys.append(ContentKey.parse(element, trusted))
+
+        if trusted:
+            new_content_key_list._list = content_keys
+        else:
+            new_content_key_list.extend(content_keys)
 
-        for element in xml.getchildren():
-            tag = etree.QName(element.tag).localname
-            if tag == "ContentKey":
-                new_content_key_list.append(ContentKey.parse(element))
+        return new_content_key_list
 
+    @staticmethod
+    def from_dict(data, trusted=False):
+        """
+        Create a ContentKeyList from a list of ContentKey dicts, as returned by
+        to_dict()
+
+        If trusted is True the values are not checked
+        """
+        content_keys = [ContentKey.from_dict(item, trusted) for item in data]
+        new_content_key_list = ContentKeyList()
+        if trusted:
+            new_content_key_list._list = content_keys
+        else:
+            new_content_key_list.extend(content_keys)
         return new_content_key_list
 
+    @classmethod
+    def from_records(cls, records, trusted=False):
+        """
+        Create a ContentKeyList from an iterable of tuples of (kid, cek,
+        common_encryption_scheme, explicit_iv, value_mac), e.g. rows from a
+        key server, trailing values can be left out
+
+        kid can be 16 bytes, a UUID or a string. cek, explicit_iv and
+        value_mac can be raw bytes, bytearray or memoryview, which are kept
+        as they are, or base64 strings. The values are converted and checked
+        a column at a time, rather than by the setters of each ContentKey and
+        again when adding it to the list
+
+        If trusted is True base64 strings are not checked
+        """
+        kids, ceks, schemes, explicit_ivs, value_macs = record_columns(
+            records, 5)
+        check_column(schemes, COMMON_ENCRYPTION_SCHEMES + (None,), TypeError,
+                     "common_encryption_scheme must be: cenc, cbc1, cens or "
+                     "cbcs")
+        return cls._from_checked([
+            ContentKey._from_trusted(*values) for values in zip(
+                convert_column(kids, record_uuid),
+                convert_column(ceks, record_binary, "cek", trusted),
+                schemes,
+                convert_column(explicit_ivs, record_binary, "explicit_iv",
+                               trusted),
+                convert_column(value_macs, record_binary, "value_mac",
+                               trusted))])
+
 
 class ContentKey(CPIXComparableBase):
     """
@@ -44,7 +144,17 @@ class ContentKey(CPIXComparableBase):
         kid: key ID
     And child element:
         Data: data element containing content encryption key
+
+    cek, explicit_iv and value_mac are base64 strings, cek_bytes,
+    explicit_iv_bytes and value_mac_bytes the same values as raw bytes. Each
+    is stored in the form it was set in and only converted when read in the
+    other, raw bytes are encoded when the key is serialized. bytearray and
+    memoryview values are kept without copying, so must not be changed
+    afterwards
     """
+    __slots__ = ("_kid", "_cek", "_common_encryption_scheme", "_explicit_iv",
+                 "_value_mac")
+    _cache_fragment = True
 
     def __init__(self, kid, cek=None, common_encryption_scheme=None,
                  explicit_iv=None, value_mac=None):
@@ -59,6 +169,36 @@ class ContentKey(CPIXComparableBase):
         self.explicit_iv = explicit_iv
         self.value_mac = value_mac
 
+    @classmethod
+    def _from_trusted(cls, kid, cek=None, common_encryption_scheme=None,
+                      explicit_iv=None, value_mac=None):
+        """
+        Create a ContentKey from values known to be valid, skipping the
+        base64 and UUID checks done by the property setters
+        """
+        content_key = cls.__new__(cls)
+        content_key._kid = kid if isinstance(kid, uuid.UUID) else \
+            uuid.UUID(kid)
+        content_key._cek = cek
+        content_key._common_encryption_scheme = \
+            common_encryption_scheme or "cenc"
+        content_key._explicit_iv = explicit_iv
+        content_key._value_mac = value_mac
+        return content_key
+
+    def __reduce__(self):
+        return (unpickle, (type(self), self._pickle_state()))
+
+    def _pickle_state(self):
+        return (self._kid.bytes, picklable(self._cek),
+                self._common_encryption_scheme, picklable(self._explicit_iv),
+                picklable(self._value_mac))
+
+    @classmethod
+    def _from_pickle_state(cls, state):
+        kid, *values = state
+        return cls._from_trusted(uuid.UUID(bytes=kid), *values)
+
     @property
     def kid(self):
         return self._kid
@@ -67,14 +207,16 @@ class ContentKey(CPIXComparableBase):
     def kid(self, kid):
         if isinstance(kid, str):
             self._kid = uuid.UUID(kid)
+            self._invalidate()
         elif isinstance(kid, uuid.UUID):
             self._kid = kid
+            self._invalidate()
         else:
             raise TypeError("kid should be a uuid")
 
     @property
     def cek(self):
-        return self._cek
+        return to_base64(self._cek)
 
     @cek.setter
     def cek(self, cek):
@@ -85,10 +227,20 @@ class ContentKey(CPIXComparableBase):
                 b64decode(cek)
             except BinasciiError:
                 raise ValueError("cek is not a valid base64 string")
-            self._cek = cek
+            self._cek = base64_value(cek)
+            self._invalidate()
         else:
             raise TypeError("cek should be a base64 string")
 
+    @property
+    def cek_bytes(self):
+        return to_bytes(self._cek)
+
+    @cek_bytes.setter
+    def cek_bytes(self, cek):
+        self._cek = check_bytes(cek, "cek_bytes")
+        self._invalidate()
+
     @property
     def common_encryption_scheme(self):
         return self._common_encryption_scheme
@@ -102,8 +254,9 @@ class ContentKey(CPIXComparableBase):
             common_encryption_scheme = str(common_encryption_scheme)
         if isinstance(
             common_encryption_scheme, str
-        ) and common_encryption_scheme in ["cenc", "cbc1", "cens", "cbcs"]:
+        ) and common_encryption_scheme in COMMON_ENCRYPTION_SCHEMES:
             self._common_encryption_scheme = common_encryption_scheme
+            self._invalidate()
         else:
             raise TypeError(
                 "common_encryption_scheme must be: cenc, cbc1, cens or cbcs"
@@ -111,7 +264,7 @@ class ContentKey(CPIXComparableBase):
 
     @property
     def explicit_iv(self):
-        return self._explicit_iv
+        return to_base64(self._explicit_iv)
 
     @explicit_iv.setter
     def explicit_iv(self, explicit_iv):
@@ -122,13 +275,23 @@ class ContentKey(CPIXComparableBase):
                 b64decode(explicit_iv)
             except BinasciiError:
                 raise ValueError("explicit_iv is not a valid base64 string")
-            self._explicit_iv = explicit_iv
+            self._explicit_iv = base64_value(explicit_iv)
+            self._invalidate()
         else:
             raise TypeError("explicit_iv should be a base64 string")
 
+    @property
+    def explicit_iv_bytes(self):
+        return to_bytes(self._explicit_iv)
+
+    @explicit_iv_bytes.setter
+    def explicit_iv_bytes(self, explicit_iv):
+        self._explicit_iv = check_bytes(explicit_iv, "explicit_iv_bytes")
+        self._invalidate()
+
     @property
     def value_mac(self):
-        return self._value_mac
+        return to_base64(self._value_mac)
 
     @value_mac.setter
     def value_mac(self, value_mac):
@@ -138,11 +301,22 @@ class ContentKey(CPIXComparableBase):
                     b64decode(value_mac)
                 except BinasciiError:
                     raise ValueError("value_mac is not a valid base64 string")
-                self._value_mac = value_mac
+                self._value_mac = base64_value(value_mac)
+                self._invalidate()
             else:
                 raise TypeError("value_mac should be a base64 str")
         else:
             self._value_mac = None
+            self._invalidate()
+
+    @property
+    def value_mac_bytes(self):
+        return to_bytes(self._value_mac)
+
+    @value_mac_bytes.setter
+    def value_mac_bytes(self, value_mac):
+        self._value_mac = check_bytes(value_mac, "value_mac_bytes")
+        self._invalidate()
 
     def element(self):
         """Returns XML element"""
@@ -195,31 +369,35 @@ class ContentKey(CPIXComparableBase):
 
         return el
 
+    def _build_key(self):
+        # mirrors element(), ValueMAC is only written with a cek
+        cek = as_text(self.cek) or None
+        return ("ContentKey", str(self.kid),
+                self.common_encryption_scheme or None,
+                as_text(self.explicit_iv) or None,
+                cek,
+                as_text(self.value_mac) if cek else None)
+
     @staticmethod
-    def parse(xml):
+    def parse(xml, trusted=False):
         """
         Parse XML and return ContentKey
+
+        If trusted is True the values are not checked
         """
         if isinstance(xml, (str, bytes)):
-            xml = etree.fromstring(xml)
+            xml = fromstring(xml)
 
         kid = xml.attrib["kid"]
 
         cek = None
         value_mac = None
 
-        if xml.find(
-            "**/{{{pskc}}}EncryptedValue".format(pskc=PSKC)
-        ) is not None:
-            cek = xml.find(
-                ".//{{{enc}}}CipherValue".format(enc=ENC)
-            ).text
-            value_mac = xml.find(
-                ".//{{{pskc}}}ValueMAC".format(pskc=PSKC)
-            ).text
+        if ENCRYPTED_VALUE_XPATH(xml):
+            cek = first_or_none(CIPHER_VALUE_XPATH(xml))
+            value_mac = first_or_none(VALUE_MAC_XPATH(xml))
         else:
-            cek_elem = xml.find("**/{{{pskc}}}PlainValue".format(pskc=PSKC))
-            cek = cek_elem.text if cek_elem is not None else None
+            cek = first_or_none(PLAIN_VALUE_XPATH(xml))
 
         common_encryption_scheme = None
         explicit_iv = None
@@ -229,5 +407,38 @@ class ContentKey(CPIXComparableBase):
         if "explicitIV" in xml.attrib:
             explicit_iv = xml.attrib["explicitIV"]
 
+        if trusted:
+            return ContentKey._from_trusted(kid, cek, common_encryption_scheme,
+                                            explicit_iv, value_mac)
         return ContentKey(kid, cek, common_encryption_scheme, explicit_iv,
                           value_mac)
+
+    def to_dict(self):
+        """Returns a dict of the fields which are set"""
+        return drop_none({
+            "kid": str(self.kid),
+            "cek": as_text(self.cek),
+            "common_encryption_scheme": self.common_encryption_scheme,
+            "explicit_iv": as_text(self.explicit_iv),
+            "value_mac": as_text(self.value_mac),
+        })
+
+    @staticmethod
+    def from_dict(data, trusted=False):
+        """
+        Create a ContentKey from a dict as returned by to_dict()
+
+        If trusted is True the values are not checked
+        """
+        # base64 values given as bytes would be taken as raw bytes when
+        # stored without the setters' checks
+        args = (data["kid"], as_text(data.get("cek")),
+                data.get("common_encryption_scheme"),
+                as_text(data.get("explicit_iv")),
+                as_text(data.get("value_mac")))
+        if trusted:
+            return ContentKey._from_trusted(*args)
+        return ContentKey(*args)
+
+
+ContentKeyList._item_class = ContentKey
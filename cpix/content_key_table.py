@@ -0,0 +1,497 @@
+"""
+Columnar content key storage, for catalogues of many keys where a
+ContentKey object per key costs too much memory
+"""
+from array import array
+from base64 import b64encode
+from collections.abc import Mapping
+from . import etree, uuid, b64decode, NSMAP, TAG_CLASSES
+from .base import normalize_kids, kid_selected, index_key, to_base64, \
+    to_bytes, Base64Bytes
+from .content_key import ContentKey, ContentKeyList, \
+    COMMON_ENCRYPTION_SCHEMES
+from .parser import fromstring
+
+# common encryption schemes, stored as their index in the table
+SCHEMES = COMMON_ENCRYPTION_SCHEMES
+SCHEME_CODES = {scheme: code for code, scheme in enumerate(SCHEMES)}
+KID_SIZE = 16
+# unused bytes a column keeps before compacting its data
+COMPACT_THRESHOLD = 64 * 1024
+# ContentKey properties stored as raw bytes, and the columns holding them
+BINARY_COLUMNS = {
+    "cek": "_ceks",
+    "explicit_iv": "_explicit_ivs",
+    "value_mac": "_value_macs",
+}
+
+
+def _stored(value):
+    """
+    A binary ContentKey value as stored in a column: raw bytes, or base64
+    text if encoding its bytes wouldn't give the same text back (e.g. with
+    line breaks), so it is written as it was given
+    """
+    if isinstance(value, Base64Bytes):
+        value = value.decode("ascii")
+    if not isinstance(value, str):
+        return value
+    raw = b64decode(value)
+    if b64encode(raw) != value.encode("ascii"):
+        return value
+    return raw
+
+
+class BytesColumn:
+    """
+    Column of byte strings, base64 strings or None, stored one after another
+    in a bytearray with the offset and length of each row, -1 for None, and
+    whether the row holds a string
+
+    Replaced and deleted values are left in the bytearray until they take
+    up more than half of it
+    """
+    __slots__ = ("data", "offsets", "lengths", "texts", "unused")
+
+    def __init__(self):
+        self.data = bytearray()
+        self.offsets = array("Q")
+        self.lengths = array("i")
+        self.texts = bytearray()
+        self.unused = 0
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def __getitem__(self, row):
+        length = self.lengths[row]
+        if length < 0:
+            return None
+        offset = self.offsets[row]
+        value = bytes(self.data[offset:offset + length])
+        return value.decode("ascii") if self.texts[row] else value
+
+    def __setitem__(self, row, value):
+        self.unused += max(self.lengths[row], 0)
+        self.offsets[row] = len(self.data)
+        self.lengths[row] = self._add(value)
+        self.texts[row] = isinstance(value, str)
+        self._compact()
+
+    def __delitem__(self, row):
+        self.unused += max(self.lengths[row], 0)
+        del self.offsets[row]
+        del self.lengths[row]
+        del self.texts[row]
+        self._compact()
+
+    def insert(self, row, value):
+        self.offsets.insert(row, len(self.data))
+        self.lengths.insert(row, self._add(value))
+        self.texts.insert(row, isinstance(value, str))
+
+    def append(self, value):
+        self.offsets.append(len(self.data))
+        self.lengths.append(self._add(value))
+        self.texts.append(isinstance(value, str))
+
+    def reverse(self):
+        self.offsets.reverse()
+        self.lengths.reverse()
+        self.texts.reverse()
+
+    def _add(self, value):
+        """Add value to the data, returns its length"""
+        if value is None:
+            return -1
+        if isinstance(value, str):
+            value = value.encode("ascii")
+        self.data += value
+        return len(value)
+
+    def _compact(self):
+        if (self.unused < COMPACT_THRESHOLD or
+                self.unused * 2 < len(self.data)):
+            return
+        data = bytearray()
+        offsets = array("Q")
+        for offset, length in zip(self.offsets, self.lengths):
+            offsets.append(len(data))
+            if length > 0:
+                data += self.data[offset:offset + length]
+        self.data = data
+        self.offsets = offsets
+        self.unused = 0
+
+
+def _column_property(name, doc):
+    def fget(self):
+        return self._table._get(self._row, name)
+
+    def fset(self, value):
+        self._table._set(self._row, name, value)
+
+    return property(fget, fset, doc=doc)
+
+
+class ContentKeyView(ContentKey):
+    """
+    ContentKey reading and writing a row of a ContentKeyTable, handed out
+    by the table rather than created directly
+
+    Views refer to their row by position, inserting or deleting rows before
+    it makes the view refer to another key. Nothing is cached on a view as
+    the row can also change through other views
+    """
+    __slots__ = ("_table", "_row")
+    _cache_fragment = False
+
+    def __init__(self, table, row):
+        self._table = table
+        self._row = row
+
+    kid = _column_property("kid", "key ID as a UUID")
+    cek = _column_property("cek", "content key, base64 encoded")
+    common_encryption_scheme = _column_property(
+        "common_encryption_scheme", "cenc, cbc1, cens or cbcs")
+    explicit_iv = _column_property("explicit_iv", "IV, base64 encoded")
+    value_mac = _column_property("value_mac", "MAC, base64 encoded")
+    cek_bytes = _column_property("cek_bytes", "content key as raw bytes")
+    explicit_iv_bytes = _column_property("explicit_iv_bytes",
+                                         "IV as raw bytes")
+    value_mac_bytes = _column_property("value_mac_bytes", "MAC as raw bytes")
+
+    def _cached(self, key, build):
+        return build()
+
+    def _invalidate(self):
+        self._table._invalidate()
+
+    def __reduce__(self):
+        # pickled as the key it currently holds
+        return self.to_content_key().__reduce__()
+
+    def to_content_key(self):
+        """Returns a ContentKey with the values of the row"""
+        return self._table._content_key(self._row)
+
+
+class KidIndex(Mapping):
+    """ContentKeyTable.by_kid, looked up with the table's binary search"""
+    __slots__ = ("_table",)
+
+    def __init__(self, table):
+        self._table = table
+
+    def __getitem__(self, kid):
+        try:
+            row = self._table.index_of(index_key(kid))
+        except ValueError:
+            raise KeyError(kid)
+        return ContentKeyView(self._table, row)
+
+    def __iter__(self):
+        return iter(dict.fromkeys(key.kid for key in self._table))
+
+    def __len__(self):
+        return len(set(bytes(self._table._kids[start:start + KID_SIZE])
+                       for start in range(0, len(self._table._kids),
+                                          KID_SIZE)))
+
+
+class ContentKeyTable(ContentKeyList):
+    """
+    List of ContentKeys stored in columns: key IDs in a bytearray of 16 bytes
+    per key, the common encryption scheme as a code in an array and the
+    content key, explicit IV and value MAC as bytes in BytesColumns
+
+    Items are ContentKeyViews of the rows, setting or inserting a ContentKey
+    copies its values into the table. Values are stored decoded, base64
+    which decoding and encoding again wouldn't give back is kept as text.
+    get() and index_of() find a key by its key ID with a binary search
+    """
+    __slots__ = ("_kids", "_schemes", "_ceks", "_explicit_ivs",
+                 "_value_macs")
+    # by_kid searches the rows instead
+    _index_keys = {}
+
+    def __init__(self, *args, **kwargs):
+        self._clear_rows()
+        super().__init__(*args, **kwargs)
+
+    def _clear_rows(self):
+        self._kids = bytearray()
+        self._schemes = array("B")
+        self._ceks = BytesColumn()
+        self._explicit_ivs = BytesColumn()
+        self._value_macs = BytesColumn()
+
+    @classmethod
+    def from_list(cls, content_keys):
+        """
+        Create a ContentKeyTable from a ContentKeyList or other iterable of
+        ContentKeys
+        """
+        table = cls()
+        for content_key in content_keys:
+            table.check(content_key)
+            table._append_row(table._row_values(content_key))
+        return table
+
+    @classmethod
+    def _from_checked(cls, items):
+        # e.g. from from_records(), the keys are only used to fill the rows
+        table = cls()
+        for content_key in items:
+            table._append_row(table._row_values(content_key))
+        return table
+
+    def to_list(self):
+        """Returns a ContentKeyList of ContentKey objects of the rows"""
+        content_key_list = ContentKeyList()
+        content_key_list._list = [
+            self._content_key(row) for row in range(len(self))]
+        return content_key_list
+
+    def _columns(self):
+        return (self._ceks, self._explicit_ivs, self._value_macs)
+
+    def _row_values(self, content_key):
+        """The values stored for a ContentKey, in _columns() order"""
+        if isinstance(content_key, ContentKeyView):
+            return content_key._table._row(content_key._row)
+        return (content_key.kid.bytes,
+                SCHEME_CODES[content_key.common_encryption_scheme],
+                _stored(content_key._cek),
+                _stored(content_key._explicit_iv),
+                _stored(content_key._value_mac))
+
+    def _row(self, row):
+        start = row * KID_SIZE
+        return (bytes(self._kids[start:start + KID_SIZE]),
+                self._schemes[row],
+                *(column[row] for column in self._columns()))
+
+    def _append_row(self, values):
+        kid, scheme, *column_values = values
+        self._kids += kid
+        self._schemes.append(scheme)
+        for column, value in zip(self._columns(), column_values):
+            column.append(value)
+
+    def _content_key(self, row):
+        kid, scheme, cek, explicit_iv, value_mac = self._row(row)
+        return ContentKey._from_trusted(
+            uuid.UUID(bytes=kid), cek, SCHEMES[scheme], explicit_iv,
+            value_mac)
+
+    def _get(self, row, name):
+        """Value of a ContentKey property of a row"""
+        if name == "kid":
+            start = row * KID_SIZE
+            return uuid.UUID(bytes=bytes(self._kids[start:start + KID_SIZE]))
+        if name == "common_encryption_scheme":
+            return SCHEMES[self._schemes[row]]
+        if name in BINARY_COLUMNS:
+            return to_base64(getattr(self, BINARY_COLUMNS[name])[row])
+        return to_bytes(
+            getattr(self, BINARY_COLUMNS[name[:-len("_bytes")]])[row])
+
+    def _set(self, row, name, value):
+        """Set a ContentKey property of a row, checked by its setter"""
+        content_key = self._content_key(row)
+        setattr(content_key, name, value)
+        self[row] = content_key
+
+    def _row_index(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("ContentKeyTable index out of range")
+        return index
+
+    def __len__(self):
+        return len(self._schemes)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [ContentKeyView(self, row)
+                    for row in range(len(self))[index]]
+        return ContentKeyView(self, self._row_index(index))
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield ContentKeyView(self, row)
+
+    def __setitem__(self, index, value):
+        self.check(value)
+        row = self._row_index(index)
+        kid, scheme, *column_values = self._row_values(value)
+        start = row * KID_SIZE
+        self._kids[start:start + KID_SIZE] = kid
+        self._schemes[row] = scheme
+        for column, column_value in zip(self._columns(), column_values):
+            column[row] = column_value
+        self._invalidate()
+
+    def __delitem__(self, index):
+        if isinstance(index, slice):
+            rows = sorted(range(len(self))[index], reverse=True)
+        else:
+            rows = [self._row_index(index)]
+        for row in rows:
+            start = row * KID_SIZE
+            del self._kids[start:start + KID_SIZE]
+            del self._schemes[row]
+            for column in self._columns():
+                del column[row]
+        self._invalidate()
+
+    def pop(self, index=-1):
+        # MutableSequence.pop would return a view of the row it deletes
+        row = self._row_index(index)
+        content_key = self._content_key(row)
+        del self[row]
+        return content_key
+
+    def insert(self, index, value):
+        self.check(value)
+        # clamped as list.insert does
+        if index < 0:
+            index = max(index + len(self), 0)
+        row = min(index, len(self))
+        kid, scheme, *column_values = self._row_values(value)
+        start = row * KID_SIZE
+        self._kids[start:start] = kid
+        self._schemes.insert(row, scheme)
+        for column, column_value in zip(self._columns(), column_values):
+            column.insert(row, column_value)
+        self._invalidate()
+
+    def reverse(self):
+        # MutableSequence.reverse swaps items, which views can't do
+        self._kids[:] = b"".join(
+            self._kids[start:start + KID_SIZE]
+            for start in range(len(self._kids) - KID_SIZE, -1, -KID_SIZE))
+        self._schemes.reverse()
+        for column in self._columns():
+            column.reverse()
+        self._invalidate()
+
+    @property
+    def list(self):
+        """A new list of views of the rows"""
+        return list(self)
+
+    @list.setter
+    def list(self, l):
+        if not isinstance(l, list):
+            raise TypeError("must be a list")
+        for content_key in l:
+            self.check(content_key)
+        rows = [self._row_values(content_key) for content_key in l]
+        self._clear_rows()
+        for values in rows:
+            self._append_row(values)
+        self._invalidate()
+
+    def _children(self):
+        # views aren't kept, changes through them invalidate the table
+        return ()
+
+    def __reduce__(self):
+        return (_from_columns, (type(self), bytes(self._kids),
+                                self._schemes.tobytes(), self._columns()))
+
+    def element(self):
+        el = etree.Element("ContentKeyList", nsmap=NSMAP)
+        for content_key in self:
+            el.append(content_key._build_element())
+        return el
+
+    def _kid_order(self):
+        """Rows sorted by key ID, cached until the table changes"""
+        def build():
+            kids = self._kids
+            return array("Q", sorted(
+                range(len(self)),
+                key=lambda row: kids[row * KID_SIZE:(row + 1) * KID_SIZE]))
+
+        return self._cached("kid_order", build)
+
+    def index_of(self, kid):
+        """
+        Returns the row of the first content key with kid, a UUID or string,
+        raises KeyError if there is none
+        """
+        target = (kid if isinstance(kid, uuid.UUID) else uuid.UUID(kid)).bytes
+        kids = self._kids
+        order = self._kid_order()
+        low, high = 0, len(order)
+        while low < high:
+            middle = (low + high) // 2
+            start = order[middle] * KID_SIZE
+            if kids[start:start + KID_SIZE] < target:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(order):
+            start = order[low] * KID_SIZE
+            if kids[start:start + KID_SIZE] == target:
+                return order[low]
+        raise KeyError(kid)
+
+    @property
+    def by_kid(self):
+        """Mapping of key ID to a view of its row"""
+        return KidIndex(self)
+
+    def get(self, kid, default=None):
+        """Returns a view of the content key with kid, or default"""
+        try:
+            return ContentKeyView(self, self.index_of(kid))
+        except KeyError:
+            return default
+
+    @classmethod
+    def parse(cls, xml, trusted=False, kids=None):
+        """
+        Parse and return new ContentKeyTable, the arguments are as for
+        ContentKeyList.parse. Keys are parsed one at a time into the table
+        """
+        if isinstance(xml, (str, bytes)):
+            xml = fromstring(xml)
+        if kids is not None:
+            kids = normalize_kids(kids)
+
+        table = cls()
+        for element in xml:
+            if TAG_CLASSES.get(element.tag) is not ContentKey:
+                continue
+            if kids is None or kid_selected(element, kids):
+                table._append_row(table._row_values(
+                    ContentKey.parse(element, trusted)))
+        return table
+
+    @classmethod
+    def from_dict(cls, data, trusted=False):
+        """
+        Create a ContentKeyTable from a list of ContentKey dicts, as returned
+        by to_dict()
+
+        If trusted is True the values are not checked
+        """
+        table = cls()
+        for item in data:
+            table._append_row(table._row_values(
+                ContentKey.from_dict(item, trusted)))
+        return table
+
+
+def _from_columns(cls, kids, schemes, columns):
+    """Rebuild a pickled ContentKeyTable"""
+    table = cls()
+    table._kids = bytearray(kids)
+    table._schemes = array("B", schemes)
+    table._ceks, table._explicit_ivs, table._value_macs = columns
+    return table
@@ -1,12 +1,76 @@
 """
 Root CPIX class
 """
+import codecs
+import json
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from copy import deepcopy
+from io import BytesIO
+from itertools import groupby, islice
 from . import etree, ContentKeyList, DRMSystemList, UsageRuleList, PeriodList,\
-    KeyPeriodFilter, DeliveryDataList, XSI, NSMAP
-from .base import CPIXComparableBase
+    KeyPeriodFilter, DeliveryDataList, XSI, NSMAP, TAG_CLASSES, ContentKey, \
+    DRMSystem, UsageRule, Period, DeliveryData
+from .base import CPIXComparableBase, append_elements, drop_none, \
+    field_digest, normalize_kids
+from .parser import fromstring
+from . import fast
+from .compression import open_write
+
+# section list classes mapped to the CPIX property holding them, in the
+# order they are written out
+SECTIONS = {
+    DeliveryDataList: "delivery_datas",
+    ContentKeyList: "content_keys",
+    DRMSystemList: "drm_systems",
+    PeriodList: "periods",
+    UsageRuleList: "usage_rules",
+}
+# sections whose items can be selected by key ID
+KID_SECTIONS = (ContentKeyList, DRMSystemList, UsageRuleList)
+# item classes mapped to the section list class they are written in
+ITEM_SECTIONS = {
+    DeliveryData: DeliveryDataList,
+    ContentKey: ContentKeyList,
+    DRMSystem: DRMSystemList,
+    Period: PeriodList,
+    UsageRule: UsageRuleList,
+}
+# comment text marking where fragments go when serializing the tags around
+# them
+PLACEHOLDER = "cpix-writer-placeholder"
+# number of items serialized together by each task when writing with workers
+WRITE_CHUNK_SIZE = 1000
+
+
+def _chunked(items, size):
+    """Yields lists of up to size items of an iterator"""
+    return iter(lambda: list(islice(items, size)), [])
+
+
+def _section_classes(sections):
+    """Convert section element names to their list classes"""
+    classes = set()
+    for section in sections:
+        cls = TAG_CLASSES.get(section)
+        if cls not in SECTIONS:
+            raise ValueError("unknown section: {section}".format(
+                section=section))
+        classes.add(cls)
+    return classes
+
+
+def _parse_section(cls, element, trusted=False, kids=None):
+    """Parse a section element, selecting items by key ID where possible"""
+    if kids is not None and cls in KID_SECTIONS:
+        return cls.parse(element, trusted, kids)
+    return cls.parse(element, trusted)
 
 
 class CPIX(CPIXComparableBase):
+    _child_attributes = tuple("_" + name for name in SECTIONS.values())
+
     def __init__(self,
                  content_keys=None,
                  drm_systems=None,
@@ -22,6 +86,10 @@ class CPIX(CPIXComparableBase):
         self._delivery_datas = DeliveryDataList()
         self._content_id = None
         self._version = None
+        # unparsed section elements of a lazily parsed document, keyed by
+        # property name, removed once the section is materialized or replaced
+        self._lazy_sections = {}
+        self._parse_options = {}
 
         if content_keys is not None:
             self.content_keys = content_keys
@@ -40,45 +108,57 @@ class CPIX(CPIXComparableBase):
 
     @property
     def content_keys(self):
+        if "content_keys" in self._lazy_sections:
+            self._materialize("content_keys", ContentKeyList)
         return self._content_keys
 
     @content_keys.setter
     def content_keys(self, content_keys):
         if isinstance(content_keys, ContentKeyList):
-            self._content_keys = content_keys
+            self._lazy_sections.pop("content_keys", None)
+            self._set_child("_content_keys", content_keys)
         else:
             raise TypeError("content_keys should be a ContentKeyList")
 
     @property
     def drm_systems(self):
+        if "drm_systems" in self._lazy_sections:
+            self._materialize("drm_systems", DRMSystemList)
         return self._drm_systems
 
     @drm_systems.setter
     def drm_systems(self, drm_systems):
         if isinstance(drm_systems, DRMSystemList):
-            self._drm_systems = drm_systems
+            self._lazy_sections.pop("drm_systems", None)
+            self._set_child("_drm_systems", drm_systems)
         else:
             raise TypeError("drm_systems should be a DRMSystemList")
 
     @property
     def usage_rules(self):
+        if "usage_rules" in self._lazy_sections:
+            self._materialize("usage_rules", UsageRuleList)
         return self._usage_rules
 
     @usage_rules.setter
     def usage_rules(self, usage_rules):
         if isinstance(usage_rules, UsageRuleList):
-            self._usage_rules = usage_rules
+            self._lazy_sections.pop("usage_rules", None)
+            self._set_child("_usage_rules", usage_rules)
         else:
             raise TypeError("usage_rules should be a UsageRuleList")
 
     @property
     def periods(self):
+        if "periods" in self._lazy_sections:
+            self._materialize("periods", PeriodList)
         return self._periods
 
     @periods.setter
     def periods(self, periods):
         if isinstance(periods, PeriodList):
-            self._periods = periods
+            self._lazy_sections.pop("periods", None)
+            self._set_child("_periods", periods)
         else:
             raise TypeError("periods should be a PeriodList")
 
@@ -90,8 +170,10 @@ class CPIX(CPIXComparableBase):
     def content_id(self, content_id):
         if isinstance(content_id, str):
             self._content_id = content_id
+            self._invalidate()
         elif content_id is None:
             self._content_id = None
+            self._invalidate()
         else:
             raise TypeError("content_id should be a string")
 
@@ -103,22 +185,57 @@ class CPIX(CPIXComparableBase):
     def version(self, version):
         if isinstance(version, str):
             self._version = version
+            self._invalidate()
         elif version is None:
             self._version = None
+            self._invalidate()
         else:
             raise TypeError("version should be a string")
 
     @property
     def delivery_datas(self):
+        if "delivery_datas" in self._lazy_sections:
+            self._materialize("delivery_datas", DeliveryDataList)
         return self._delivery_datas
 
     @delivery_datas.setter
     def delivery_datas(self, delivery_datas):
         if isinstance(delivery_datas, DeliveryDataList):
-            self._delivery_datas = delivery_datas
+            self._lazy_sections.pop("delivery_datas", None)
+            self._set_child("_delivery_datas", delivery_datas)
         else:
             raise TypeError("delivery_datas should be a DeliveryDataList")
 
+    def __reduce__(self):
+        # untouched sections of a lazily parsed document are pickled as
+        # their XML and stay lazy
+        sections = tuple(
+            etree.tostring(self._lazy_sections[name])
+            if name in self._lazy_sections else getattr(self, "_" + name)
+            for name in SECTIONS.values())
+        return (self._from_pickle_state, ((
+            self._content_id, self._version, sections,
+            self._parse_options),))
+
+    @classmethod
+    def _from_pickle_state(cls, state):
+        content_id, version, sections, parse_options = state
+        new_cpix = cls()
+        new_cpix._content_id = content_id
+        new_cpix._version = version
+        for name, section in zip(SECTIONS.values(), sections):
+            if isinstance(section, bytes):
+                new_cpix._lazy_sections[name] = fromstring(section)
+            else:
+                setattr(new_cpix, "_" + name, section)
+        new_cpix._parse_options = parse_options
+        return new_cpix
+
+    def _materialize(self, name, cls):
+        """Parse a section left unparsed by a lazy parse"""
+        self._set_child("_" + name, _parse_section(
+            cls, self._lazy_sections.pop(name), **self._parse_options))
+
     def element(self):
         el = etree.Element("CPIX", nsmap=NSMAP)
         el.set("{{{xsi}}}schemaLocation".format(
@@ -129,35 +246,154 @@ class CPIX(CPIXComparableBase):
         if (self.version is not None and
                 isinstance(self.version, str)):
             el.set("version", self.version)
-        if (self.delivery_datas is not None and
-                isinstance(self.delivery_datas, DeliveryDataList) and
-                len(self.delivery_datas) > 0):
-            el.append(self.delivery_datas.element())
-        if (self.content_keys is not None and
-                isinstance(self.content_keys, ContentKeyList) and
-                len(self.content_keys) > 0):
-            el.append(self.content_keys.element())
-        if (self.drm_systems is not None and
-                isinstance(self.drm_systems, DRMSystemList) and
-                len(self.drm_systems) > 0):
-            el.append(self.drm_systems.element())
-        if (self.periods is not None and
-                isinstance(self.periods, PeriodList) and
-                len(self.periods) > 0):
-            el.append(self.periods.element())
-        if (self.usage_rules is not None and
-                isinstance(self.usage_rules, UsageRuleList) and
-                len(self.usage_rules) > 0):
-            el.append(self.usage_rules.element())
+        for cls, name in SECTIONS.items():
+            if (name in self._lazy_sections and
+                    (cls not in KID_SECTIONS or
+                     self._parse_options.get("kids") is None)):
+                # untouched section of a lazily parsed document, re-emit the
+                # original subtree rather than round-tripping it
+                section = self._lazy_sections[name]
+                if len(section) > 0:
+                    el.append(deepcopy(section))
+                continue
+            section = getattr(self, name)
+            if (section is not None and
+                    isinstance(section, cls) and
+                    len(section) > 0):
+                el.append(section.element())
         return el
 
+    def _build_key(self):
+        return ("CPIX",
+                self.content_id if isinstance(self.content_id, str) else None,
+                self.version if isinstance(self.version, str) else None,
+                tuple(None if section is None else section._key()
+                      for section in self._written_sections()))
+
+    def _build_digest(self):
+        return field_digest(
+            *self._key()[:3],
+            *(None if section is None else section.digest()
+              for section in self._written_sections()))
+
+    def _build_canonical(self):
+        # written from the objects rather than re-emitting lazy sections as
+        # they were parsed
+        self._written_sections()
+        return super()._build_canonical()
+
+    def _written_sections(self):
+        """
+        The sections element() writes, None for those left out, lazy
+        sections are materialized to compare them as objects
+        """
+        sections = []
+        for cls, name in SECTIONS.items():
+            section = getattr(self, name)
+            if (section is not None and
+                    isinstance(section, cls) and
+                    len(section) > 0):
+                sections.append(section)
+            else:
+                sections.append(None)
+        return sections
+
+    def to_bytes(self, pretty=True, backend="lxml"):
+        """
+        Returns the document as UTF-8 encoded XML
+
+        backend "lxml" builds the element tree and serializes it, as
+        pretty_print() does. "fast" writes the XML directly from templates
+        without building a tree, giving the same output in less time
+        """
+        if backend == "lxml":
+            return self.pretty_print(pretty_print=pretty)
+        if backend == "fast":
+            return fast.to_bytes(self, pretty)
+        raise ValueError("unknown backend: {backend}".format(backend=backend))
+
+    def write(self, target, pretty=True, encoding="utf-8",
+              compression="auto", workers=1):
+        """
+        Write XML to a file name, path-like object or binary file object one
+        item at a time, without building the whole tree. The output is
+        identical to pretty_print() with the same pretty_print and encoding
+        arguments
+
+        compression can be "gzip", "xz", "bz2" or None, the XML is
+        compressed as it is written. "auto" picks it from the extension of a
+        file name (.gz, .xz or .bz2), file objects are not compressed
+
+        With more than one worker, chunks of items are serialized
+        concurrently, see CPIXWriter.write_many
+        """
+        with open_write(target, compression) as fileobj, \
+                CPIXWriter(fileobj, content_id=self.content_id,
+                           version=self.version, pretty=pretty,
+                           encoding=encoding) as writer:
+            # written as items of their lists, so unchanged items use the
+            # fragments they have cached
+            writer._write_chunks(
+                ((cls, chunk, items)
+                 for cls, items in ((cls, getattr(self, name))
+                                    for cls, name in SECTIONS.items())
+                 for chunk in _chunked(iter(items), WRITE_CHUNK_SIZE)),
+                workers)
+
+    def pretty_print(self, workers=1, **kwargs):
+        """
+        Pretty print XML
+
+        With more than one worker the document is serialized by write() with
+        those workers, giving the same output. Only the pretty_print and
+        encoding keyword arguments can be used then
+        """
+        if workers <= 1 or kwargs.get("method") == "c14n2" or \
+                self._lazy_sections:
+            # lazily parsed sections are written from their original XML
+            return super().pretty_print(**kwargs)
+
+        pretty = kwargs.pop("pretty_print", True)
+        encoding = kwargs.pop("encoding", "utf-8")
+        if kwargs:
+            raise TypeError("{names} can't be used with workers".format(
+                names=", ".join(kwargs)))
+
+        def build():
+            output = BytesIO()
+            self.write(output, pretty=pretty, encoding=encoding,
+                       compression=None, workers=workers)
+            return output.getvalue()
+
+        # the same cache entry as pretty_print without workers
+        return self._cached(
+            ("pretty_print", ("encoding", encoding), ("pretty_print", pretty)),
+            build)
+
     @staticmethod
-    def parse(xml):
+    def parse(xml, lazy=False, trusted=False, kids=None, sections=None):
         """
         Parse a CPIX xml
+
+        If lazy is True, the section lists are only parsed when first
+        accessed, untouched sections are serialized from the original XML
+
+        If trusted is True the input is assumed to be valid (e.g. it has
+        passed cpix.validate) and the base64 and UUID checks done when
+        constructing each object are skipped
+
+        If kids is given only the content keys, DRM systems and usage rules
+        for those key IDs are parsed. If sections is given only those
+        section elements (e.g. {"ContentKeyList", "DRMSystemList"}) are
+        parsed, the others are left empty. Other elements are skipped before
+        any objects are built for them
         """
         if isinstance(xml, (str, bytes)):
-            xml = etree.fromstring(xml)
+            xml = fromstring(xml)
+        if kids is not None:
+            kids = normalize_kids(kids)
+        if sections is not None:
+            sections = _section_classes(sections)
 
         new_cpix = CPIX()
 
@@ -167,28 +403,95 @@ class CPIX(CPIXComparableBase):
         if "version" in xml.attrib:
             new_cpix.version = xml.attrib["version"]
 
-        for element in xml.getchildren():
-            tag = etree.QName(element.tag).localname
+        for element in xml:
+            cls = TAG_CLASSES.get(element.tag)
+            if cls not in SECTIONS:
+                continue
+            if sections is not None and cls not in sections:
+                continue
+            name = SECTIONS[cls]
+            if lazy:
+                new_cpix._lazy_sections[name] = element
+            else:
+                setattr(new_cpix, name,
+                        _parse_section(cls, element, trusted, kids))
+
+        if lazy:
+            new_cpix._parse_options = {"trusted": trusted, "kids": kids}
 
-            if tag == "ContentKeyList":
-                new_cpix.content_keys = ContentKeyList.parse(element)
-            if tag == "DRMSystemList":
-                new_cpix.drm_systems = DRMSystemList.parse(element)
-            if tag == "ContentKeyUsageRuleList":
-                new_cpix.usage_rules = UsageRuleList.parse(element)
-            if tag == "ContentKeyPeriodList":
-                new_cpix.periods = PeriodList.parse(element)
-            if tag == "DeliveryDataList":
-                new_cpix.delivery_datas = DeliveryDataList.parse(element)
+        return new_cpix
+
+    def to_dict(self):
+        """
+        Returns a dict of the content ID and version if set, and each
+        non-empty section as a list of item dicts keyed by property name
+        """
+        data = drop_none({
+            "content_id": self.content_id,
+            "version": self.version,
+        })
+        for name in SECTIONS.values():
+            section = getattr(self, name)
+            if len(section) > 0:
+                data[name] = section.to_dict()
+        return data
+
+    @staticmethod
+    def from_dict(data, trusted=False):
+        """
+        Create a CPIX from a dict as returned by to_dict()
 
+        If trusted is True the values are not checked, as for parse
+        """
+        new_cpix = CPIX(content_id=data.get("content_id"),
+                        version=data.get("version"))
+        for cls, name in SECTIONS.items():
+            if name in data:
+                setattr(new_cpix, name, cls.from_dict(data[name], trusted))
         return new_cpix
 
+    def iter_json(self):
+        """
+        Encode to_dict() as JSON in chunks, one per item, so the dicts of
+        the whole document never have to be built at once, e.g.
+        fileobj.writelines(cpix.iter_json())
+        """
+        encode = json.JSONEncoder().encode
+        yield "{"
+        separator = ""
+        for name, value in drop_none({
+                "content_id": self.content_id,
+                "version": self.version}).items():
+            yield separator + encode(name) + ": " + encode(value)
+            separator = ", "
+        for name in SECTIONS.values():
+            section = getattr(self, name)
+            if len(section) == 0:
+                continue
+            yield separator + encode(name) + ": ["
+            separator = ", "
+            item_separator = ""
+            for item in section:
+                yield item_separator + encode(item.to_dict())
+                item_separator = ", "
+            yield "]"
+        yield "}"
+
+    def to_json(self, **kwargs):
+        """
+        Returns to_dict() encoded as JSON, built by iter_json() unless there
+        are keyword arguments to pass on to json.dumps
+        """
+        if kwargs:
+            return super().to_json(**kwargs)
+        return "".join(self.iter_json())
+
     # content check functions
     def check_usage_rules(self):
         """
         Checks each usage rule references a valid content key
         """
-        keys = [key.kid for key in self.content_keys]
+        keys = self.content_keys.by_kid
         errors = []
 
         for usage_rule in self.usage_rules:
@@ -205,7 +508,7 @@ class CPIX(CPIXComparableBase):
         """
         Checks each drm system references a valid content key
         """
-        keys = [key.kid for key in self.content_keys]
+        keys = self.content_keys.by_kid
         errors = []
 
         for drm_system in self.drm_systems:
@@ -253,3 +556,222 @@ class CPIX(CPIXComparableBase):
             return (True, errors)
         else:
             return (False, errors)
+
+
+class CPIXWriter():
+    """
+    Incrementally write a CPIX document to a binary file object
+
+    Items (ContentKey, DRMSystem, UsageRule, Period and DeliveryData objects)
+    are serialized as they are passed to write(), so the document never has
+    to be held in memory. Items must be written in document order, i.e.
+    delivery data, content keys, DRM systems, periods then usage rules. The
+    output is identical to pretty_print() of a CPIX holding the same items.
+
+    Use as a context manager, or call close() to finish the document:
+
+        with CPIXWriter(f, content_id="movie") as writer:
+            for content_key in content_keys:
+                writer.write(content_key)
+    """
+
+    def __init__(self, fileobj, content_id=None, version=None, pretty=True,
+                 encoding="utf-8"):
+        self._file = fileobj
+        self._pretty = pretty
+        self._encoding = encoding
+        self._root = CPIX(content_id=content_id, version=version).element()
+        self._order = list(SECTIONS)
+        self._section = None
+        self._started = False
+        self._closed = False
+        # scratch trees of each thread serializing items
+        self._local = threading.local()
+
+        # serialize the root and each section around placeholders once, to
+        # find the bytes of their tags and the whitespace between children
+        self._root_open, self._root_indent, self._root_close = \
+            self._pieces(self._root, self._root)
+        # items are serialized in a scratch tree, so they get the same
+        # namespace declarations and indentation as in the full document
+        scratch = etree.Element("CPIX", nsmap=NSMAP)
+        scratch_open, _, _ = self._pieces(scratch, scratch)
+        self._sections = {}
+        for cls in self._order:
+            section = cls().element()
+            scratch.append(section)
+            before, item_indent, after = self._pieces(scratch, section)
+            scratch.remove(section)
+            self._sections[cls] = (
+                before,
+                after,
+                before[len(scratch_open) + len(self._root_indent):
+                       len(before) - len(item_indent)],
+                item_indent,
+                after[:len(after) - len(self._root_close)],
+            )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+
+    def _tostring(self, element):
+        return etree.tostring(element, pretty_print=self._pretty,
+                              encoding=self._encoding)
+
+    def _encoded_placeholder(self):
+        """
+        The placeholder comment as it is encoded within the document, without
+        the byte order mark encodings such as utf-16 start with
+        """
+        encoder = codecs.getincrementalencoder(self._encoding)()
+        encoder.encode("")
+        return encoder.encode("<!--{text}-->".format(text=PLACEHOLDER))
+
+    def _pieces(self, root, parent):
+        """
+        Serialize root with two placeholder comments appended to parent,
+        returns the bytes before, between and after them
+        """
+        placeholders = [etree.Comment(PLACEHOLDER), etree.Comment(PLACEHOLDER)]
+        parent.extend(placeholders)
+        try:
+            data = self._tostring(root)
+        finally:
+            for placeholder in placeholders:
+                parent.remove(placeholder)
+        before, between, after = data.split(self._encoded_placeholder())
+        if root is parent:
+            before = before[:len(before) - len(between)]
+        return before, between, after
+
+    def _section_of(self, item):
+        for item_cls, cls in ITEM_SECTIONS.items():
+            if isinstance(item, item_cls):
+                return cls
+        raise TypeError("{} can't be written to a CPIX document".format(item))
+
+    def _close_section(self):
+        if self._section is not None:
+            self._file.write(self._sections[self._section][4])
+            self._section = None
+
+    def _start_section(self, cls, item):
+        """Write the tags needed before item, the next item of section cls"""
+        if self._closed:
+            raise ValueError("writer is closed")
+        if self._section is not cls:
+            if (self._section is not None and
+                    self._order.index(cls) < self._order.index(self._section)):
+                raise ValueError("{item} written after {section}".format(
+                    item=type(item).__name__,
+                    section=self._section.__name__))
+            if not self._started:
+                self._file.write(self._root_open)
+                self._started = True
+            self._close_section()
+            self._file.write(self._root_indent)
+            self._file.write(self._sections[cls][2])
+            self._section = cls
+
+    def _fragment(self, cls, items, owner=None):
+        """
+        Serialize items of section cls, some of the items of the list owner
+        if given, returns their bytes separated by the indentation between
+        items. Each thread uses its own scratch tree
+        """
+        before, after, _, _, _ = self._sections[cls]
+        scratch = getattr(self._local, "scratch", None)
+        if scratch is None:
+            scratch = self._local.scratch = etree.Element("CPIX", nsmap=NSMAP)
+            self._local.sections = {}
+        section = self._local.sections.get(cls)
+        if section is None:
+            section = self._local.sections[cls] = cls()._build_element()
+
+        # as the list's element() does, using and filling the fragment
+        # cache of a document's items. Items written on their own aren't
+        # cached, which would keep every written item's XML in memory
+        append_elements(section, items, owner)
+        scratch.append(section)
+        try:
+            data = self._tostring(scratch)
+        finally:
+            scratch.remove(section)
+            del section[:]
+        return data[len(before):len(data) - len(after)]
+
+    def _write_fragment(self, cls, item, fragment):
+        """Write the fragment of a run of items starting with item"""
+        self._start_section(cls, item)
+        self._file.write(self._sections[cls][3])
+        self._file.write(fragment)
+
+    def write(self, item):
+        """
+        Write a ContentKey, DRMSystem, UsageRule, Period or DeliveryData
+        """
+        if self._closed:
+            raise ValueError("writer is closed")
+        cls = self._section_of(item)
+        self._write_fragment(cls, item, self._fragment(cls, [item]))
+
+    def write_many(self, items, workers=1, chunk_size=WRITE_CHUNK_SIZE):
+        """
+        Write an iterable of items, as write() does for each
+
+        With more than one worker, runs of up to chunk_size items of the
+        same section are serialized concurrently in a thread pool and
+        written in order. lxml releases the GIL while serializing
+        """
+        if workers <= 1:
+            for item in items:
+                self.write(item)
+            return
+
+        self._write_chunks(
+            ((cls, chunk, None)
+             for cls, run in groupby(items, self._section_of)
+             for chunk in _chunked(run, chunk_size)),
+            workers)
+
+    def _write_chunks(self, chunks, workers):
+        """
+        Write (section class, items, owning list or None) chunks, serialized
+        concurrently with more than one worker
+        """
+        if workers <= 1:
+            for cls, chunk, owner in chunks:
+                self._write_fragment(cls, chunk[0],
+                                     self._fragment(cls, chunk, owner))
+            return
+
+        # only a few chunks are in flight, so a large document isn't held
+        # in memory as fragments waiting to be written
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for cls, chunk, owner in chunks:
+                pending.append((cls, chunk[0], executor.submit(
+                    self._fragment, cls, chunk, owner)))
+                if len(pending) > 2 * workers:
+                    cls, item, future = pending.popleft()
+                    self._write_fragment(cls, item, future.result())
+            while pending:
+                cls, item, future = pending.popleft()
+                self._write_fragment(cls, item, future.result())
+
+    def close(self):
+        """
+        Finish the document, does not close the file object
+        """
+        if self._closed:
+            return
+        if self._started:
+            self._close_section()
+            self._file.write(self._root_close)
+        else:
+            self._file.write(self._tostring(self._root))
+        self._closed = True
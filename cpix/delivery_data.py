@@ -3,12 +3,16 @@ Delivery Data classes
 """
 from . import etree, b64decode, BinasciiError, NSMAP, DS, PSKC, ENC, \
     CONTENT_KEY_WRAPPING_ALGORITHM, DOCUMENT_KEY_WRAPPING_ALGORITHM, \
-    ENCRYPTED_KEY_MAC_ALGORITHM
-from .base import CPIXComparableBase, CPIXListBase
+    ENCRYPTED_KEY_MAC_ALGORITHM, TAG_CLASSES
+from .base import CPIXComparableBase, CPIXListBase, append_elements, \
+    as_text, drop_none, field_digest, to_base64, to_bytes, check_bytes, \
+    base64_value
+from .parser import fromstring
 
 
 class DeliveryDataList(CPIXListBase):
     """List of DeliveryDatas"""
+    __slots__ = ()
 
     def check(self, value):
         if not isinstance(value, DeliveryData):
@@ -16,34 +20,58 @@ class DeliveryDataList(CPIXListBase):
 
     def element(self):
         el = etree.Element("DeliveryDataList", nsmap=NSMAP)
-        for delivery_data in self:
-            el.append(delivery_data.element())
+        append_elements(el, self)
         return el
 
+    def _build_key(self):
+        return ("DeliveryDataList", tuple(item._key() for item in self))
+
     @staticmethod
-    def parse(xml):
+    def parse(xml, trusted=False):
         """
         Parse and return new DeliveryDataList
+
+        If trusted is True the input is assumed to be valid (e.g. it has
+        passed schema validation) and per value checks are skipped
         """
         if isinstance(xml, (str, bytes)):
-            xml = etree.fromstring(xml)
+            xml = fromstring(xml)
 
         new_delivery_data_list = DeliveryDataList()
 
-        for element in xml.getchildren():
-            tag = etree.QName(element.tag).localname
-            if tag == "DeliveryData":
-                new_delivery_data_list.append(DeliveryData.parse(element))
+        for element in xml:
+            if TAG_CLASSES.get(element.tag) is DeliveryData:
+                new_delivery_data_list.append(
+                    DeliveryData.parse(element, trusted))
+
+        return new_delivery_data_list
+
+    @staticmethod
+    def from_dict(data, trusted=False):
+        """
+        Create a DeliveryDataList from a list of DeliveryData dicts, as
+        returned by to_dict()
 
+        If trusted is True the values are not checked
+        """
+        delivery_datas = [DeliveryData.from_dict(item, trusted)
+                          for item in data]
+        new_delivery_data_list = DeliveryDataList()
+        if trusted:
+            new_delivery_data_list._list = delivery_datas
+        else:
+            new_delivery_data_list.extend(delivery_datas)
         return new_delivery_data_list
 
 
-class DeliveryKey():
+class DeliveryKey(CPIXComparableBase):
     """
     DeliveryKey element
     Has child elements:
         X509Data: contains a X509 Certificate
     """
+    __slots__ = ("_certificate",)
+
     def __init__(self, certificate):
         self._certificate = None
 
@@ -61,9 +89,20 @@ class DeliveryKey():
             except BinasciiError:
                 raise ValueError("certificate is not a valid base64 string")
             self._certificate = certificate
+            self._invalidate()
         else:
             raise TypeError("certificate should be a base64 string")
 
+    @classmethod
+    def _from_trusted(cls, certificate):
+        """
+        Create a DeliveryKey from a value known to be valid, skipping the
+        base64 check done by the property setter
+        """
+        delivery_key = cls.__new__(cls)
+        delivery_key._certificate = certificate
+        return delivery_key
+
     def element(self):
         """Returns XML element"""
         dk = etree.Element("DeliveryKey", nsmap=NSMAP)
@@ -77,25 +116,52 @@ class DeliveryKey():
 
         return dk
 
+    def _build_key(self):
+        return ("DeliveryKey", as_text(self.certificate))
+
     @staticmethod
-    def parse(xml):
+    def parse(xml, trusted=False):
         """
         Parse XML and return DeliveryKey
+
+        If trusted is True the value is not checked
         """
         if isinstance(xml, (str, bytes)):
-            xml = etree.fromstring(xml)
+            xml = fromstring(xml)
 
         cert = xml.find(".//{{{ds}}}X509Certificate".format(ds=DS)).text
 
+        if trusted:
+            return DeliveryKey._from_trusted(cert)
         return DeliveryKey(cert)
 
+    def to_dict(self):
+        """Returns a dict of the value"""
+        return {"certificate": as_text(self.certificate)}
 
-class DocumentKey():
+    @staticmethod
+    def from_dict(data, trusted=False):
+        """
+        Create a DeliveryKey from a dict as returned by to_dict()
+
+        If trusted is True the value is not checked
+        """
+        if trusted:
+            return DeliveryKey._from_trusted(data["certificate"])
+        return DeliveryKey(data["certificate"])
+
+
+class DocumentKey(CPIXComparableBase):
     """
     DocumentKey element
     Has child elements:
         Data: contains the encrypted document Key
+
+    cipher_value_bytes is the encrypted key as raw bytes, stored in the form
+    it was set in and only converted when read in the other
     """
+    __slots__ = ("_cipher_value",)
+
     def __init__(self, cipher_value):
         self._cipher_value = None
 
@@ -103,7 +169,7 @@ class DocumentKey():
 
     @property
     def cipher_value(self):
-        return self._cipher_value
+        return to_base64(self._cipher_value)
 
     @cipher_value.setter
     def cipher_value(self, cipher_value):
@@ -112,10 +178,31 @@ class DocumentKey():
                 b64decode(cipher_value)
             except BinasciiError:
                 raise ValueError("cipher_value is not a valid base64 string")
-            self._cipher_value = cipher_value
+            self._cipher_value = base64_value(cipher_value)
+            self._invalidate()
         else:
             raise TypeError("cipher_value should be a base64 string")
 
+    @property
+    def cipher_value_bytes(self):
+        return to_bytes(self._cipher_value)
+
+    @cipher_value_bytes.setter
+    def cipher_value_bytes(self, cipher_value):
+        self._cipher_value = check_bytes(
+            cipher_value, "cipher_value_bytes", optional=False)
+        self._invalidate()
+
+    @classmethod
+    def _from_trusted(cls, cipher_value):
+        """
+        Create a DocumentKey from a value known to be valid, skipping the
+        base64 check done by the property setter
+        """
+        document_key = cls.__new__(cls)
+        document_key._cipher_value = cipher_value
+        return document_key
+
     def element(self):
         """Returns XML element"""
         dk = etree.Element("DocumentKey", nsmap=NSMAP)
@@ -144,33 +231,60 @@ class DocumentKey():
 
         return dk
 
+    def _build_key(self):
+        return ("DocumentKey", as_text(self.cipher_value))
+
     @staticmethod
-    def parse(xml):
+    def parse(xml, trusted=False):
         """
         Parse XML and return DocumentKey
+
+        If trusted is True the value is not checked
         """
         if isinstance(xml, (str, bytes)):
-            xml = etree.fromstring(xml)
+            xml = fromstring(xml)
 
         cipher_value = xml.find(
             ".//{{{enc}}}CipherValue".format(enc=ENC)).text
 
+        if trusted:
+            return DocumentKey._from_trusted(cipher_value)
         return DocumentKey(cipher_value)
 
+    def to_dict(self):
+        """Returns a dict of the value"""
+        return {"cipher_value": as_text(self.cipher_value)}
 
-class MACMethod():
+    @staticmethod
+    def from_dict(data, trusted=False):
+        """
+        Create a DocumentKey from a dict as returned by to_dict()
+
+        If trusted is True the value is not checked
+        """
+        if trusted:
+            return DocumentKey._from_trusted(as_text(data["cipher_value"]))
+        return DocumentKey(data["cipher_value"])
+
+
+class MACMethod(CPIXComparableBase):
     """
     MACMethod element
     Has child elements:
         Key: contains encrypted MAC Key
+
+    cipher_value_bytes is the encrypted key as raw bytes, stored in the form
+    it was set in and only converted when read in the other
     """
+    __slots__ = ("_cipher_value",)
+
     def __init__(self, cipher_value):
         self._cipher_value = None
         self.cipher_value = cipher_value
 
     @property
     def cipher_value(self):
-        return self._cipher_value
+        return to_base64(self._cipher_value)
 
     @cipher_value.setter
     def cipher_value(self, cipher_value):
@@ -179,10 +293,31 @@ class MACMethod():
                 b64decode(cipher_value)
             except BinasciiError:
                 raise ValueError("cipher_value is not a valid base64 string")
-            self._cipher_value = cipher_value
+            self._cipher_value = base64_value(cipher_value)
+            self._invalidate()
         else:
             raise TypeError("cipher_value should be a base64 string")
 
+    @property
+    def cipher_value_bytes(self):
+        return to_bytes(self._cipher_value)
+
+    @cipher_value_bytes.setter
+    def cipher_value_bytes(self, cipher_value):
+        self._cipher_value = check_bytes(
+            cipher_value, "cipher_value_bytes", optional=False)
+        self._invalidate()
+
+    @classmethod
+    def _from_trusted(cls, cipher_value):
+        """
+        Create a MACMethod from a value known to be valid, skipping the
+        base64 check done by the property setter
+        """
+        mac_method = cls.__new__(cls)
+        mac_method._cipher_value = cipher_value
+        return mac_method
+
     def element(self):
         """Returns XML element"""
         dk = etree.Element("MACMethod", nsmap=NSMAP)
@@ -205,18 +340,40 @@ class MACMethod():
 
         return dk
 
+    def _build_key(self):
+        return ("MACMethod", as_text(self.cipher_value))
+
     @staticmethod
-    def parse(xml):
+    def parse(xml, trusted=False):
         """
         Parse XML and return MACMethod
+
+        If trusted is True the value is not checked
         """
         if isinstance(xml, (str, bytes)):
-            xml = etree.fromstring(xml)
+            xml = fromstring(xml)
 
         cipher_value = xml.find(".//{{{enc}}}CipherValue".format(enc=ENC)).text
 
+        if trusted:
+            return MACMethod._from_trusted(cipher_value)
         return MACMethod(cipher_value)
 
+    def to_dict(self):
+        """Returns a dict of the value"""
+        return {"cipher_value": as_text(self.cipher_value)}
+
+    @staticmethod
+    def from_dict(data, trusted=False):
+        """
+        Create a MACMethod from a dict as returned by to_dict()
+
+        If trusted is True the value is not checked
+        """
+        if trusted:
+            return MACMethod._from_trusted(as_text(data["cipher_value"]))
+        return MACMethod(data["cipher_value"])
+
 
 class DeliveryData(CPIXComparableBase):
     """
@@ -227,6 +384,10 @@ class DeliveryData(CPIXComparableBase):
     Has (technically) optional child element:
         mac_method:   MACMethod
     """
+    _child_attributes = ("_delivery_key", "_document_key", "_mac_method")
+    # owns its children, which refer to it weakly
+    __slots__ = _child_attributes + ("__weakref__",)
+    _cache_fragment = True
 
     def __init__(self, delivery_key, document_key, mac_method=None):
         self._delivery_key = None
@@ -244,7 +405,7 @@ class DeliveryData(CPIXComparableBase):
     @delivery_key.setter
     def delivery_key(self, delivery_key):
         if isinstance(delivery_key, DeliveryKey):
-            self._delivery_key = delivery_key
+            self._set_child("_delivery_key", delivery_key)
         else:
             raise TypeError("delivery_key should be a DeliveryKey")
 
@@ -255,7 +416,7 @@ class DeliveryData(CPIXComparableBase):
     @document_key.setter
     def document_key(self, document_key):
         if isinstance(document_key, DocumentKey):
-            self._document_key = document_key
+            self._set_child("_document_key", document_key)
         else:
             raise TypeError("document_key should be a DocumentKey")
 
@@ -268,7 +429,7 @@ class DeliveryData(CPIXComparableBase):
         if mac_method is None:
             return
         if isinstance(mac_method, MACMethod):
-            self._mac_method = mac_method
+            self._set_child("_mac_method", mac_method)
         else:
             raise TypeError("mac_method should be a MACMethod")
 
@@ -283,23 +444,60 @@ class DeliveryData(CPIXComparableBase):
 
         return el
 
+    def _build_key(self):
+        return ("DeliveryData", self.delivery_key._key(),
+                self.document_key._key(),
+                None if self.mac_method is None else self.mac_method._key())
+
+    def _build_digest(self):
+        return field_digest(
+            "DeliveryData", self.delivery_key.digest(),
+            self.document_key.digest(),
+            None if self.mac_method is None else self.mac_method.digest())
+
     @staticmethod
-    def parse(xml):
+    def parse(xml, trusted=False):
         """
         Parse XML and return DeliveryData
+
+        If trusted is True the values are not checked
         """
         if isinstance(xml, (str, bytes)):
-            xml = etree.fromstring(xml)
+            xml = fromstring(xml)
 
         mac_method = None
 
-        for element in xml.getchildren():
-            tag = etree.QName(element.tag).localname
-            if tag == "DeliveryKey":
-                delivery_key = DeliveryKey.parse(element)
-            if tag == "DocumentKey":
-                document_key = DocumentKey.parse(element)
-            if tag == "MACMethod":
-                mac_method = MACMethod.parse(element)
+        for element in xml:
+            cls = TAG_CLASSES.get(element.tag)
+            if cls is DeliveryKey:
+                delivery_key = DeliveryKey.parse(element, trusted)
+            elif cls is DocumentKey:
+                document_key = DocumentKey.parse(element, trusted)
+            elif cls is MACMethod:
+                mac_method = MACMethod.parse(element, trusted)
 
         return DeliveryData(delivery_key, document_key, mac_method)
+
+    def to_dict(self):
+        """Returns a dict of the child elements' dicts"""
+        return drop_none({
+            "delivery_key": self.delivery_key.to_dict(),
+            "document_key": self.document_key.to_dict(),
+            "mac_method": None if self.mac_method is None else
+            self.mac_method.to_dict(),
+        })
+
+    @staticmethod
+    def from_dict(data, trusted=False):
+        """
+        Create a DeliveryData from a dict as returned by to_dict()
+
+        If trusted is True the values are not checked
+        """
+        mac_method = None
+        if data.get("mac_method") is not None:
+            mac_method = MACMethod.from_dict(data["mac_method"], trusted)
+        return DeliveryData(
+            DeliveryKey.from_dict(data["delivery_key"], trusted),
+            DocumentKey.from_dict(data["document_key"], trusted),
+            mac_method)
@@ -1,12 +1,40 @@
 """
 DRM System classes
 """
-from . import etree, uuid, b64decode, BinasciiError, VALID_SYSTEM_IDS
-from .base import CPIXComparableBase, CPIXListBase
+from operator import attrgetter
+from . import etree, uuid, b64decode, BinasciiError, VALID_SYSTEM_IDS, \
+    TAG_CLASSES
+from .base import CPIXComparableBase, CPIXListBase, append_elements, \
+    as_text, drop_none, normalize_kids, kid_selected, unpickle, \
+    record_columns, convert_column, check_column, record_uuid, \
+    record_base64, record_binary, to_base64, to_bytes, check_bytes, \
+    picklable, IndexView, base64_value
+from .parser import fromstring
 
 
 class DRMSystemList(CPIXListBase):
     """List of DRMSystems"""
+    __slots__ = ()
+    _index_keys = {
+        "by_kid_and_system": (attrgetter("kid", "system_id"), True),
+        "by_system": (attrgetter("system_id"), False),
+    }
+
+    @property
+    def by_kid_and_system(self):
+        """
+        Mapping of (key ID, system ID) to its DRMSystem, kept up to date as
+        the list and its DRM systems change
+        """
+        return IndexView(self, "by_kid_and_system")
+
+    @property
+    def by_system(self):
+        """
+        Mapping of system ID to a list of its DRMSystems, kept up to date as
+        the list and its DRM systems change
+        """
+        return IndexView(self, "by_system")
 
     def check(self, value):
         if not isinstance(value, DRMSystem):
@@ -14,27 +42,89 @@ class DRMSystemList(CPIXListBase):
 
     def element(self):
         el = etree.Element("DRMSystemList")
-        for drm_system in self:
-            el.append(drm_system.element())
+        append_elements(el, self)
         return el
 
+    def _build_key(self):
+        return ("DRMSystemList", tuple(item._key() for item in self))
+
     @staticmethod
-    def parse(xml):
+    def parse(xml, trusted=False, kids=None):
         """
         Parse and return new DRMSystemList
+
+        If trusted is True the input is assumed to be valid (e.g. it has
+        passed schema validation) and per value checks are skipped
+
+        If kids is given only DRM systems for those key IDs are parsed
         """
         if isinstance(xml, (str, bytes)):
-            xml = etree.fromstring(xml)
+            xml = fromstring(xml)
+        if kids is not None:
+            kids = normalize_kids(kids)
 
         new_drm_system_list = DRMSystemList()
+        drm_systems = []
 
-        for element in xml.getchildren():
-            tag = etree.QName(element.tag).localname
-            if tag == "DRMSystem":
-                new_drm_system_list.append(DRMSystem.parse(element))
+        for element in xml:
+            if TAG_CLASSES.get(element.tag) is not DRMSystem:
+                continue
+            if kids is None or kid_selected(element, kids):
+                drm_systems.append(DRMSystem.parse(element, trusted))
+
+        if trusted:
+            new_drm_system_list._list = drm_systems
+        else:
+            new_drm_system_list.extend(drm_systems)
 
         return new_drm_system_list
 
+    @staticmethod
+    def from_dict(data, trusted=False):
+        """
+        Create a DRMSystemList from a list of DRMSystem dicts, as returned by
+        to_dict()
+
+        If trusted is True the values are not checked
+        """
+        drm_systems = [DRMSystem.from_dict(item, trusted) for item in data]
+        new_drm_system_list = DRMSystemList()
+        if trusted:
+            new_drm_system_list._list = drm_systems
+        else:
+            new_drm_system_list.extend(drm_systems)
+        return new_drm_system_list
+
+    @classmethod
+    def from_records(cls, records, trusted=False):
+        """
+        Create a DRMSystemList from an iterable of tuples of (kid, system_id,
+        pssh, content_protection_data, hls_signaling_data,
+        hls_signaling_data_master), trailing values can be left out
+
+        kid and system_id can be 16 bytes, UUIDs or strings. pssh can be raw
+        bytes, bytearray or memoryview, which are kept as they are, the other
+        values raw bytes, which are base64 encoded, and all of them base64
+        strings. The values are converted and checked a column at a time,
+        each distinct system ID once
+
+        If trusted is True base64 strings and system IDs are not checked
+        """
+        kids, system_ids, *columns = record_columns(records, 6)
+        system_ids = convert_column(system_ids, record_uuid, "system_id")
+        if not trusted:
+            check_column(system_ids, VALID_SYSTEM_IDS, ValueError,
+                         "system_id is unknown")
+        pssh, *columns = columns
+        names = ("content_protection_data", "hls_signaling_data",
+                 "hls_signaling_data_master")
+        return cls._from_checked([
+            DRMSystem._from_trusted(*values) for values in zip(
+                convert_column(kids, record_uuid), system_ids,
+                convert_column(pssh, record_binary, "pssh", trusted),
+                *(convert_column(column, record_base64, name, trusted)
+                  for column, name in zip(columns, names)))])
+
 
 class DRMSystem(CPIXComparableBase):
     """
@@ -46,7 +136,14 @@ class DRMSystem(CPIXComparableBase):
         PSSH: PSSH box for insertion in ISOBMFF output
         ContentProtectionData: ContentProtection XML for DASH manifest
         HLSSignalingData: signaling information for HLS manifest
+
+    pssh_bytes is the PSSH box as raw bytes. It is stored in the form it was
+    set in and only converted when read in the other, bytearray and
+    memoryview values are kept without copying
     """
+    __slots__ = ("_kid", "_system_id", "_pssh", "_content_protection_data",
+                 "_hls_signaling_data", "_hls_signaling_data_master")
+    _cache_fragment = True
 
     def __init__(
         self,
@@ -75,6 +172,45 @@ class DRMSystem(CPIXComparableBase):
         if hls_signaling_data_master is not None:
             self.hls_signaling_data_master = hls_signaling_data_master
 
+    @classmethod
+    def _from_trusted(
+        cls,
+        kid,
+        system_id,
+        pssh=None,
+        content_protection_data=None,
+        hls_signaling_data=None,
+        hls_signaling_data_master=None,
+    ):
+        """
+        Create a DRMSystem from values known to be valid, skipping the
+        base64, UUID and system ID checks done by the property setters
+        """
+        drm_system = cls.__new__(cls)
+        drm_system._kid = kid if isinstance(kid, uuid.UUID) else \
+            uuid.UUID(kid)
+        drm_system._system_id = system_id \
+            if isinstance(system_id, uuid.UUID) else uuid.UUID(system_id)
+        drm_system._pssh = pssh
+        drm_system._content_protection_data = content_protection_data
+        drm_system._hls_signaling_data = hls_signaling_data
+        drm_system._hls_signaling_data_master = hls_signaling_data_master
+        return drm_system
+
+    def __reduce__(self):
+        return (unpickle, (type(self), self._pickle_state()))
+
+    def _pickle_state(self):
+        return (self._kid.bytes, self._system_id.bytes, picklable(self._pssh),
+                self._content_protection_data, self._hls_signaling_data,
+                self._hls_signaling_data_master)
+
+    @classmethod
+    def _from_pickle_state(cls, state):
+        kid, system_id, *values = state
+        return cls._from_trusted(uuid.UUID(bytes=kid),
+                                 uuid.UUID(bytes=system_id), *values)
+
     @property
     def kid(self):
         return self._kid
@@ -83,8 +219,10 @@ class DRMSystem(CPIXComparableBase):
     def kid(self, kid):
         if isinstance(kid, str):
             self._kid = uuid.UUID(kid)
+            self._invalidate()
         elif isinstance(kid, uuid.UUID):
             self._kid = kid
+            self._invalidate()
         else:
             raise TypeError("kid should be a uuid")
 
@@ -104,12 +242,13 @@ class DRMSystem(CPIXComparableBase):
 
         if tmp_system_id in VALID_SYSTEM_IDS:
             self._system_id = tmp_system_id
+            self._invalidate()
         else:
             raise ValueError("system_id is unknown")
 
     @property
     def pssh(self):
-        return self._pssh
+        return to_base64(self._pssh)
 
     @pssh.setter
     def pssh(self, pssh):
@@ -118,10 +257,20 @@ class DRMSystem(CPIXComparableBase):
                 b64decode(pssh)
             except BinasciiError:
                 raise ValueError("pssh is not a valid base64 string")
-            self._pssh = pssh
+            self._pssh = base64_value(pssh)
+            self._invalidate()
         else:
             raise TypeError("pssh should be a base64 string")
 
+    @property
+    def pssh_bytes(self):
+        return to_bytes(self._pssh)
+
+    @pssh_bytes.setter
+    def pssh_bytes(self, pssh):
+        self._pssh = check_bytes(pssh, "pssh_bytes")
+        self._invalidate()
+
     @property
     def content_protection_data(self):
         return self._content_protection_data
@@ -136,6 +285,7 @@ class DRMSystem(CPIXComparableBase):
                     "content_protection_data is not a valid base64 string"
                 )
             self._content_protection_data = content_protection_data
+            self._invalidate()
         else:
             raise TypeError("content_protection_data must be a base64 string")
 
@@ -153,6 +303,7 @@ class DRMSystem(CPIXComparableBase):
                     "hls_signaling_data is not a valid base64 string"
                 )
             self._hls_signaling_data = hls_signaling_data
+            self._invalidate()
         else:
             raise TypeError("hls_signaling_data should be a base64 string")
 
@@ -170,6 +321,7 @@ class DRMSystem(CPIXComparableBase):
                     "hls_signaling_data_master is not a valid base64 string"
                 )
             self._hls_signaling_data_master = hls_signaling_data_master
+            self._invalidate()
         else:
             raise TypeError(
                 "hls_signaling_data_master should be a base64 string"
@@ -202,13 +354,24 @@ class DRMSystem(CPIXComparableBase):
             el.append(hls_element)
         return el
 
+    def _build_key(self):
+        return ("DRMSystem",
+                None if self.kid is None else str(self.kid),
+                None if self.system_id is None else str(self.system_id),
+                as_text(self.pssh),
+                as_text(self.content_protection_data),
+                as_text(self.hls_signaling_data),
+                as_text(self.hls_signaling_data_master))
+
     @staticmethod
-    def parse(xml):
+    def parse(xml, trusted=False):
         """
         Parse XML and return DRMSystem
+
+        If trusted is True the values are not checked
         """
         if isinstance(xml, (str, bytes)):
-            xml = etree.fromstring(xml)
+            xml = fromstring(xml)
 
         kid = xml.attrib["kid"]
         system_id = xml.attrib["systemId"]
@@ -218,10 +381,12 @@ class DRMSystem(CPIXComparableBase):
         hls_signaling_data = None
         hls_signaling_data_master = None
 
-        if xml.find("{*}PSSH") is not None:
-            pssh = xml.find("{*}PSSH").text
-        if xml.find("{*}ContentProtectionData") is not None:
-            content_protection_data = xml.find("{*}ContentProtectionData").text
+        pssh_element = xml.find("{*}PSSH")
+        if pssh_element is not None:
+            pssh = pssh_element.text
+        cpd_element = xml.find("{*}ContentProtectionData")
+        if cpd_element is not None:
+            content_protection_data = cpd_element.text
         for element in xml.findall("{*}HLSSignalingData"):
             if (
                 "playlist" not in element.attrib
@@ -235,6 +400,15 @@ class DRMSystem(CPIXComparableBase):
             ):
                 hls_signaling_data_master = element.text
 
+        if trusted:
+            return DRMSystem._from_trusted(
+                kid,
+                system_id,
+                pssh,
+                content_protection_data,
+                hls_signaling_data,
+                hls_signaling_data_master,
+            )
         return DRMSystem(
             kid,
             system_id,
@@ -243,3 +417,33 @@ class DRMSystem(CPIXComparableBase):
             hls_signaling_data,
             hls_signaling_data_master,
         )
+
+    def to_dict(self):
+        """Returns a dict of the fields which are set"""
+        return drop_none({
+            "kid": str(self.kid),
+            "system_id": str(self.system_id),
+            "pssh": as_text(self.pssh),
+            "content_protection_data": as_text(self.content_protection_data),
+            "hls_signaling_data": as_text(self.hls_signaling_data),
+            "hls_signaling_data_master":
+                as_text(self.hls_signaling_data_master),
+        })
+
+    @staticmethod
+    def from_dict(data, trusted=False):
+        """
+        Create a DRMSystem from a dict as returned by to_dict()
+
+        If trusted is True the values are not checked
+        """
+        args = (data["kid"], data["system_id"], as_text(data.get("pssh")),
+                data.get("content_protection_data"),
+                data.get("hls_signaling_data"),
+                data.get("hls_signaling_data_master"))
+        if trusted:
+            return DRMSystem._from_trusted(*args)
+        return DRMSystem(*args)
+
+
+DRMSystemList._item_class = DRMSystem
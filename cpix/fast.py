@@ -0,0 +1,332 @@
+"""
+Template based serializer writing CPIX documents straight to bytes without
+building an lxml tree, the output is identical to pretty_print()
+"""
+import re
+from . import NSMAP, CONTENT_KEY_WRAPPING_ALGORITHM, \
+    DOCUMENT_KEY_WRAPPING_ALGORITHM, ENCRYPTED_KEY_MAC_ALGORITHM, \
+    KeyPeriodFilter, LabelFilter, VideoFilter, AudioFilter, BitrateFilter
+from .base import as_text
+from .filters import encode_bool
+from .period import datetime_isoformat
+
+INDENT = "  "
+# deepest element written is enc:CipherValue in a DocumentKey
+MAX_DEPTH = 9
+
+# characters XML 1.0 doesn't allow, which lxml refuses to write
+_NOT_XML = "\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff"
+_INVALID = re.compile("[" + _NOT_XML + "]")
+_NEEDS_ESCAPE = re.compile('[&<>"\r\n\t' + _NOT_XML + "]")
+
+
+def check_xml(value):
+    """Raise ValueError like lxml for characters XML can't hold"""
+    if _INVALID.search(value) is not None:
+        raise ValueError("All strings must be XML compatible: Unicode or "
+                         "ASCII, no NULL bytes or control characters")
+
+
+def escape_text(value):
+    """Escape element text the way lxml does"""
+    if _NEEDS_ESCAPE.search(value) is None:
+        return value
+    check_xml(value)
+    return value.replace("&", "&amp;").replace("<", "&lt;") \
+        .replace(">", "&gt;").replace("\r", "&#13;")
+
+
+def escape_attribute(value):
+    """Escape an attribute value the way lxml does"""
+    if _NEEDS_ESCAPE.search(value) is None:
+        return value
+    return escape_text(value).replace('"', "&quot;") \
+        .replace("\n", "&#10;").replace("\t", "&#9;")
+
+
+def attribute(name, value):
+    return ' {name}="{value}"'.format(name=name, value=escape_attribute(value))
+
+
+# the root element declares every namespace, in NSMAP order as lxml does
+ROOT_START = "<CPIX" + "".join(
+    ' xmlns="{uri}"'.format(uri=uri) if prefix is None else
+    ' xmlns:{prefix}="{uri}"'.format(prefix=prefix, uri=uri)
+    for prefix, uri in NSMAP.items()
+) + attribute("xsi:schemaLocation", "urn:dashif:org:cpix cpix.xsd")
+
+# fixed parts of the document as lines of (depth, markup), compiled below
+# into format strings for pretty printed and compact output
+LINES = {
+    "content_key_plain": [
+        (2, "<ContentKey{attributes}>"),
+        (3, "<Data>"),
+        (4, "<pskc:Secret>"),
+        (5, "<pskc:PlainValue>{cek}</pskc:PlainValue>"),
+        (4, "</pskc:Secret>"),
+        (3, "</Data>"),
+        (2, "</ContentKey>"),
+    ],
+    "content_key_encrypted": [
+        (2, "<ContentKey{attributes}>"),
+        (3, "<Data>"),
+        (4, "<pskc:Secret>"),
+        (5, "<pskc:EncryptedValue>"),
+        (6, '<enc:EncryptionMethod Algorithm="' +
+            CONTENT_KEY_WRAPPING_ALGORITHM + '"/>'),
+        (6, "<enc:CipherData>"),
+        (7, "<enc:CipherValue>{cek}</enc:CipherValue>"),
+        (6, "</enc:CipherData>"),
+        (5, "</pskc:EncryptedValue>"),
+        (5, "<pskc:ValueMAC>{value_mac}</pskc:ValueMAC>"),
+        (4, "</pskc:Secret>"),
+        (3, "</Data>"),
+        (2, "</ContentKey>"),
+    ],
+    "delivery_data": [
+        (2, "<DeliveryData>"),
+        (3, "<DeliveryKey>"),
+        (4, "<ds:X509Data>"),
+        (5, "<ds:X509Certificate>{certificate}</ds:X509Certificate>"),
+        (4, "</ds:X509Data>"),
+        (3, "</DeliveryKey>"),
+        (3, '<DocumentKey Algorithm="' +
+            CONTENT_KEY_WRAPPING_ALGORITHM + '">'),
+        (4, "<Data>"),
+        (5, "<pskc:Secret>"),
+        (6, "<pskc:EncryptedValue>"),
+        (7, '<enc:EncryptionMethod Algorithm="' +
+            DOCUMENT_KEY_WRAPPING_ALGORITHM + '"/>'),
+        (7, "<enc:CipherData>"),
+        (8, "<enc:CipherValue>{document_key}</enc:CipherValue>"),
+        (7, "</enc:CipherData>"),
+        (6, "</pskc:EncryptedValue>"),
+        (5, "</pskc:Secret>"),
+        (4, "</Data>"),
+        (3, "</DocumentKey>"),
+    ],
+    "mac_method": [
+        (3, '<MACMethod Algorithm="' + ENCRYPTED_KEY_MAC_ALGORITHM + '">'),
+        (4, "<Key>"),
+        (5, '<enc:EncryptionMethod Algorithm="' +
+            DOCUMENT_KEY_WRAPPING_ALGORITHM + '"/>'),
+        (5, "<enc:CipherData>"),
+        (6, "<enc:CipherValue>{cipher_value}</enc:CipherValue>"),
+        (5, "</enc:CipherData>"),
+        (4, "</Key>"),
+        (3, "</MACMethod>"),
+    ],
+    "delivery_data_end": [
+        (2, "</DeliveryData>"),
+    ],
+}
+
+
+def compile_templates(pretty):
+    """
+    Join the lines of each template into a single format string, with the
+    newline and indentation lxml writes before each line when pretty
+    printing
+    """
+    if pretty:
+        newlines = ["\n" + INDENT * depth for depth in range(MAX_DEPTH)]
+    else:
+        newlines = [""] * MAX_DEPTH
+    templates = {name: "".join(newlines[depth] + markup
+                               for depth, markup in lines)
+                 for name, lines in LINES.items()}
+    templates["newlines"] = newlines
+    return templates
+
+
+TEMPLATES = {
+    True: compile_templates(True),
+    False: compile_templates(False),
+}
+
+
+def _delivery_data(delivery_data, out, t):
+    # base64 values are kept as ASCII bytes if set as bytes, converted as
+    # element() does
+    out.append(t["delivery_data"].format(
+        certificate=escape_text(
+            as_text(delivery_data.delivery_key.certificate)),
+        document_key=escape_text(
+            as_text(delivery_data.document_key.cipher_value))))
+    if delivery_data.mac_method is not None:
+        out.append(t["mac_method"].format(cipher_value=escape_text(
+            as_text(delivery_data.mac_method.cipher_value))))
+    out.append(t["delivery_data_end"])
+
+
+def _content_key(content_key, out, t):
+    attributes = attribute("kid", str(content_key.kid))
+    if content_key.common_encryption_scheme:
+        attributes += attribute("commonEncryptionScheme",
+                                content_key.common_encryption_scheme)
+    if content_key.explicit_iv:
+        attributes += attribute("explicitIV",
+                                as_text(content_key.explicit_iv))
+
+    cek = as_text(content_key.cek)
+    if not cek:
+        out.append(t["newlines"][2] + "<ContentKey" + attributes + "/>")
+    elif content_key.value_mac is not None:
+        out.append(t["content_key_encrypted"].format(
+            attributes=attributes,
+            cek=escape_text(cek),
+            value_mac=escape_text(as_text(content_key.value_mac))))
+    else:
+        out.append(t["content_key_plain"].format(
+            attributes=attributes, cek=escape_text(cek)))
+
+
+def _drm_system(drm_system, out, t):
+    newline = t["newlines"][3]
+    attributes = ""
+    if drm_system.kid is not None:
+        attributes += attribute("kid", str(drm_system.kid))
+    if drm_system.system_id is not None:
+        attributes += attribute("systemId", str(drm_system.system_id))
+
+    children = []
+    if drm_system.pssh is not None:
+        children.append(
+            "<PSSH>" + escape_text(as_text(drm_system.pssh)) + "</PSSH>")
+    if drm_system.content_protection_data is not None:
+        children.append(
+            "<ContentProtectionData>" +
+            escape_text(as_text(drm_system.content_protection_data)) +
+            "</ContentProtectionData>")
+    if drm_system.hls_signaling_data is not None:
+        children.append(
+            '<HLSSignalingData playlist="media">' +
+            escape_text(as_text(drm_system.hls_signaling_data)) +
+            "</HLSSignalingData>")
+    if drm_system.hls_signaling_data_master is not None:
+        children.append(
+            '<HLSSignalingData playlist="master">' +
+            escape_text(as_text(drm_system.hls_signaling_data_master)) +
+            "</HLSSignalingData>")
+
+    _element(out, t, 2, "DRMSystem", attributes,
+             [newline + child for child in children])
+
+
+def _period(period, out, t):
+    attributes = attribute("id", str(period.id))
+    if period.index is not None:
+        attributes += attribute("index", str(period.index))
+    if period.start is not None:
+        attributes += attribute("start", datetime_isoformat(period.start))
+    if period.end is not None:
+        attributes += attribute("end", datetime_isoformat(period.end))
+    out.append(t["newlines"][2] + "<ContentKeyPeriod" + attributes + "/>")
+
+
+def _filter_attributes(filter):
+    """Attributes of a filter, mirroring the filter classes' element()"""
+    if isinstance(filter, KeyPeriodFilter):
+        return attribute("periodId", str(filter.period_id))
+    if isinstance(filter, LabelFilter):
+        return attribute("label", str(filter.label))
+
+    attributes = ""
+    if isinstance(filter, VideoFilter):
+        if filter.min_pixels is not None:
+            attributes += attribute("minPixels", str(filter.min_pixels))
+        if filter.max_pixels is not None:
+            attributes += attribute("maxPixels", str(filter.max_pixels))
+        if filter.hdr is not None:
+            attributes += attribute("hdr", encode_bool(filter.hdr))
+        if filter.wcg is not None:
+            attributes += attribute("wcg", encode_bool(filter.wcg))
+        if filter.min_fps is not None:
+            attributes += attribute("minFps", str(filter.min_fps))
+        if filter.max_fps is not None:
+            attributes += attribute("maxFps", str(filter.max_fps))
+    elif isinstance(filter, AudioFilter):
+        if filter.min_channels:
+            attributes += attribute("minChannels", str(filter.min_channels))
+        if filter.max_channels:
+            attributes += attribute("maxChannels", str(filter.max_channels))
+    elif isinstance(filter, BitrateFilter):
+        if filter.min_bitrate:
+            attributes += attribute("minBitrate", str(filter.min_bitrate))
+        if filter.max_bitrate:
+            attributes += attribute("maxBitrate", str(filter.max_bitrate))
+    return attributes
+
+
+def _usage_rule(usage_rule, out, t):
+    newline = t["newlines"][3]
+    attributes = ""
+    if usage_rule.kid is not None:
+        attributes += attribute("kid", str(usage_rule.kid))
+    if usage_rule.intended_track_type is not None:
+        attributes += attribute("intendedTrackType",
+                                str(usage_rule.intended_track_type))
+
+    _element(out, t, 2, "ContentKeyUsageRule", attributes, [
+        "{newline}<{tag}{attributes}/>".format(
+            newline=newline,
+            tag=type(filter).__name__,
+            attributes=_filter_attributes(filter))
+        for filter in usage_rule
+    ])
+
+
+def _element(out, t, depth, tag, attributes, children):
+    """Write an element with already serialized children"""
+    newline = t["newlines"][depth]
+    if children:
+        out.append(newline + "<" + tag + attributes + ">")
+        out.extend(children)
+        out.append(newline + "</" + tag + ">")
+    else:
+        out.append(newline + "<" + tag + attributes + "/>")
+
+
+# section element, CPIX property and item writer, in document order
+SECTIONS = (
+    ("DeliveryDataList", "delivery_datas", _delivery_data),
+    ("ContentKeyList", "content_keys", _content_key),
+    ("DRMSystemList", "drm_systems", _drm_system),
+    ("ContentKeyPeriodList", "periods", _period),
+    ("ContentKeyUsageRuleList", "usage_rules", _usage_rule),
+)
+
+
+def to_bytes(cpix, pretty=True):
+    """
+    Serialize a CPIX document to UTF-8 bytes, identical to
+    cpix.pretty_print(pretty_print=pretty)
+    """
+    t = TEMPLATES[bool(pretty)]
+    newline = t["newlines"][1]
+
+    out = [ROOT_START]
+    if cpix.content_id is not None and isinstance(cpix.content_id, str):
+        out.append(attribute("contentId", cpix.content_id))
+    if cpix.version is not None and isinstance(cpix.version, str):
+        out.append(attribute("version", cpix.version))
+
+    body = []
+    for tag, name, write in SECTIONS:
+        section = getattr(cpix, name)
+        if len(section) == 0:
+            continue
+        body.append(newline + "<" + tag + ">")
+        for item in section:
+            write(item, body, t)
+        body.append(newline + "</" + tag + ">")
+
+    if body:
+        out.append(">")
+        out.extend(body)
+        out.append(t["newlines"][0] + "</CPIX>")
+    else:
+        out.append("/>")
+    if pretty:
+        out.append("\n")
+    return "".join(out).encode("utf-8")
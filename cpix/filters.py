@@ -3,6 +3,7 @@ Filter classes
 """
 from . import etree
 from .base import CPIXComparableBase
+from .parser import fromstring
 
 ALLOWABLE_XSBOOLEAN_TRUE_VALUES = ["true", "1"]
 ALLOWABLE_XSBOOLEAN_FALSE_VALUES = ["false", "0"]
@@ -24,12 +25,49 @@ def encode_bool(value):
     return "false"
 
 
-class KeyPeriodFilter(CPIXComparableBase):
+class FilterBase(CPIXComparableBase):
+    """
+    Base filter class, filter values are plain attributes so setting any
+    attribute drops the cached serializations
+    """
+    __slots__ = ()
+    # names of the constructor arguments, which are the filter's attributes
+    _fields = ()
+
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        self._invalidate()
+
+    def to_dict(self):
+        """
+        Returns a dict of the filter's class name as "type" and its
+        attributes which are set
+        """
+        data = {"type": type(self).__name__}
+        for name in self._fields:
+            value = getattr(self, name)
+            if value is not None:
+                data[name] = value
+        return data
+
+    @classmethod
+    def from_dict(cls, data, trusted=False):
+        """
+        Create a filter from a dict as returned by to_dict(), there is
+        nothing to check so trusted makes no difference
+        """
+        return cls(**{name: data[name] for name in cls._fields
+                      if name in data})
+
+
+class KeyPeriodFilter(FilterBase):
     """
     KeyPeriodFilter element
     Has single required attribute:
         periodId
     """
+    __slots__ = ("period_id",)
+    _fields = __slots__
 
     def __init__(self, period_id):
         self.period_id = period_id
@@ -40,25 +78,30 @@ class KeyPeriodFilter(CPIXComparableBase):
         el.set("periodId", str(self.period_id))
         return el
 
+    def _build_key(self):
+        return ("KeyPeriodFilter", str(self.period_id))
+
     @staticmethod
     def parse(xml):
         """
         Parse XML and return KeyPeriodFilter
         """
         if isinstance(xml, (str, bytes)):
-            xml = etree.fromstring(xml)
+            xml = fromstring(xml)
 
         period_id = xml.attrib["periodId"]
 
         return KeyPeriodFilter(period_id)
 
 
-class LabelFilter(CPIXComparableBase):
+class LabelFilter(FilterBase):
     """
     LabelFilter element
     Has single required attribute:
         label
     """
+    __slots__ = ("label",)
+    _fields = __slots__
 
     def __init__(self, label):
         self.label = label
@@ -69,20 +112,23 @@ class LabelFilter(CPIXComparableBase):
         el.set("label", str(self.label))
         return el
 
+    def _build_key(self):
+        return ("LabelFilter", str(self.label))
+
     @staticmethod
     def parse(xml):
         """
         Parse XML and return LabelFilter
         """
         if isinstance(xml, (str, bytes)):
-            xml = etree.fromstring(xml)
+            xml = fromstring(xml)
 
         label = xml.attrib["label"]
 
         return LabelFilter(label)
 
 
-class VideoFilter(CPIXComparableBase):
+class VideoFilter(FilterBase):
     """
     VideoFilter element
     Has optional attributes:
@@ -93,6 +139,9 @@ class VideoFilter(CPIXComparableBase):
         minFps
         maxFps
     """
+    __slots__ = ("min_pixels", "max_pixels", "hdr", "wcg", "min_fps",
+                 "max_fps")
+    _fields = __slots__
 
     def __init__(self, min_pixels=None, max_pixels=None, hdr=None, wcg=None,
                  min_fps=None, max_fps=None):
@@ -120,13 +169,21 @@ class VideoFilter(CPIXComparableBase):
             el.set("maxFps", str(self.max_fps))
         return el
 
+    def _build_key(self):
+        def text(value, encode=str):
+            return None if value is None else encode(value)
+
+        return ("VideoFilter", text(self.min_pixels), text(self.max_pixels),
+                text(self.hdr, encode_bool), text(self.wcg, encode_bool),
+                text(self.min_fps), text(self.max_fps))
+
     @staticmethod
     def parse(xml):
         """
         Parse XML and return VideoFilter
         """
         if isinstance(xml, (str, bytes)):
-            xml = etree.fromstring(xml)
+            xml = fromstring(xml)
 
         min_pixels = None
         max_pixels = None
@@ -151,13 +208,15 @@ class VideoFilter(CPIXComparableBase):
         return VideoFilter(min_pixels, max_pixels, hdr, wcg, min_fps, max_fps)
 
 
-class AudioFilter(CPIXComparableBase):
+class AudioFilter(FilterBase):
     """
     AudioFilter element
     Has optional attributes:
         minChannels
         maxChannels
     """
+    __slots__ = ("min_channels", "max_channels")
+    _fields = __slots__
 
     def __init__(self, min_channels=None, max_channels=None):
         self.min_channels = min_channels
@@ -172,13 +231,18 @@ class AudioFilter(CPIXComparableBase):
             el.set("maxChannels", str(self.max_channels))
         return el
 
+    def _build_key(self):
+        return ("AudioFilter",
+                str(self.min_channels) if self.min_channels else None,
+                str(self.max_channels) if self.max_channels else None)
+
     @staticmethod
     def parse(xml):
         """
         Parse XML and return AudioFilter
         """
         if isinstance(xml, (str, bytes)):
-            xml = etree.fromstring(xml)
+            xml = fromstring(xml)
 
         min_channels = None
         max_channels = None
@@ -191,13 +255,15 @@ class AudioFilter(CPIXComparableBase):
         return AudioFilter(min_channels, max_channels)
 
 
-class BitrateFilter(CPIXComparableBase):
+class BitrateFilter(FilterBase):
     """
     BitrateFilter element
     Has optional attributes:
         minBitrate
         maxBitrate
     """
+    __slots__ = ("min_bitrate", "max_bitrate")
+    _fields = __slots__
 
     def __init__(self, min_bitrate=None, max_bitrate=None):
         self.min_bitrate = min_bitrate
@@ -212,13 +278,18 @@ class BitrateFilter(CPIXComparableBase):
             el.set("maxBitrate", str(self.max_bitrate))
         return el
 
+    def _build_key(self):
+        return ("BitrateFilter",
+                str(self.min_bitrate) if self.min_bitrate else None,
+                str(self.max_bitrate) if self.max_bitrate else None)
+
     @staticmethod
     def parse(xml):
         """
         Parse XML and return BitrateFilter
         """
         if isinstance(xml, (str, bytes)):
-            xml = etree.fromstring(xml)
+            xml = fromstring(xml)
 
         min_bitrate = None
         max_bitrate = None
@@ -0,0 +1,75 @@
+"""
+Configured lxml parsers shared by all the CPIX parse functions
+"""
+import threading
+from lxml import etree
+
+
+class ParserSettings():
+    """
+    Options for the XML parsers used to read CPIX documents
+
+    remove_blank_text: drop whitespace between elements, giving smaller trees
+    resolve_entities: replace entities, off so documents can't pull in
+        external resources
+    huge_tree: lift libxml2's limits on tree depth and text size, needed for
+        very large documents
+    collect_ids: build a hash table of XML IDs, not used by CPIX
+
+    Changing an option takes effect for the next parse in every thread.
+    """
+
+    def __init__(self, remove_blank_text=True, resolve_entities=False,
+                 huge_tree=False, collect_ids=False):
+        self.remove_blank_text = remove_blank_text
+        self.resolve_entities = resolve_entities
+        self.huge_tree = huge_tree
+        self.collect_ids = collect_ids
+
+    def __setattr__(self, name, value):
+        # parsers built for older settings are replaced when next used
+        super().__setattr__("generation", getattr(self, "generation", 0) + 1)
+        super().__setattr__(name, value)
+
+    def options(self):
+        """Keyword arguments for XMLParser, iterparse and XMLPullParser"""
+        return {
+            "remove_blank_text": self.remove_blank_text,
+            "resolve_entities": self.resolve_entities,
+            "huge_tree": self.huge_tree,
+            "collect_ids": self.collect_ids,
+        }
+
+    def __repr__(self):
+        return "{name}({options})".format(
+            name=type(self).__name__,
+            options=", ".join("{k}={v!r}".format(k=k, v=v)
+                              for k, v in self.options().items()))
+
+
+settings = ParserSettings()
+
+# lxml parsers can't be used by two threads at once, each thread reuses its
+# own rather than creating one per parse
+_local = threading.local()
+
+
+def get_parser():
+    """Returns this thread's XMLParser for the current settings"""
+    if getattr(_local, "generation", None) != settings.generation:
+        _local.parser = etree.XMLParser(**settings.options())
+        _local.generation = settings.generation
+    return _local.parser
+
+
+def fromstring(xml):
+    """Parse an XML string or bytes with the configured parser"""
+    return etree.fromstring(xml, get_parser())
+
+
+def parse(source):
+    """
+    Parse a filename, file object or mmap with the configured parser,
+    returns the root element
+    """
+    return etree.parse(source, get_parser()).getroot()
@@ -1,14 +1,17 @@
 """
 Content key classes
 """
-from . import etree, NSMAP
-from .base import CPIXComparableBase, CPIXListBase
+from . import etree, TAG_CLASSES, NSMAP
+from .base import CPIXComparableBase, CPIXListBase, append_elements, \
+    drop_none, unpickle
+from .parser import fromstring
 from datetime import datetime
 from isodate import datetime_isoformat, parse_datetime
 
 
 class PeriodList(CPIXListBase):
     """List of Periods"""
+    __slots__ = ()
 
     def check(self, value):
         if not isinstance(value, Period):
@@ -16,27 +19,53 @@ class PeriodList(CPIXListBase):
 
     def element(self):
         el = etree.Element("ContentKeyPeriodList", nsmap=NSMAP)
-        for period in self:
-            el.append(period.element())
+        append_elements(el, self)
         return el
 
+    def _build_key(self):
+        return ("ContentKeyPeriodList", tuple(item._key() for item in self))
+
     @staticmethod
-    def parse(xml):
+    def parse(xml, trusted=False):
         """
         Parse and return new PeriodList
+
+        If trusted is True the input is assumed to be valid (e.g. it has
+        passed schema validation) and per value checks are skipped
         """
         if isinstance(xml, (str, bytes)):
-            xml = etree.fromstring(xml)
+            xml = fromstring(xml)
 
         new_period_list = PeriodList()
+        periods = []
 
-        for element in xml.getchildren():
-            tag = etree.QName(element.tag).localname
-            if tag == "ContentKeyPeriod":
-                new_period_list.append(Period.parse(element))
+        for element in xml:
+            if TAG_CLASSES.get(element.tag) is Period:
+                periods.append(Period.parse(element, trusted))
+
+        if trusted:
+            new_period_list._list = periods
+        else:
+            new_period_list.extend(periods)
 
         return new_period_list
 
+    @staticmethod
+    def from_dict(data, trusted=False):
+        """
+        Create a PeriodList from a list of Period dicts, as returned by
+        to_dict()
+
+        If trusted is True the values are not checked
+        """
+        periods = [Period.from_dict(item, trusted) for item in data]
+        new_period_list = PeriodList()
+        if trusted:
+            new_period_list._list = periods
+        else:
+            new_period_list.extend(periods)
+        return new_period_list
+
 
 class Period(CPIXComparableBase):
     """
@@ -52,6 +81,8 @@ class Period(CPIXComparableBase):
     index is mutually exclusive with start and end, which are mutually
     inclusive
     """
+    __slots__ = ("_id", "_index", "_start", "_end")
+    _cache_fragment = True
 
     def __init__(self, id, index=None, start=None, end=None):
         self._id = None
@@ -64,6 +95,31 @@ class Period(CPIXComparableBase):
         self.start = start
         self.end = end
 
+    @classmethod
+    def _from_trusted(cls, id, index=None, start=None, end=None):
+        """
+        Create a Period from values known to be valid, skipping the type
+        and mutual exclusion checks done by the property setters
+        """
+        period = cls.__new__(cls)
+        period._id = id
+        period._index = index
+        period._start = start if start is None or \
+            isinstance(start, datetime) else parse_datetime(start)
+        period._end = end if end is None or \
+            isinstance(end, datetime) else parse_datetime(end)
+        return period
+
+    def __reduce__(self):
+        return (unpickle, (type(self), self._pickle_state()))
+
+    def _pickle_state(self):
+        return (self._id, self._index, self._start, self._end)
+
+    @classmethod
+    def _from_pickle_state(cls, state):
+        return cls._from_trusted(*state)
+
     @property
     def id(self):
         return self._id
@@ -72,6 +128,7 @@ class Period(CPIXComparableBase):
     def id(self, id):
         if isinstance(id, str):
             self._id = id
+            self._invalidate()
         else:
             raise TypeError("id should be a string")
 
@@ -87,6 +144,7 @@ class Period(CPIXComparableBase):
                     "index is mutually exclusive with start and end")
             if isinstance(index, int):
                 self._index = index
+                self._invalidate()
             else:
                 raise TypeError("index should be a int")
 
@@ -101,10 +159,12 @@ class Period(CPIXComparableBase):
                 raise ValueError("start is mutually exclusive with index")
             if isinstance(start, datetime):
                 self._start = start
+                self._invalidate()
             else:
                 # if not passed a datetime, try to parse it
                 try:
                     self._start = parse_datetime(start)
+                    self._invalidate()
                 except Exception:
                     raise TypeError("start should be a datetime")
 
@@ -119,10 +179,12 @@ class Period(CPIXComparableBase):
                 raise ValueError("end is mutually exclusive with index")
             if isinstance(end, datetime):
                 self._end = end
+                self._invalidate()
             else:
                 # if not passed a datetime, try to parse it
                 try:
                     self._end = parse_datetime(end)
+                    self._invalidate()
                 except Exception:
                     raise TypeError("end should be a datetime")
 
@@ -138,13 +200,21 @@ class Period(CPIXComparableBase):
             el.set("end", datetime_isoformat(self.end))
         return el
 
+    def _build_key(self):
+        return ("ContentKeyPeriod", str(self.id),
+                None if self.index is None else str(self.index),
+                None if self.start is None else datetime_isoformat(self.start),
+                None if self.end is None else datetime_isoformat(self.end))
+
     @staticmethod
-    def parse(xml):
+    def parse(xml, trusted=False):
         """
         Parse XML and return Period
+
+        If trusted is True the values are not checked
         """
         if isinstance(xml, (str, bytes)):
-            xml = etree.fromstring(xml)
+            xml = fromstring(xml)
 
         id = xml.attrib["id"]
 
@@ -161,9 +231,40 @@ class Period(CPIXComparableBase):
         else:
             end = None
 
+        if trusted:
+            return Period._from_trusted(id, index, start, end)
         return Period(
             id=id,
             index=index,
             start=start,
             end=end
         )
+
+    def to_dict(self):
+        """
+        Returns a dict of the fields which are set, start and end as ISO 8601
+        strings
+        """
+        return drop_none({
+            "id": self.id,
+            "index": self.index,
+            "start": None if self.start is None else
+            datetime_isoformat(self.start),
+            "end": None if self.end is None else datetime_isoformat(self.end),
+        })
+
+    @staticmethod
+    def from_dict(data, trusted=False):
+        """
+        Create a Period from a dict as returned by to_dict()
+
+        If trusted is True the values are not checked
+        """
+        args = (data["id"], data.get("index"), data.get("start"),
+                data.get("end"))
+        if trusted:
+            return Period._from_trusted(*args)
+        return Period(*args)
+
+
+PeriodList._item_class = Period
@@ -0,0 +1,87 @@
+"""
+Streaming CPIX readers
+"""
+from io import BytesIO
+from . import etree, ContentKey, DRMSystem, UsageRule, Period, DeliveryData, \
+    TAG_CLASSES, parser, compression
+
+# classes whose elements are parsed as soon as their end tag has been read
+ITEM_CLASSES = (ContentKey, DRMSystem, UsageRule, Period, DeliveryData)
+ITEM_TAGS = [tag for tag, cls in TAG_CLASSES.items() if cls in ITEM_CLASSES]
+
+
+def _release(element):
+    """
+    Free an element which has been parsed, together with any preceding
+    siblings, so the partially built tree does not keep growing
+    """
+    element.clear(keep_tail=True)
+    parent = element.getparent()
+    if parent is not None:
+        while element.getprevious() is not None:
+            del parent[0]
+
+
+def _parse_item(element, trusted):
+    """
+    Parse a completed item element with the parser of its class, then free it
+    """
+    item = TAG_CLASSES[element.tag].parse(element, trusted)
+    _release(element)
+    return item
+
+
+def iterparse(source, trusted=False):
+    """
+    Incrementally parse a CPIX document, yielding ContentKey, DRMSystem,
+    UsageRule, Period and DeliveryData objects as their end tags are read
+
+    source can be a filename, a file object or a bytes string, gzip, xz and
+    bz2 compressed sources are decompressed as they are read. Consumed
+    elements are discarded so memory use does not grow with document size.
+    trusted is passed on to the parse method of each class.
+    """
+    if isinstance(source, (bytes, bytearray)):
+        source = BytesIO(source)
+
+    with compression.open_read(source) as stream:
+        for _, element in etree.iterparse(stream, events=("end",),
+                                          tag=ITEM_TAGS,
+                                          **parser.settings.options()):
+            yield _parse_item(element, trusted)
+
+
+class CPIXFeedParser():
+    """
+    Push parser for CPIX documents which arrive in chunks, e.g. a chunked
+    HTTP body
+
+    Each call to feed() returns the ContentKey, DRMSystem, UsageRule, Period
+    and DeliveryData objects whose elements were completed by that chunk, so
+    parsing overlaps with receiving the rest of the document. trusted is
+    passed on to the parse method of each class.
+    """
+
+    def __init__(self, trusted=False):
+        self._parser = etree.XMLPullParser(
+            events=("end",), tag=ITEM_TAGS, **parser.settings.options())
+        self._trusted = trusted
+
+    def _read_items(self):
+        return [_parse_item(element, self._trusted)
+                for _, element in self._parser.read_events()]
+
+    def feed(self, data):
+        """
+        Feed a chunk of XML, returns a list of the objects it completed
+        """
+        self._parser.feed(data)
+        return self._read_items()
+
+    def close(self):
+        """
+        Signal the end of the document, returns a list of any remaining
+        objects. Raises XMLSyntaxError if the document is incomplete
+        """
+        self._parser.close()
+        return self._read_items()
@@ -1,14 +1,33 @@
 """
 Usage rule classes
 """
-from . import etree, uuid
-from .base import CPIXListBase
+from operator import attrgetter
+from . import etree, TAG_CLASSES, uuid
+from .base import CPIXListBase, append_elements, drop_none, field_digest, \
+    normalize_kids, kid_selected, unpickle, record_columns, convert_column, \
+    record_uuid, IndexView
+from .parser import fromstring
 from . import AudioFilter, BitrateFilter, VideoFilter, KeyPeriodFilter, \
     LabelFilter
 
+FILTER_CLASSES = (KeyPeriodFilter, LabelFilter, AudioFilter, VideoFilter,
+                  BitrateFilter)
+# the type of filter dicts, see FilterBase.to_dict
+FILTER_TYPES = {cls.__name__: cls for cls in FILTER_CLASSES}
+
 
 class UsageRuleList(CPIXListBase):
     """List of UsageRules"""
+    __slots__ = ()
+    _index_keys = {"by_kid": (attrgetter("kid"), False)}
+
+    @property
+    def by_kid(self):
+        """
+        Mapping of key ID to a list of its UsageRules, kept up to date as the
+        list and its usage rules change
+        """
+        return IndexView(self, "by_kid")
 
     def check(self, value):
         if not isinstance(value, UsageRule):
@@ -16,29 +35,85 @@ class UsageRuleList(CPIXListBase):
 
     def element(self):
         el = etree.Element("ContentKeyUsageRuleList")
-        for usage_rule in self:
-            el.append(usage_rule.element())
+        append_elements(el, self)
         return el
 
+    def _build_key(self):
+        return ("ContentKeyUsageRuleList", tuple(item._key() for item in self))
+
     @staticmethod
-    def parse(xml):
+    def parse(xml, trusted=False, kids=None):
         """
         Parse and return new UsageRuleList
+
+        If trusted is True the input is assumed to be valid (e.g. it has
+        passed schema validation) and per value checks are skipped
+
+        If kids is given only usage rules for those key IDs are parsed
         """
         if isinstance(xml, (str, bytes)):
-            xml = etree.fromstring(xml)
+            xml = fromstring(xml)
+        if kids is not None:
+            kids = normalize_kids(kids)
 
         new_usage_rule_list = UsageRuleList()
+        usage_rules = []
 
-        for element in xml.getchildren():
-            tag = etree.QName(element.tag).localname
+        for element in xml:
+            if TAG_CLASSES.get(element.tag) is not UsageRule:
+                continue
+            if kids is None or kid_selected(element, kids):
+                usage_rules.append(UsageRule.parse(element, trusted))
 
-            if tag == "ContentKeyUsageRule":
-                usage_rule = UsageRule.parse(element)
-                new_usage_rule_list.append(usage_rule)
+        if trusted:
+            new_usage_rule_list._list = usage_rules
+        else:
+            new_usage_rule_list.extend(usage_rules)
 
         return new_usage_rule_list
 
+    @staticmethod
+    def from_dict(data, trusted=False):
+        """
+        Create a UsageRuleList from a list of UsageRule dicts, as returned by
+        to_dict()
+
+        If trusted is True the values are not checked
+        """
+        usage_rules = [UsageRule.from_dict(item, trusted) for item in data]
+        new_usage_rule_list = UsageRuleList()
+        if trusted:
+            new_usage_rule_list._list = usage_rules
+        else:
+            new_usage_rule_list.extend(usage_rules)
+        return new_usage_rule_list
+
+    @classmethod
+    def from_records(cls, records, trusted=False):
+        """
+        Create a UsageRuleList from an iterable of tuples of (kid, filters,
+        intended_track_type), trailing values can be left out
+
+        kid can be 16 bytes, a UUID or a string and filters an iterable of
+        filter objects. The values are converted and checked a column at a
+        time
+
+        If trusted is True the filter types are not checked
+        """
+        kids, filters, intended_track_types = record_columns(records, 3)
+        filters = [list(record_filters or ()) for record_filters in filters]
+        if not trusted:
+            for index, record_filters in enumerate(filters):
+                for filter in record_filters:
+                    if not isinstance(filter, FILTER_CLASSES):
+                        raise TypeError(
+                            "record {index}: {filter} is not a filter".format(
+                                index=index, filter=filter))
+        return cls._from_checked([
+            UsageRule._from_trusted(*values) for values in zip(
+                convert_column(kids, record_uuid), filters,
+                intended_track_types)])
+
 
 class UsageRule(CPIXListBase):
     """
@@ -52,15 +127,43 @@ class UsageRule(CPIXListBase):
         AudioFilter: audio based filters
         BitrateFilter: bitrate based filters
     """
+    __slots__ = ("_kid", "_intended_track_type")
+    _cache_fragment = True
 
     def __init__(self, kid, filters=[], intended_track_type=None):
-        self.list = list()
-        self.extend(list(filters))
+        self._list = list()
+        self.list = list(filters)
         self._kid = None
 
         self.kid = kid
         self.intended_track_type = intended_track_type
 
+    @classmethod
+    def _from_trusted(cls, kid, filters=[], intended_track_type=None):
+        """
+        Create a UsageRule from values known to be valid, skipping the UUID
+        and filter type checks
+        """
+        usage_rule = cls.__new__(cls)
+        usage_rule._list = list(filters)
+        usage_rule._kid = kid if isinstance(kid, uuid.UUID) else \
+            uuid.UUID(kid)
+        usage_rule._intended_track_type = intended_track_type
+        return usage_rule
+
+    def __reduce__(self):
+        return (unpickle, (type(self), self._pickle_state()))
+
+    def _pickle_state(self):
+        return (self._kid.bytes, tuple(self._list),
+                self._intended_track_type)
+
+    @classmethod
+    def _from_pickle_state(cls, state):
+        kid, filters, intended_track_type = state
+        return cls._from_trusted(uuid.UUID(bytes=kid), filters,
+                                 intended_track_type)
+
     @property
     def kid(self):
         return self._kid
@@ -69,14 +172,24 @@ class UsageRule(CPIXListBase):
     def kid(self, kid):
         if isinstance(kid, str):
             self._kid = uuid.UUID(kid)
+            self._invalidate()
         elif isinstance(kid, uuid.UUID):
             self._kid = kid
+            self._invalidate()
         else:
             raise TypeError("kid should be a uuid")
 
+    @property
+    def intended_track_type(self):
+        return self._intended_track_type
+
+    @intended_track_type.setter
+    def intended_track_type(self, intended_track_type):
+        self._intended_track_type = intended_track_type
+        self._invalidate()
+
     def check(self, value):
-        if not isinstance(value, (KeyPeriodFilter, LabelFilter, AudioFilter,
-                                  VideoFilter, BitrateFilter)):
+        if not isinstance(value, FILTER_CLASSES):
             raise TypeError(
                 "{} is not filter (KeyPeriodFilter, LabelFilter, AudioFilter, "
                 "VideoFilter, BitrateFilter)".format(value))
@@ -88,39 +201,82 @@ class UsageRule(CPIXListBase):
             el.set("kid", str(self.kid))
         if self.intended_track_type is not None:
             el.set("intendedTrackType", str(self.intended_track_type))
-        for filter in self:
-            el.append(filter.element())
+        append_elements(el, self)
         return el
 
+    def _build_key(self):
+        return ("ContentKeyUsageRule",
+                None if self.kid is None else str(self.kid),
+                None if self.intended_track_type is None else
+                str(self.intended_track_type),
+                tuple(filter._key() for filter in self))
+
+    def _build_digest(self):
+        return field_digest(*self._key()[:3],
+                            *(filter.digest() for filter in self))
+
     @staticmethod
-    def parse(xml):
+    def parse(xml, trusted=False):
         """
         Parse and return a UsageRule
+
+        If trusted is True the values are not checked
         """
         if isinstance(xml, (str, bytes)):
-            xml = etree.fromstring(xml)
+            xml = fromstring(xml)
 
         kid = xml.attrib["kid"]
-        new_usage_rule = UsageRule(kid)
+        intended_track_type = None
+        filters = []
 
         if "intendedTrackType" in xml.attrib:
-            new_usage_rule.intended_track_type = xml.attrib["intendedTrackType"]
+            intended_track_type = xml.attrib["intendedTrackType"]
 
-        for element in xml.getchildren():
-            tag = etree.QName(element.tag).localname
+        for element in xml:
+            cls = TAG_CLASSES.get(element.tag)
+            if cls in FILTER_CLASSES:
+                filters.append(cls.parse(element))
 
-            if tag in ["KeyPeriodFilter", "LabelFilter", "VideoFilter",
-                       "AudioFilter", "BitrateFilter"]:
-                filter = globals()[tag].parse(element)
-                new_usage_rule.append(filter)
+        if trusted:
+            return UsageRule._from_trusted(kid, filters, intended_track_type)
+        return UsageRule(kid, filters, intended_track_type)
 
-        return new_usage_rule
+    def to_dict(self):
+        """
+        Returns a dict of the fields which are set, with the filters as a
+        list of dicts
+        """
+        return drop_none({
+            "kid": str(self.kid),
+            "intended_track_type": self.intended_track_type,
+            "filters": [filter.to_dict() for filter in self],
+        })
+
+    @staticmethod
+    def from_dict(data, trusted=False):
+        """
+        Create a UsageRule from a dict as returned by to_dict()
+
+        If trusted is True the values are not checked
+        """
+        filters = [FILTER_TYPES[filter["type"]].from_dict(filter)
+                   for filter in data.get("filters", ())]
+        if trusted:
+            return UsageRule._from_trusted(
+                data["kid"], filters, data.get("intended_track_type"))
+        return UsageRule(data["kid"], filters,
+                         data.get("intended_track_type"))
+
+
+UsageRuleList._item_class = UsageRule
 
 
 class AudioUsageRule(UsageRule):
     """
     Default usage rule for audio, with a single AudioFilter with no parameters
     """
+    __slots__ = ()
+
     def __init__(self, kid):
         super().__init__(
             kid=kid,
@@ -131,6 +287,7 @@ class VideoUsageRule(UsageRule):
     """
     Default usage rule for vide, with a single VideoFilter with no parameters
     """
+    __slots__ = ()
 
     def __init__(self, kid):
         super().__init__(
@@ -143,6 +300,7 @@ class SDVideoUsageRule(UsageRule):
     Default usage rule for SD Video
     VideoFilter maxPixels <= 768 * 576
     """
+    __slots__ = ()
 
     def __init__(self, kid):
         super().__init__(
@@ -157,6 +315,7 @@ class HDVideoUsageRule(UsageRule):
         minPixels > 768 * 576
         maxPixels <= 1920 * 1080
     """
+    __slots__ = ()
 
     def __init__(self, kid):
         super().__init__(
@@ -173,6 +332,7 @@ class UHD1VideoUsageRule(UsageRule):
         minPixels > 1920 * 1080
         maxPixels <= 4096 * 2160
     """
+    __slots__ = ()
 
     def __init__(self, kid):
         super().__init__(
@@ -188,6 +348,7 @@ class UHD2VideoUsageRule(UsageRule):
     VideoFilter
         minPixels > 4096 * 2160
     """
+    __slots__ = ()
 
     def __init__(self, kid):
         super().__init__(
@@ -87,7 +87,7 @@ import argparse
 import logging
 import cpix
 from cpix.drm import playready, widevine
-from base64 import b16decode, b16encode, b64decode, b64encode
+from base64 import b16decode, b16encode
 from uuid import UUID
 
 
@@ -107,7 +107,7 @@ PRESET_USAGE_RULES = [
 
 
 def parse_keys(keys):
-    parsed_keys = cpix.ContentKeyList()
+    records = []
 
     for key in keys:
         try:
@@ -120,9 +120,9 @@ def parse_keys(keys):
         if len(cek) != 32:
             raise Exception("cek must be 128-bit")
 
-        parsed_keys.append(
-            cpix.ContentKey(kid=kid, cek=b64encode(b16decode(cek))))
-    return parsed_keys
+        # the raw key is stored as it is, base64 encoded only when written
+        records.append((kid, b16decode(cek)))
+    return cpix.ContentKeyList.from_records(records)
 
 
 def main():
@@ -292,32 +292,20 @@ def main():
             version=args.widevine_pssh_version
         )
 
-        for key in keys:
-            drm_systems.append(
-                cpix.DRMSystem(
-                    kid=key.kid,
-                    system_id=cpix.WIDEVINE_SYSTEM_ID,
-                    pssh=b64encode(pssh)
-                )
-            )
+        drm_systems.extend(cpix.DRMSystemList.from_records(
+            (key.kid, cpix.WIDEVINE_SYSTEM_ID, pssh) for key in keys))
 
     if args.playready:
         pssh = playready.generate_pssh(
-            keys=[{"key_id": key.kid, "key": b16encode(
-                b64decode(key.cek))} for key in keys],
+            keys=[{"key_id": key.kid, "key": b16encode(key.cek_bytes)}
+                  for key in keys],
             url=args.playready_la_url,
             algorithm=args.playready_algorithm,
             version=args.playready_pssh_version
         )
 
-        for key in keys:
-            drm_systems.append(
-                cpix.DRMSystem(
-                    kid=key.kid,
-                    system_id=cpix.PLAYREADY_SYSTEM_ID,
-                    pssh=b64encode(pssh)
-                )
-            )
+        drm_systems.extend(cpix.DRMSystemList.from_records(
+            (key.kid, cpix.PLAYREADY_SYSTEM_ID, pssh) for key in keys))
 
     # usage rules
     usage_rules = cpix.UsageRuleList()
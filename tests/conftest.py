@@ -0,0 +1,82 @@
+import pytest
+import cpix
+
+KIDS = ("0DC3EC4F-7683-548B-81E7-3C64E582E136",
+        "1447B7ED-2F66-572B-BD13-06CE7CF3610D")
+
+
+def _make_cpix():
+    return cpix.CPIX(
+        content_id="movie & <extras>",
+        version="2.3",
+        content_keys=cpix.ContentKeyList(
+            cpix.ContentKey(
+                kid=KIDS[0],
+                cek="WADwG2qCqkq5TVml+U5PXw==",
+            ),
+            cpix.ContentKey(
+                kid=KIDS[1],
+                cek="ydugVLA+K017XoGM4mjxvA==",
+                common_encryption_scheme="cbcs",
+                explicit_iv="ydugVLA+K017XoGM4mjxvA==",
+                value_mac="ydugVLA+K017XoGM4mjxvA==",
+            ),
+        ),
+        drm_systems=cpix.DRMSystemList(
+            cpix.DRMSystem(
+                kid=KIDS[0],
+                system_id=cpix.WIDEVINE_SYSTEM_ID,
+                pssh="AAAAMnBzc2gAAAAA7e+LqXnWSs6jyCfc1R0h7QAAABISEA3D7E92g1SLgec8ZOWC4TY=",
+                content_protection_data="AAAA",
+                hls_signaling_data="AAAA",
+                hls_signaling_data_master="AAAA",
+            ),
+            cpix.DRMSystem(
+                kid=KIDS[0],
+                system_id=cpix.PLAYREADY_SYSTEM_ID,
+                pssh="AAAA",
+            ),
+            cpix.DRMSystem(
+                kid=KIDS[1],
+                system_id=cpix.WIDEVINE_SYSTEM_ID,
+                pssh="AAAA",
+            ),
+        ),
+        usage_rules=cpix.UsageRuleList(
+            cpix.AudioUsageRule(kid=KIDS[0]),
+            cpix.UsageRule(
+                kid=KIDS[0],
+                intended_track_type="SD",
+                filters=[
+                    cpix.KeyPeriodFilter(period_id="p0"),
+                    cpix.LabelFilter(label='"main"\ttrack\n'),
+                    cpix.VideoFilter(min_pixels=1, hdr=True, wcg=False),
+                    cpix.AudioFilter(max_channels=2),
+                    cpix.BitrateFilter(min_bitrate=100),
+                ],
+            ),
+            cpix.UsageRule(kid=KIDS[1]),
+        ),
+        periods=cpix.PeriodList(
+            cpix.Period(
+                id="p0", start="2018-08-06T00:00:00Z", end="2018-08-07T00:00:00Z"
+            ),
+            cpix.Period(id="p1", index=1),
+        ),
+        delivery_datas=cpix.DeliveryDataList(
+            cpix.DeliveryData(
+                cpix.DeliveryKey("bm90X2FfcmVhbF9jZXJ0Cg=="),
+                cpix.DocumentKey("bm90X2FfcmVhbF9jaXBoZXJfdmFsdWUK"),
+                cpix.MACMethod("bm90X2FfcmVhbF9tYWMK"),
+            ),
+        ),
+    )
+
+
+@pytest.fixture
+def make_cpix():
+    """
+    Returns a function building a new document with every section and values
+    which need escaping, the same each time it is called
+    """
+    return _make_cpix
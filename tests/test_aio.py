@@ -0,0 +1,95 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import cpix
+from cpix import aio
+
+
+async def stream(data, size):
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+
+class Writer():
+    def __init__(self):
+        self.data = b""
+        self.drained = False
+
+    def write(self, data):
+        self.data += data
+
+    async def drain(self):
+        self.drained = True
+
+
+def test_aparse(make_cpix):
+    xml = make_cpix().pretty_print()
+
+    parsed = asyncio.run(aio.aparse(xml))
+
+    assert parsed == cpix.parse(xml)
+
+
+def test_aparse_stream(make_cpix):
+    xml = make_cpix().pretty_print()
+
+    parsed = asyncio.run(aio.aparse(stream(xml, 50), trusted=True))
+
+    assert parsed == cpix.parse(xml)
+
+
+def test_aparse_stream_reader(make_cpix):
+    xml = make_cpix().pretty_print()
+
+    async def main():
+        reader = asyncio.StreamReader()
+        reader.feed_data(xml)
+        reader.feed_eof()
+        return await aio.aparse(reader)
+
+    assert asyncio.run(main()) == cpix.parse(xml)
+
+
+def test_avalidate(make_cpix):
+    xml = cpix.CPIX(periods=make_cpix().periods).pretty_print()
+
+    valid, error = asyncio.run(aio.avalidate(stream(xml, 50)))
+
+    assert valid
+
+
+def test_awrite(make_cpix):
+    writer = Writer()
+
+    asyncio.run(aio.awrite(make_cpix(), writer))
+
+    assert writer.data == make_cpix().pretty_print()
+    assert writer.drained
+
+
+def test_stream_parsed_in_one_thread(make_cpix, monkeypatch):
+    xml = make_cpix().pretty_print()
+    threads = set()
+    new_feed_parser = aio._new_feed_parser
+
+    class FeedParser():
+        def __init__(self):
+            threads.add(threading.get_ident())
+            self.parser = new_feed_parser()
+
+        def feed(self, data):
+            threads.add(threading.get_ident())
+            self.parser.feed(data)
+
+        def close(self):
+            threads.add(threading.get_ident())
+            return self.parser.close()
+
+    monkeypatch.setattr(aio, "_new_feed_parser", FeedParser)
+    executor = ThreadPoolExecutor(max_workers=4)
+
+    parsed = asyncio.run(aio.aparse(stream(xml, 50), executor=executor))
+
+    assert parsed == cpix.parse(xml)
+    assert len(threads) == 1
+    assert threading.get_ident() not in threads
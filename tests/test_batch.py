@@ -0,0 +1,60 @@
+import cpix
+from concurrent.futures import ThreadPoolExecutor
+
+
+def make_documents(count):
+    return [
+        cpix.CPIX(
+            periods=cpix.PeriodList(cpix.Period(id="p{}".format(i), index=i))
+        ).pretty_print()
+        for i in range(count)
+    ]
+
+
+def test_parse_many():
+    documents = make_documents(4)
+
+    results = list(cpix.parse_many(documents, max_workers=2))
+
+    assert [result.index for result in results] == [0, 1, 2, 3]
+    assert [result.error for result in results] == [None] * 4
+    assert [result.result.periods[0].id for result in results] == [
+        "p0", "p1", "p2", "p3"]
+
+
+def test_parse_many_files(tmp_path):
+    paths = []
+    for i, document in enumerate(make_documents(3)):
+        path = tmp_path / "cpix{}.xml".format(i)
+        path.write_bytes(document)
+        paths.append(path)
+
+    results = list(cpix.parse_many(paths, max_workers=2, ordered=False))
+
+    assert sorted(result.index for result in results) == [0, 1, 2]
+    for result in results:
+        assert result.source == paths[result.index]
+        assert result.result.periods[0].index == result.index
+
+
+def test_parse_many_error_does_not_stop_batch():
+    documents = make_documents(2)
+    documents.insert(1, b"<CPIX>")
+
+    results = list(cpix.parse_many(documents, max_workers=2))
+
+    assert results[0].error is None
+    assert results[1].result is None
+    assert isinstance(results[1].error, ValueError)
+    assert results[2].error is None
+
+
+def test_validate_many():
+    documents = make_documents(2)
+    documents.append(b'<CPIX xmlns="urn:dashif:org:cpix"><Foo/></CPIX>')
+
+    with ThreadPoolExecutor(2) as executor:
+        results = list(cpix.validate_many(documents, executor=executor))
+
+    assert [result.result for result in results] == [True, True, False]
+    assert results[2].error is not None
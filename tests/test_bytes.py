@@ -0,0 +1,119 @@
+import copy
+import pickle
+import uuid
+from base64 import b64encode
+import pytest
+import cpix
+
+KID = uuid.UUID("0dc3ec4f-7683-548b-81e7-3c64e582e136")
+CEK = bytes(range(16))
+CEK_BASE64 = b64encode(CEK).decode("ascii")
+PSSH = bytes(range(32))
+
+
+def test_content_key_bytes():
+    content_key = cpix.ContentKey(KID, CEK_BASE64)
+    assert content_key.cek_bytes == CEK
+    assert content_key.explicit_iv_bytes is None
+
+    raw = cpix.ContentKey(KID)
+    raw.cek_bytes = CEK
+    raw.explicit_iv_bytes = bytearray(CEK)
+    assert raw.cek == CEK_BASE64
+    assert raw.explicit_iv == CEK_BASE64
+    assert raw == cpix.ContentKey(KID, CEK_BASE64, explicit_iv=CEK_BASE64)
+    assert raw.element().findtext(".//{*}PlainValue") == CEK_BASE64
+
+    raw.explicit_iv_bytes = None
+    assert raw.explicit_iv is None
+    with pytest.raises(TypeError):
+        raw.cek_bytes = CEK_BASE64
+
+
+def test_base64_bytes_kept():
+    cek = CEK_BASE64.encode("ascii")
+    content_key = cpix.ContentKey(KID, cek, explicit_iv=cek, value_mac=cek)
+    assert content_key.cek == cek
+    assert content_key.explicit_iv == cek
+    assert content_key.value_mac == cek
+    assert content_key.cek_bytes == CEK
+    assert content_key == cpix.ContentKey(
+        KID, CEK_BASE64, explicit_iv=CEK_BASE64, value_mac=CEK_BASE64)
+    assert pickle.loads(pickle.dumps(content_key)).cek == cek
+    assert cpix.ContentKeyTable.from_list([content_key])[0].cek_bytes == CEK
+
+    drm_system = cpix.DRMSystem(KID, cpix.WIDEVINE_SYSTEM_ID, b64encode(PSSH))
+    assert drm_system.pssh == b64encode(PSSH)
+    assert drm_system.pssh_bytes == PSSH
+
+    for cls in (cpix.DocumentKey, cpix.MACMethod):
+        value = cls(cek)
+        assert value.cipher_value == cek
+        assert value.cipher_value_bytes == CEK
+
+
+def test_buffers_not_copied():
+    buffer = bytearray(CEK)
+    view = memoryview(buffer)
+    content_key = cpix.ContentKey(KID)
+    content_key.cek_bytes = view
+    assert content_key.cek_bytes is view
+
+    content_keys = cpix.ContentKeyList.from_records([(KID, view)])
+    assert content_keys[0].cek_bytes is view
+
+
+def test_memoryview_pickle():
+    content_key = cpix.ContentKey(KID)
+    content_key.cek_bytes = memoryview(CEK)
+    for copied in (pickle.loads(pickle.dumps(content_key)),
+                   copy.deepcopy(content_key)):
+        assert copied == content_key
+        assert copied.cek_bytes == CEK
+
+
+def test_drm_system_bytes():
+    drm_system = cpix.DRMSystem(KID, cpix.WIDEVINE_SYSTEM_ID)
+    drm_system.pssh_bytes = PSSH
+    assert drm_system.pssh == b64encode(PSSH).decode("ascii")
+    assert drm_system == cpix.DRMSystem(
+        KID, cpix.WIDEVINE_SYSTEM_ID, b64encode(PSSH))
+
+    drm_systems = cpix.DRMSystemList.from_records(
+        [(KID, cpix.WIDEVINE_SYSTEM_ID, PSSH)])
+    assert drm_systems[0].pssh_bytes is PSSH
+
+
+def test_cipher_value_bytes():
+    for cls in (cpix.DocumentKey, cpix.MACMethod):
+        value = cls(CEK_BASE64)
+        assert value.cipher_value_bytes == CEK
+        value.cipher_value_bytes = PSSH
+        assert value.cipher_value == b64encode(PSSH).decode("ascii")
+        with pytest.raises(TypeError):
+            value.cipher_value_bytes = None
+
+
+def test_table_bytes():
+    table = cpix.ContentKeyTable.from_records([(KID, CEK)])
+    assert table[0].cek_bytes == CEK
+    table[0].cek_bytes = PSSH
+    assert table[0].cek == b64encode(PSSH).decode("ascii")
+    assert table.to_list()[0].cek_bytes == PSSH
+
+
+def test_table_keeps_base64_text():
+    content_key = cpix.ContentKey(KID, "AAAA\nAAAA", explicit_iv=CEK_BASE64)
+    table = cpix.ContentKeyTable.from_list([content_key])
+    assert table[0] == content_key
+    assert table[0].cek == "AAAA\nAAAA"
+    assert table[0].cek_bytes == bytes(6)
+    assert table[0].explicit_iv_bytes == CEK
+    content_keys = cpix.ContentKeyList(content_key)
+    assert (cpix.CPIX(content_keys=table).pretty_print() ==
+            cpix.CPIX(content_keys=content_keys).pretty_print())
+    table.insert(0, cpix.ContentKey(uuid.uuid4(), CEK_BASE64))
+    table.reverse()
+    assert table[0].cek == "AAAA\nAAAA"
+    del table[0]
+    assert table[0].cek == CEK_BASE64
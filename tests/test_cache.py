@@ -0,0 +1,216 @@
+import gc
+import pickle
+import weakref
+import cpix
+from cpix import etree
+
+
+def test_element_is_a_copy(make_cpix):
+    document = make_cpix()
+    expected = document.pretty_print()
+
+    document.element().clear()
+
+    assert document.pretty_print() == expected
+
+
+def test_setter_invalidates(make_cpix):
+    document = make_cpix()
+    document.pretty_print()
+
+    document.content_keys[1].cek = "WADwG2qCqkq5TVml+U5PXw=="
+    document.usage_rules[1][2].max_pixels = 200
+    document.delivery_datas[0].document_key.cipher_value = "AAAA"
+    document.content_id = "changed"
+
+    expected = make_cpix()
+    expected.content_keys[1].cek = "WADwG2qCqkq5TVml+U5PXw=="
+    expected.usage_rules[1][2].max_pixels = 200
+    expected.delivery_datas[0].document_key.cipher_value = "AAAA"
+    expected.content_id = "changed"
+    assert document.pretty_print() == expected.pretty_print()
+
+
+def test_list_mutation_invalidates(make_cpix):
+    document = make_cpix()
+    document.pretty_print()
+    content_key = document.content_keys[0]
+
+    del document.content_keys[0]
+    document.usage_rules.append(cpix.AudioUsageRule(
+        kid="1447B7ED-2F66-572B-BD13-06CE7CF3610D"))
+    document.usage_rules[0] = cpix.VideoUsageRule(
+        kid="1447B7ED-2F66-572B-BD13-06CE7CF3610D")
+    output = document.pretty_print()
+    content_key.cek = "ydugVLA+K017XoGM4mjxvA=="
+
+    assert output.count(b"<ContentKey ") == 1
+    assert output.count(b"<ContentKeyUsageRule ") == 4
+    assert b"<VideoFilter/>" in output
+    assert document.pretty_print() == output
+
+
+def test_only_changed_elements_rebuilt(monkeypatch, make_cpix):
+    document = make_cpix()
+    # items are cached serialized from the second time they are built
+    document.pretty_print()
+    document.content_keys[0].cek = "ydugVLA+K017XoGM4mjxvA=="
+    document.pretty_print()
+    built = []
+    build_element = cpix.ContentKey._build_element
+    monkeypatch.setattr(
+        cpix.ContentKey, "_build_element",
+        lambda self: built.append(self) or build_element(self))
+
+    document.content_keys[1].explicit_iv = "WADwG2qCqkq5TVml+U5PXw=="
+    document.pretty_print()
+
+    assert built == [document.content_keys[1]]
+
+
+def test_parallel_write_uses_cache(monkeypatch, make_cpix):
+    document = make_cpix()
+    document.pretty_print(workers=2)
+    document.content_keys[0].cek = "ydugVLA+K017XoGM4mjxvA=="
+    document.pretty_print(workers=2)
+    built = []
+    build_element = cpix.ContentKey._build_element
+    monkeypatch.setattr(
+        cpix.ContentKey, "_build_element",
+        lambda self: built.append(self) or build_element(self))
+
+    document.content_keys[1].explicit_iv = "WADwG2qCqkq5TVml+U5PXw=="
+    parallel = document.pretty_print(workers=2, encoding="utf-16")
+
+    assert built == [document.content_keys[1]]
+    assert parallel == document.pretty_print(encoding="utf-16")
+
+
+def test_pickle_cached(make_cpix):
+    document = make_cpix()
+    document.pretty_print()
+
+    assert pickle.loads(pickle.dumps(document)) == document
+
+
+def test_digest(make_cpix):
+    document = make_cpix()
+    digest = document.digest()
+
+    assert len(digest) == 32
+    assert document.hexdigest() == digest.hex()
+    assert make_cpix().digest() == digest
+    assert cpix.parse(document.pretty_print()).digest() == digest
+    assert cpix.parse(document.pretty_print(), lazy=True).digest() == digest
+
+
+def test_digest_changes(make_cpix):
+    document = make_cpix()
+    digests = {document.digest()}
+
+    document.usage_rules[1][2].max_pixels = 200
+    digests.add(document.digest())
+    document.content_keys[1].cek = "AAAAAAAAAAAAAAAAAAAAAg=="
+    digests.add(document.digest())
+    del document.content_keys[1]
+    digests.add(document.digest())
+    document.content_id = "new"
+    digests.add(document.digest())
+
+    assert len(digests) == 5
+
+
+def test_digest_only_changed_rebuilt(monkeypatch, make_cpix):
+    document = make_cpix()
+    document.digest()
+
+    built = []
+    build = cpix.ContentKey._build_digest
+    monkeypatch.setattr(cpix.ContentKey, "_build_digest",
+                        lambda self: built.append(self) or build(self))
+
+    document.content_keys[0].cek = "AAAAAAAAAAAAAAAAAAAAAg=="
+    document.digest()
+
+    assert built == [document.content_keys[0]]
+
+
+def test_owners_not_kept_alive(make_cpix):
+    content_key = make_cpix().content_keys[0]
+    for _ in range(10):
+        document = cpix.CPIX(content_keys=cpix.ContentKeyList(content_key))
+        document.pretty_print()
+    document = weakref.ref(document)
+    gc.collect()
+
+    assert document() is None
+    content_key.cek = "ydugVLA+K017XoGM4mjxvA=="
+    document = cpix.CPIX(content_keys=cpix.ContentKeyList(content_key))
+    document.pretty_print()
+    assert len(content_key._owners) == 1
+
+
+def test_cached_fragments_match(make_cpix):
+    document = make_cpix()
+    document.periods = cpix.PeriodList(cpix.Period("p1", index=1))
+    document.pretty_print()
+    document.content_id = "changed"
+    # now built from the fragments cached by the second serialization
+    document.pretty_print()
+    document.content_id = "again"
+
+    expected = make_cpix()
+    expected.periods = cpix.PeriodList(cpix.Period("p1", index=1))
+    expected.content_id = "again"
+    assert document.pretty_print() == expected.pretty_print()
+    assert document.to_canonical_bytes() == expected.to_canonical_bytes()
+    assert document.content_keys._list[0]._cached_fragment() is not None
+
+
+def test_list_property_is_a_copy(make_cpix):
+    document = make_cpix()
+    output = document.pretty_print()
+    content_keys = document.content_keys
+    content_key = cpix.ContentKey(
+        kid="2d6ba3a4-7d8e-44cf-8bd0-8aa0cb4e2df5",
+        cek="ydugVLA+K017XoGM4mjxvA==")
+
+    content_keys.list.append(content_key)
+    assert len(content_keys) == 2
+    assert document.pretty_print() == output
+
+    items = content_keys.list + [content_key]
+    content_keys.list = items
+    items.pop()
+    assert len(content_keys) == 3
+    assert content_key.kid in content_keys.by_kid
+    assert document.pretty_print() != output
+
+
+def test_cached_fragments_keep_namespaces(make_cpix):
+    document = make_cpix()
+    for items in (document.content_keys, document.drm_systems,
+                  document.usage_rules, document.periods,
+                  document.delivery_datas):
+        # built, built and cached, then parsed from the cached fragments
+        trees = [items.element() for _ in range(3)]
+        assert items._list[0]._cached_fragment() is not None
+        for element in trees[1:]:
+            assert [el.tag for el in element.iter()] == \
+                [el.tag for el in trees[0].iter()]
+            assert [el.nsmap for el in element] == \
+                [el.nsmap for el in trees[0]]
+            assert etree.tostring(element) == etree.tostring(trees[0])
+    assert document.element().find("DRMSystemList/DRMSystem") is not None
+
+
+def test_pretty_print_unhashable_arguments(make_cpix):
+    document = make_cpix()
+    kwargs = {"method": "c14n", "exclusive": True, "encoding": None,
+              "inclusive_ns_prefixes": ["pskc"]}
+
+    output = document.pretty_print(**kwargs)
+
+    assert output == document.pretty_print(**kwargs)
+    assert output == etree.tostring(document.element(), pretty_print=True,
+                                    **kwargs)
@@ -0,0 +1,94 @@
+import copy
+import pickle
+import uuid
+import pytest
+import cpix
+
+
+def make_content_keys(count=10):
+    return cpix.ContentKeyList([
+        cpix.ContentKey(
+            uuid.UUID(int=(i * 7919) % 97 + 1),
+            cek="WADwG2qCqkq5TVml+U5PXw==",
+            common_encryption_scheme="cbcs" if i % 2 else "cenc",
+            explicit_iv="OnJbI/Ve1Ao8B6Y6gzp0Lw==" if i % 3 else None)
+        for i in range(count)
+    ])
+
+
+def test_table_round_trip():
+    content_keys = make_content_keys()
+
+    table = cpix.ContentKeyTable.from_list(content_keys)
+
+    assert len(table) == len(content_keys)
+    assert table == content_keys
+    assert table.pretty_print() == content_keys.pretty_print()
+    assert table.to_list() == content_keys
+    assert all(type(key) is cpix.ContentKey for key in table.to_list())
+    assert cpix.ContentKeyTable.parse(content_keys.element()) == table
+    assert cpix.ContentKeyTable.from_dict(table.to_dict()) == table
+    assert pickle.loads(pickle.dumps(table)) == table
+    assert copy.deepcopy(table) == table
+
+
+def test_table_views():
+    content_keys = make_content_keys()
+    table = cpix.ContentKeyTable.from_list(content_keys)
+    document = cpix.CPIX(content_keys=table)
+    before = document.pretty_print()
+
+    table[2].cek = "AAAAAAAAAAAAAAAAAAAAAA=="
+    content_keys[2].cek = "AAAAAAAAAAAAAAAAAAAAAA=="
+    assert table[2].cek == "AAAAAAAAAAAAAAAAAAAAAA=="
+    assert table == content_keys
+    assert document.pretty_print() != before
+    with pytest.raises(ValueError):
+        table[2].explicit_iv = "not base64"
+
+    del table[0]
+    del content_keys[0]
+    table.insert(-1, cpix.ContentKey(uuid.uuid4()))
+    content_keys.insert(-1, table[-2].to_content_key())
+    table.reverse()
+    content_keys.reverse()
+    assert table == content_keys
+    assert isinstance(table[0], cpix.ContentKey)
+
+
+def test_table_pop():
+    content_keys = make_content_keys()
+    table = cpix.ContentKeyTable.from_list(content_keys)
+
+    assert table.pop(0) == content_keys.pop(0)
+    assert table.pop() == content_keys.pop()
+    assert table.pop(-3) == content_keys.pop(-3)
+    assert table == content_keys
+    with pytest.raises(IndexError):
+        cpix.ContentKeyTable().pop()
+
+
+def test_table_lookup():
+    content_keys = make_content_keys(50)
+    table = cpix.ContentKeyTable.from_list(content_keys)
+
+    for row, content_key in enumerate(content_keys):
+        assert table.index_of(content_key.kid) == row
+        assert table.get(str(content_key.kid)) == content_key
+    assert table.get(uuid.UUID(int=1000)) is None
+    with pytest.raises(KeyError):
+        table.index_of(uuid.UUID(int=1000))
+
+    # the order is rebuilt after a change
+    table[0] = cpix.ContentKey(uuid.UUID(int=1000))
+    assert table.index_of(uuid.UUID(int=1000)) == 0
+
+
+def test_table_by_kid():
+    content_keys = make_content_keys(20)
+    table = cpix.ContentKeyTable.from_list(content_keys)
+    table.append(cpix.ContentKey(content_keys[0].kid))
+
+    assert len(table.by_kid) == len(content_keys.by_kid) == 20
+    assert list(table.by_kid) == list(content_keys.by_kid)
+    assert table.by_kid[content_keys[5].kid] == content_keys[5]
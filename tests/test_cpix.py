@@ -1,3 +1,4 @@
+import io
 import pytest
 import cpix
 import isodate
@@ -439,6 +440,28 @@ def test_compare_simple_audio_and_video_filters():
     assert vf != vf2
 
 
+def test_sort_order():
+    # by tag, then the compared values in the order element() writes them,
+    # set values before missing ones, not by the serialized XML
+    kid = UUID(int=1)
+    assert sorted([
+        cpix.VideoFilter(max_pixels=7),
+        cpix.VideoFilter(),
+        cpix.VideoFilter(min_pixels=9),
+        cpix.AudioFilter(),
+        cpix.VideoFilter(min_pixels=10),
+    ]) == [
+        cpix.AudioFilter(),
+        cpix.VideoFilter(min_pixels=10),
+        cpix.VideoFilter(min_pixels=9),
+        cpix.VideoFilter(max_pixels=7),
+        cpix.VideoFilter(),
+    ]
+    assert cpix.VideoFilter(min_pixels=5) < cpix.VideoFilter(max_pixels=7)
+    assert cpix.ContentKey(kid, cek="AAAA") < cpix.ContentKey(kid)
+    assert cpix.ContentKey(kid) < cpix.ContentKey(UUID(int=2), cek="AAAA")
+
+
 def test_audio_filter_equality():
     af = cpix.AudioFilter(min_channels=2)
     af2 = cpix.AudioFilter(min_channels=1)
@@ -447,6 +470,40 @@ def test_audio_filter_equality():
     assert af == cpix.AudioFilter(min_channels=2)
 
 
+def test_equality_matches_xml():
+    kid = "0dc3ec4f-7683-548b-81e7-3c64e582e136"
+    key = cpix.ContentKey(kid, cek="WADwG2qCqkq5TVml+U5PXw==")
+
+    assert key == cpix.ContentKey(kid.upper(), cek=b"WADwG2qCqkq5TVml+U5PXw==")
+    # ValueMAC is only written along with a cek
+    assert cpix.ContentKey(kid) == cpix.ContentKey(kid, value_mac="AAAA")
+    assert key != cpix.ContentKey(kid, cek="AAAAAAAAAAAAAAAAAAAAAg==")
+    assert cpix.AudioUsageRule(kid) == cpix.UsageRule(kid, [cpix.AudioFilter()])
+    assert cpix.VideoFilter(hdr=1) == cpix.VideoFilter(hdr=True)
+    assert cpix.ContentKeyList() != cpix.DRMSystemList()
+    assert key != str(key)
+
+
+def test_hash_and_sort():
+    keys = [cpix.ContentKey(UUID(int=i % 3)) for i in range(9)]
+
+    assert len(set(keys)) == 3
+    assert hash(keys[0]) == hash(keys[3])
+    in_order = sorted(keys)
+    # ordered by the compared values, without serializing
+    assert all("str" not in key._cache for key in keys)
+    assert in_order == sorted(keys, key=lambda key: str(key))
+    assert keys[1] in cpix.ContentKeyList(keys[3:6])
+
+    content_keys = cpix.ContentKeyList(keys[:3])
+    other = cpix.ContentKeyList(keys[3:6])
+    assert content_keys == other and hash(content_keys) == hash(other)
+
+    # changing an item changes the comparison of the lists holding it
+    other[0].cek = "AAAAAAAAAAAAAAAAAAAAAg=="
+    assert content_keys != other
+
+
 def test_validate_complex_cpix():
     complex_cpix_xml = b'<CPIX xmlns:pskc="urn:ietf:params:xml:ns:keyprov:pskc" xmlns:ds="http://www.w3.org/2000/09/xmldsig#" xmlns:enc="http://www.w3.org/2001/04/xmlenc#" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xmlns="urn:dashif:org:cpix" xsi:schemaLocation="urn:dashif:org:cpix cpix.xsd"><ContentKeyList><ContentKey kid="0dc3ec4f-7683-548b-81e7-3c64e582e136"><Data><pskc:Secret><pskc:PlainValue>WADwG2qCqkq5TVml+U5PXw==</pskc:PlainValue></pskc:Secret></Data></ContentKey><ContentKey kid="1447b7ed-2f66-572b-bd13-06ce7cf3610d"><Data><pskc:Secret><pskc:PlainValue>ydugVLA+K017XoGM4mjxvA==</pskc:PlainValue></pskc:Secret></Data></ContentKey><ContentKey kid="00000000-0000-0000-0000-000000000002"><Data><pskc:Secret><pskc:PlainValue>AAAAAAAAAAAAAAAAAAAAAg==</pskc:PlainValue></pskc:Secret></Data></ContentKey></ContentKeyList><DRMSystemList><DRMSystem kid="0dc3ec4f-7683-548b-81e7-3c64e582e136" systemId="edef8ba9-79d6-4ace-a3c8-27dcd51d21ed"><PSSH>AAAAxnBzc2gBAAAA7e+LqXnWSs6jyCfc1R0h7QAAAAINw+xPdoNUi4HnPGTlguE2FEe37S9mVyu9EwbOfPNhDQAAAIISEBRHt+0vZlcrvRMGznzzYQ0SEFrGoR6qL17Vv2aMQByBNMoSEG7hNRbI51h7rp9+zT6Zom4SEPnsEqYaJl1Hj4MzTjp40scSEA3D7E92g1SLgec8ZOWC4TYaDXdpZGV2aW5lX3Rlc3QiEXVuaWZpZWQtc3RyZWFtaW5nSOPclZsG</PSSH><ContentProtectionData>PCEtLSBXaWRldmluZSAtLT4KPENvbnRlbnRQcm90ZWN0aW9uCiAgeG1sbnM9InVybjptcGVnOmRhc2g6c2NoZW1hOm1wZDoyMDExIgogIHhtbG5zOmNlbmM9InVybjptcGVnOmNlbmM6MjAxMyIKICBzY2hlbWVJZFVyaT0idXJuOnV1aWQ6RURFRjhCQTktNzlENi00QUNFLUEzQzgtMjdEQ0Q1MUQyMUVEIj4KICA8Y2VuYzpwc3NoPkFBQUF4bkJ6YzJnQkFBQUE3ZStMcVhuV1NzNmp5Q2ZjMVIwaDdRQUFBQUlOdyt4UGRvTlVpNEhuUEdUbGd1RTJGRWUzN1M5bVZ5dTlFd2JPZlBOaERRQUFBSUlTRUJSSHQrMHZabGNydlJNR3puenpZUTBTRUZyR29SNnFMMTdWdjJhTVFCeUJOTW9TRUc3aE5SYkk1MWg3cnA5K3pUNlpvbTRTRVBuc0VxWWFKbDFIajRNelRqcDQwc2NTRUEzRDdFOTJnMVNMZ2VjOFpPV0M0VFlhRFhkcFpHVjJhVzVsWDNSbGMzUWlFWFZ1YVdacFpXUXRjM1J5WldGdGFXNW5TT1BjbFpzRzwvY2VuYzpwc3NoPgo8L0NvbnRlbnRQcm90ZWN0aW9uPg==</ContentProtectionData><HLSSignalingData>I0VYVC1YLUtFWTpNRVRIT0Q9U0FNUExFLUFFUyxLRVlJRD0weDBEQzNFQzRGNzY4MzU0OEI4MUU3M0M2NEU1ODJFMTM2LFVSST0iZGF0YTp0ZXh0L3BsYWluO2Jhc2U2NCxBQUFBb25CemMyZ0FBQUFBN2UrTHFYbldTczZqeUNmYzFSMGg3UUFBQUlJU0VCUkh0KzB2WmxjcnZSTUd6bnp6WVEwU0VGckdvUjZxTDE3VnYyYU1RQnlCTk1vU0VHN2hOUmJJNTFoN3JwOSt6VDZab200U0VQbnNFcVlhSmwxSGo0TXpUanA0MHNjU0VBM0Q3RTkyZzFTTGdlYzhaT1dDNFRZYURYZHBaR1YyYVc1bFgzUmxjM1FpRVhWdWFXWnBaV1F0YzNSeVpXRnRhVzVuU09QY2xac0ciLEtFWUZPUk1BVD0idXJuOnV1aWQ6ZWRlZjhiYTktNzlkNi00YWNlLWEzYzgtMjdkY2Q1MWQyMWVkIixLRVlGT1JNQVRWRVJTSU9OUz0iMSIK</HLSSignalingData></DRMSystem><DRMSystem kid="1447b7ed-2f66-572b-bd13-06ce7cf3610d" systemId="edef8ba9-79d6-4ace-a3c8-27dcd51d21ed"><PSSH>AAAAxnBzc2gBAAAA7e+LqXnWSs6jyCfc1R0h7QAAAAINw+xPdoNUi4HnPGTlguE2FEe37S9mVyu9EwbOfPNhDQAAAIISEBRHt+0vZlcrvRMGznzzYQ0SEFrGoR6qL17Vv2aMQByBNMoSEG7hNRbI51h7rp9+zT6Zom4SEPnsEqYaJl1Hj4MzTjp40scSEA3D7E92g1SLgec8ZOWC4TYaDXdpZGV2aW5lX3Rlc3QiEXVuaWZpZWQtc3RyZWFtaW5nSOPclZsG</PSSH><ContentProtectionData>PCEtLSBXaWRldmluZSAtLT4KPENvbnRlbnRQcm90ZWN0aW9uCiAgeG1sbnM9InVybjptcGVnOmRhc2g6c2NoZW1hOm1wZDoyMDExIgogIHhtbG5zOmNlbmM9InVybjptcGVnOmNlbmM6MjAxMyIKICBzY2hlbWVJZFVyaT0idXJuOnV1aWQ6RURFRjhCQTktNzlENi00QUNFLUEzQzgtMjdEQ0Q1MUQyMUVEIj4KICA8Y2VuYzpwc3NoPkFBQUF4bkJ6YzJnQkFBQUE3ZStMcVhuV1NzNmp5Q2ZjMVIwaDdRQUFBQUlOdyt4UGRvTlVpNEhuUEdUbGd1RTJGRWUzN1M5bVZ5dTlFd2JPZlBOaERRQUFBSUlTRUJSSHQrMHZabGNydlJNR3puenpZUTBTRUZyR29SNnFMMTdWdjJhTVFCeUJOTW9TRUc3aE5SYkk1MWg3cnA5K3pUNlpvbTRTRVBuc0VxWWFKbDFIajRNelRqcDQwc2NTRUEzRDdFOTJnMVNMZ2VjOFpPV0M0VFlhRFhkcFpHVjJhVzVsWDNSbGMzUWlFWFZ1YVdacFpXUXRjM1J5WldGdGFXNW5TT1BjbFpzRzwvY2VuYzpwc3NoPgo8L0NvbnRlbnRQcm90ZWN0aW9uPg==</ContentProtectionData><HLSSignalingData>I0VYVC1YLUtFWTpNRVRIT0Q9U0FNUExFLUFFUyxLRVlJRD0weDE0NDdCN0VEMkY2NjU3MkJCRDEzMDZDRTdDRjM2MTBELFVSST0iZGF0YTp0ZXh0L3BsYWluO2Jhc2U2NCxBQUFBb25CemMyZ0FBQUFBN2UrTHFYbldTczZqeUNmYzFSMGg3UUFBQUlJU0VCUkh0KzB2WmxjcnZSTUd6bnp6WVEwU0VGckdvUjZxTDE3VnYyYU1RQnlCTk1vU0VHN2hOUmJJNTFoN3JwOSt6VDZab200U0VQbnNFcVlhSmwxSGo0TXpUanA0MHNjU0VBM0Q3RTkyZzFTTGdlYzhaT1dDNFRZYURYZHBaR1YyYVc1bFgzUmxjM1FpRVhWdWFXWnBaV1F0YzNSeVpXRnRhVzVuU09QY2xac0ciLEtFWUZPUk1BVD0idXJuOnV1aWQ6ZWRlZjhiYTktNzlkNi00YWNlLWEzYzgtMjdkY2Q1MWQyMWVkIixLRVlGT1JNQVRWRVJTSU9OUz0iMSIK</HLSSignalingData></DRMSystem><DRMSystem kid="00000000-0000-0000-0000-000000000002" systemId="edef8ba9-79d6-4ace-a3c8-27dcd51d21ed"><PSSH>AAAAxnBzc2gBAAAA7e+LqXnWSs6jyCfc1R0h7QAAAAINw+xPdoNUi4HnPGTlguE2FEe37S9mVyu9EwbOfPNhDQAAAIISEBRHt+0vZlcrvRMGznzzYQ0SEFrGoR6qL17Vv2aMQByBNMoSEG7hNRbI51h7rp9+zT6Zom4SEPnsEqYaJl1Hj4MzTjp40scSEA3D7E92g1SLgec8ZOWC4TYaDXdpZGV2aW5lX3Rlc3QiEXVuaWZpZWQtc3RyZWFtaW5nSOPclZsG</PSSH><ContentProtectionData></ContentProtectionData><HLSSignalingData>I0VYVC1YLUtFWTpNRVRIT0Q9U0FNUExFLUFFUyxLRVlJRD0weDE0NDdCN0VEMkY2NjU3MkJCRDEzMDZDRTdDRjM2MTBELFVSST0iZGF0YTp0ZXh0L3BsYWluO2Jhc2U2NCxBQUFBb25CemMyZ0FBQUFBN2UrTHFYbldTczZqeUNmYzFSMGg3UUFBQUlJU0VCUkh0KzB2WmxjcnZSTUd6bnp6WVEwU0VGckdvUjZxTDE3VnYyYU1RQnlCTk1vU0VHN2hOUmJJNTFoN3JwOSt6VDZab200U0VQbnNFcVlhSmwxSGo0TXpUanA0MHNjU0VBM0Q3RTkyZzFTTGdlYzhaT1dDNFRZYURYZHBaR1YyYVc1bFgzUmxjM1FpRVhWdWFXWnBaV1F0YzNSeVpXRnRhVzVuU09QY2xac0ciLEtFWUZPUk1BVD0idXJuOnV1aWQ6ZWRlZjhiYTktNzlkNi00YWNlLWEzYzgtMjdkY2Q1MWQyMWVkIixLRVlGT1JNQVRWRVJTSU9OUz0iMSIK</HLSSignalingData></DRMSystem></DRMSystemList><ContentKeyUsageRuleList><ContentKeyUsageRule kid="0dc3ec4f-7683-548b-81e7-3c64e582e136"><AudioFilter/></ContentKeyUsageRule><ContentKeyUsageRule kid="1447b7ed-2f66-572b-bd13-06ce7cf3610d"><VideoFilter maxPixels="38912"/></ContentKeyUsageRule><ContentKeyUsageRule kid="00000000-0000-0000-0000-000000000002"><VideoFilter minPixels="38913"/></ContentKeyUsageRule></ContentKeyUsageRuleList></CPIX>'
 
@@ -576,3 +633,307 @@ def test_intended_track_type():
     assert xml == (
         b'<ContentKeyUsageRule kid="fdde4136-c15c-4953-bd45-ce0f454bd130" intendedTrackType="VIDEO_AUDIO"><VideoFilter/><AudioFilter/></ContentKeyUsageRule>'
     )
+
+
+def test_lazy_parse():
+    cpix_xml = b'<CPIX xmlns:pskc="urn:ietf:params:xml:ns:keyprov:pskc" xmlns="urn:dashif:org:cpix" contentId="lazy"><ContentKeyList><ContentKey kid="0dc3ec4f-7683-548b-81e7-3c64e582e136"><Data><pskc:Secret><pskc:PlainValue>WADwG2qCqkq5TVml+U5PXw==</pskc:PlainValue></pskc:Secret></Data></ContentKey></ContentKeyList><ContentKeyPeriodList><ContentKeyPeriod id="test" index="0"/></ContentKeyPeriodList></CPIX>'
+
+    lazy_cpix = cpix.CPIX.parse(cpix_xml, lazy=True)
+
+    assert lazy_cpix.content_id == "lazy"
+    assert set(lazy_cpix._lazy_sections) == {"content_keys", "periods"}
+
+    assert len(lazy_cpix.content_keys) == 1
+    assert lazy_cpix.content_keys[0].cek == "WADwG2qCqkq5TVml+U5PXw=="
+    assert set(lazy_cpix._lazy_sections) == {"periods"}
+
+    assert lazy_cpix.periods == cpix.CPIX.parse(cpix_xml).periods
+    assert lazy_cpix._lazy_sections == {}
+
+
+def test_lazy_parse_untouched_element():
+    cpix_xml = b'<CPIX xmlns="urn:dashif:org:cpix"><ContentKeyPeriodList><ContentKeyPeriod id="test" index="0"/></ContentKeyPeriodList></CPIX>'
+
+    lazy_cpix = cpix.CPIX.parse(cpix_xml, lazy=True)
+
+    xml = etree.tostring(lazy_cpix.element())
+
+    assert lazy_cpix._lazy_sections.keys() == {"periods"}
+    assert (
+        xml
+        == b'<CPIX xmlns="urn:dashif:org:cpix" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xmlns:pskc="urn:ietf:params:xml:ns:keyprov:pskc" xmlns:ds="http://www.w3.org/2000/09/xmldsig#" xmlns:enc="http://www.w3.org/2001/04/xmlenc#" xsi:schemaLocation="urn:dashif:org:cpix cpix.xsd"><ContentKeyPeriodList><ContentKeyPeriod id="test" index="0"/></ContentKeyPeriodList></CPIX>'
+    )
+
+    lazy_cpix.periods = cpix.PeriodList(cpix.Period(id="other", index=1))
+
+    xml = etree.tostring(lazy_cpix.element())
+
+    assert b'id="other" index="1"' in xml
+    assert b'id="test"' not in xml
+
+
+def test_trusted_parse():
+    complex_cpix_xml = cpix.CPIX(
+        content_keys=cpix.ContentKeyList(
+            cpix.ContentKey(
+                kid="0DC3EC4F-7683-548B-81E7-3C64E582E136",
+                cek="WADwG2qCqkq5TVml+U5PXw==",
+            ),
+        ),
+        drm_systems=cpix.DRMSystemList(
+            cpix.DRMSystem(
+                kid="0DC3EC4F-7683-548B-81E7-3C64E582E136",
+                system_id="EDEF8BA9-79D6-4ACE-A3C8-27DCD51D21ED",
+                pssh="AAAAMnBzc2gAAAAA7e+LqXnWSs6jyCfc1R0h7QAAABISEA3D7E92g1SLgec8ZOWC4TY=",
+            ),
+        ),
+        usage_rules=cpix.UsageRuleList(
+            cpix.UsageRule(
+                kid="0DC3EC4F-7683-548B-81E7-3C64E582E136",
+                filters=[cpix.KeyPeriodFilter(period_id="p0")],
+            ),
+        ),
+        periods=cpix.PeriodList(
+            cpix.Period(
+                id="p0", start="2018-08-06T00:00:00Z", end="2018-08-07T00:00:00Z"
+            ),
+        ),
+        delivery_datas=cpix.DeliveryDataList(
+            cpix.DeliveryData(
+                cpix.DeliveryKey("bm90X2FfcmVhbF9jZXJ0Cg=="),
+                cpix.DocumentKey("bm90X2FfcmVhbF9jaXBoZXJfdmFsdWUK"),
+            ),
+        ),
+    ).pretty_print()
+
+    trusted_cpix = cpix.CPIX.parse(complex_cpix_xml, trusted=True)
+
+    assert trusted_cpix == cpix.CPIX.parse(complex_cpix_xml)
+    assert trusted_cpix.content_keys[0].kid == UUID(
+        "0DC3EC4F-7683-548B-81E7-3C64E582E136")
+    assert trusted_cpix.drm_systems[0].system_id == cpix.WIDEVINE_SYSTEM_ID
+
+
+def test_trusted_parse_skips_checks():
+    xml = b'<ContentKey kid="0dc3ec4f-7683-548b-81e7-3c64e582e136"><Data><Secret xmlns="urn:ietf:params:xml:ns:keyprov:pskc"><PlainValue>not base64!</PlainValue></Secret></Data></ContentKey>'
+
+    with pytest.raises(ValueError):
+        cpix.parse(xml)
+
+    content_key = cpix.parse(xml, trusted=True)
+
+    assert content_key.cek == "not base64!"
+
+
+def test_parse_dispatch_on_section_tags():
+    xml = b'<ContentKeyUsageRule xmlns="urn:dashif:org:cpix" kid="0dc3ec4f-7683-548b-81e7-3c64e582e136"><VideoFilter minPixels="1"/><LabelFilter label="test"/></ContentKeyUsageRule>'
+
+    usage_rule = cpix.parse(xml)
+
+    assert isinstance(usage_rule, cpix.UsageRule)
+    assert usage_rule == cpix.UsageRule(
+        kid="0dc3ec4f-7683-548b-81e7-3c64e582e136",
+        filters=[cpix.VideoFilter(min_pixels=1), cpix.LabelFilter("test")],
+    )
+
+    period_list = cpix.parse(
+        b'<ContentKeyPeriodList><ContentKeyPeriod id="test" index="0"/></ContentKeyPeriodList>')
+
+    assert isinstance(period_list, cpix.PeriodList)
+    assert period_list[0].index == 0
+
+
+def test_parse_unknown_element():
+    with pytest.raises(ValueError):
+        cpix.parse(b'<NotCPIX/>')
+
+
+def test_parse_selected_kids():
+    two_key_cpix = cpix.CPIX(
+        content_keys=cpix.ContentKeyList(
+            cpix.ContentKey(
+                kid="0DC3EC4F-7683-548B-81E7-3C64E582E136",
+                cek="WADwG2qCqkq5TVml+U5PXw==",
+            ),
+            cpix.ContentKey(
+                kid="1447B7ED-2F66-572B-BD13-06CE7CF3610D",
+                cek="ydugVLA+K017XoGM4mjxvA==",
+            ),
+        ),
+        usage_rules=cpix.UsageRuleList(
+            cpix.AudioUsageRule(kid="0DC3EC4F-7683-548B-81E7-3C64E582E136"),
+            cpix.SDVideoUsageRule(kid="1447B7ED-2F66-572B-BD13-06CE7CF3610D"),
+        ),
+        periods=cpix.PeriodList(cpix.Period(id="p0", index=0)),
+    )
+    xml = two_key_cpix.pretty_print()
+
+    parsed = cpix.CPIX.parse(
+        xml, kids=[UUID("1447B7ED-2F66-572B-BD13-06CE7CF3610D")])
+    lazy = cpix.CPIX.parse(
+        xml, lazy=True, kids=["1447b7ed2f66572bbd1306ce7cf3610d"])
+
+    assert [key.kid for key in parsed.content_keys] == [
+        UUID("1447B7ED-2F66-572B-BD13-06CE7CF3610D")]
+    assert list(parsed.usage_rules) == [two_key_cpix.usage_rules[1]]
+    assert len(parsed.periods) == 1
+    assert list(lazy.content_keys) == list(parsed.content_keys)
+    assert list(lazy.usage_rules) == list(parsed.usage_rules)
+    assert b"0dc3ec4f" not in cpix.CPIX.parse(
+        xml, lazy=True, kids=["1447b7ed2f66572bbd1306ce7cf3610d"]).pretty_print()
+
+
+def test_parse_selected_sections():
+    xml = cpix.CPIX(
+        content_keys=cpix.ContentKeyList(
+            cpix.ContentKey(
+                kid="0DC3EC4F-7683-548B-81E7-3C64E582E136",
+                cek="WADwG2qCqkq5TVml+U5PXw==",
+            ),
+        ),
+        periods=cpix.PeriodList(cpix.Period(id="p0", index=0)),
+    ).pretty_print()
+
+    parsed = cpix.CPIX.parse(xml, sections={"ContentKeyPeriodList"})
+
+    assert len(parsed.content_keys) == 0
+    assert len(parsed.periods) == 1
+    with pytest.raises(ValueError):
+        cpix.CPIX.parse(xml, sections={"ContentKey"})
+
+
+def test_write_matches_pretty_print():
+    complex_cpix = cpix.CPIX(
+        content_id="abc",
+        content_keys=cpix.ContentKeyList(
+            cpix.ContentKey(
+                kid="0DC3EC4F-7683-548B-81E7-3C64E582E136",
+                cek="WADwG2qCqkq5TVml+U5PXw==",
+            ),
+            cpix.ContentKey(
+                kid="1447B7ED-2F66-572B-BD13-06CE7CF3610D",
+                cek="ydugVLA+K017XoGM4mjxvA==",
+            ),
+        ),
+        usage_rules=cpix.UsageRuleList(
+            cpix.UsageRule(
+                kid="0DC3EC4F-7683-548B-81E7-3C64E582E136",
+                filters=[cpix.KeyPeriodFilter(period_id="p0")],
+            ),
+        ),
+        periods=cpix.PeriodList(cpix.Period(id="p0", index=0)),
+        delivery_datas=cpix.DeliveryDataList(
+            cpix.DeliveryData(
+                cpix.DeliveryKey("bm90X2FfcmVhbF9jZXJ0Cg=="),
+                cpix.DocumentKey("bm90X2FfcmVhbF9jaXBoZXJfdmFsdWUK"),
+            ),
+        ),
+    )
+
+    for document in (complex_cpix, cpix.CPIX()):
+        for pretty in (True, False):
+            f = io.BytesIO()
+            document.write(f, pretty=pretty)
+            assert f.getvalue() == document.pretty_print(pretty_print=pretty)
+
+
+def test_writer():
+    content_key = cpix.ContentKey(
+        kid="0DC3EC4F-7683-548B-81E7-3C64E582E136",
+        cek="WADwG2qCqkq5TVml+U5PXw==",
+    )
+    drm_system = cpix.DRMSystem(
+        kid="0DC3EC4F-7683-548B-81E7-3C64E582E136",
+        system_id="EDEF8BA9-79D6-4ACE-A3C8-27DCD51D21ED",
+        pssh="AAAAMnBzc2gAAAAA7e+LqXnWSs6jyCfc1R0h7QAAABISEA3D7E92g1SLgec8ZOWC4TY=",
+    )
+    f = io.BytesIO()
+
+    with cpix.CPIXWriter(f, version="2.3") as writer:
+        writer.write(content_key)
+        writer.write(drm_system)
+        with pytest.raises(ValueError):
+            writer.write(content_key)
+
+    assert f.getvalue() == cpix.CPIX(
+        version="2.3",
+        content_keys=cpix.ContentKeyList(content_key),
+        drm_systems=cpix.DRMSystemList(drm_system),
+    ).pretty_print()
+
+
+def test_write_encodings():
+    document = cpix.CPIX(
+        content_id="caf\u00e9",
+        content_keys=cpix.ContentKeyList(
+            cpix.ContentKey(
+                kid="0DC3EC4F-7683-548B-81E7-3C64E582E136",
+                cek="WADwG2qCqkq5TVml+U5PXw==",
+            ),
+        ),
+    )
+
+    # utf-16 and utf-32 start with a byte order mark
+    for encoding in ("utf-16", "utf-32", "UTF-16BE", "ascii"):
+        f = io.BytesIO()
+        document.write(f, encoding=encoding)
+        assert f.getvalue() == document.pretty_print(encoding=encoding)
+
+
+def test_parallel_serialization():
+    kids = [UUID(int=i) for i in range(50)]
+    document = cpix.CPIX(
+        content_keys=cpix.ContentKeyList(
+            [cpix.ContentKey(kid, cek="WADwG2qCqkq5TVml+U5PXw==")
+             for kid in kids]),
+        usage_rules=cpix.UsageRuleList(
+            [cpix.AudioUsageRule(kid) for kid in kids]),
+    )
+    expected = cpix.CPIX.parse(document.pretty_print()).pretty_print()
+
+    assert document.pretty_print(workers=4) == expected
+    assert document.pretty_print(workers=2, pretty_print=False) == \
+        document.pretty_print(pretty_print=False)
+    # a byte order mark starts the document only
+    assert document.pretty_print(workers=3, encoding="utf-16") == \
+        document.pretty_print(encoding="utf-16")
+
+    for workers in (1, 3):
+        f = io.BytesIO()
+        with cpix.CPIXWriter(f) as writer:
+            writer.write_many(list(document.content_keys) +
+                              list(document.usage_rules),
+                              workers=workers, chunk_size=7)
+        assert f.getvalue() == expected
+
+    with pytest.raises(TypeError):
+        document.pretty_print(workers=2, xml_declaration=True)
+
+
+def test_canonical_bytes():
+    kids = [UUID(int=i) for i in (3, 1, 2)]
+    drm_system_id = "edef8ba9-79d6-4ace-a3c8-27dcd51d21ed"
+
+    def build(order):
+        return cpix.CPIX(
+            content_keys=cpix.ContentKeyList(
+                [cpix.ContentKey(kids[i]) for i in order]),
+            drm_systems=cpix.DRMSystemList(
+                [cpix.DRMSystem(kid=kids[i], system_id=drm_system_id,
+                                pssh="AAAA") for i in order]),
+            usage_rules=cpix.UsageRuleList(
+                [cpix.AudioUsageRule(kids[i]) for i in order]),
+        )
+
+    document = build([0, 1, 2])
+    canonical = document.to_canonical_bytes()
+
+    assert build([2, 1, 0]).to_canonical_bytes() == canonical
+    assert document.pretty_print(method="c14n2") == canonical
+    assert cpix.parse(document.pretty_print(), lazy=True) \
+        .to_canonical_bytes() == canonical
+    assert canonical.startswith(
+        b'<CPIX xmlns="urn:dashif:org:cpix" xmlns:xsi=')
+    assert canonical.index(str(kids[1]).encode()) < \
+        canonical.index(str(kids[0]).encode())
+    assert cpix.parse(canonical) == build([1, 2, 0])
@@ -0,0 +1,65 @@
+import json
+import pytest
+import cpix
+
+KID = "0dc3ec4f-7683-548b-81e7-3c64e582e136"
+
+
+def test_to_dict(make_cpix):
+    data = make_cpix().to_dict()
+
+    assert data["content_id"] == "movie & <extras>"
+    assert data["version"] == "2.3"
+    # values which aren't set are left out
+    assert data["content_keys"][0] == {
+        "kid": KID,
+        "cek": "WADwG2qCqkq5TVml+U5PXw==",
+        "common_encryption_scheme": "cenc",
+    }
+    assert data["periods"] == [
+        {
+            "id": "p0",
+            "start": "2018-08-06T00:00:00Z",
+            "end": "2018-08-07T00:00:00Z",
+        },
+        {"id": "p1", "index": 1},
+    ]
+    assert data["usage_rules"][1]["filters"] == [
+        {"type": "KeyPeriodFilter", "period_id": "p0"},
+        {"type": "LabelFilter", "label": '"main"\ttrack\n'},
+        {"type": "VideoFilter", "min_pixels": 1, "hdr": True, "wcg": False},
+        {"type": "AudioFilter", "max_channels": 2},
+        {"type": "BitrateFilter", "min_bitrate": 100},
+    ]
+    assert data["usage_rules"][2]["filters"] == []
+    assert data["delivery_datas"][0]["mac_method"] == {
+        "cipher_value": "bm90X2FfcmVhbF9tYWMK"}
+
+
+@pytest.mark.parametrize("trusted", [False, True])
+def test_from_dict(trusted, make_cpix):
+    document = make_cpix()
+
+    loaded = cpix.CPIX.from_dict(document.to_dict(), trusted=trusted)
+
+    assert loaded == document
+    assert loaded.pretty_print() == document.pretty_print()
+
+
+def test_json(make_cpix):
+    document = make_cpix()
+
+    assert document.to_json() == json.dumps(document.to_dict())
+    assert json.loads(document.to_json(indent=2)) == document.to_dict()
+    assert cpix.CPIX.from_json(document.to_json()) == document
+    assert cpix.CPIX().to_json() == "{}"
+
+    content_key = document.content_keys[0]
+    assert cpix.ContentKey.from_json(content_key.to_json()) == content_key
+    assert cpix.ContentKeyList.from_json(
+        document.content_keys.to_json(), trusted=True) == document.content_keys
+
+
+def test_from_dict_checks_values():
+    with pytest.raises(ValueError):
+        cpix.ContentKey.from_dict({"kid": KID, "cek": "not base64!"})
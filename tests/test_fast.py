@@ -0,0 +1,46 @@
+import pytest
+import cpix
+
+
+def test_fast_matches_lxml(make_cpix):
+    with_bytes = make_cpix()
+    drm_system = with_bytes.drm_systems[0]
+    drm_system.hls_signaling_data = b"AAAA"
+    drm_system.hls_signaling_data_master = b"AAAA"
+    drm_system.pssh = b"AAAA"
+    with_bytes.delivery_datas[0].delivery_key.certificate = b"AAAA"
+    with_bytes.delivery_datas[0].document_key.cipher_value = b"AAAA"
+    with_bytes.delivery_datas[0].mac_method.cipher_value = b"AAAA"
+    content_key = with_bytes.content_keys[1]
+    content_key.cek = content_key.explicit_iv = content_key.value_mac = \
+        b"AAAA"
+    for document in (make_cpix(), cpix.CPIX(), with_bytes):
+        for pretty in (True, False):
+            assert document.to_bytes(pretty, backend="fast") == \
+                document.to_bytes(pretty, backend="lxml")
+
+
+def test_fast_output_valid(make_cpix):
+    document = cpix.CPIX(periods=make_cpix().periods)
+
+    valid, error = cpix.validate(document.to_bytes(backend="fast"))
+
+    assert valid
+
+
+def test_unknown_backend(make_cpix):
+    with pytest.raises(ValueError):
+        make_cpix().to_bytes(backend="other")
+
+
+def test_fast_rejects_control_characters():
+    label = cpix.UsageRuleList(cpix.UsageRule(
+        kid="0DC3EC4F-7683-548B-81E7-3C64E582E136",
+        filters=[cpix.LabelFilter(label="a\x0bb")]))
+    for document in (cpix.CPIX(content_id="a\x01b"),
+                     cpix.CPIX(periods=cpix.PeriodList(
+                         cpix.Period(id="p\uffff"))),
+                     cpix.CPIX(usage_rules=label)):
+        for backend in ("fast", "lxml"):
+            with pytest.raises(ValueError):
+                document.to_bytes(backend=backend)
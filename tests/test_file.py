@@ -0,0 +1,88 @@
+import mmap
+import pytest
+import cpix
+
+
+def test_parse_file_path(tmp_path, make_cpix):
+    path = tmp_path / "cpix.xml"
+    path.write_bytes(make_cpix().pretty_print())
+
+    assert cpix.parse_file(path) == make_cpix()
+    assert cpix.parse_file(str(path)) == make_cpix()
+
+
+def test_parse_file_object(tmp_path, make_cpix):
+    path = tmp_path / "cpix.xml"
+    path.write_bytes(make_cpix().pretty_print())
+
+    with open(path, "rb") as f:
+        assert cpix.parse_file(f) == make_cpix()
+
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            assert cpix.parse_file(m) == make_cpix()
+
+
+def test_parse_file_dispatches_on_root(tmp_path, make_cpix):
+    path = tmp_path / "content_key.xml"
+    path.write_bytes(make_cpix().content_keys[0].pretty_print())
+
+    content_key = cpix.parse_file(path)
+
+    assert isinstance(content_key, cpix.ContentKey)
+    assert content_key.cek == "WADwG2qCqkq5TVml+U5PXw=="
+
+
+def test_validate_file(tmp_path):
+    path = tmp_path / "cpix.xml"
+    path.write_bytes(cpix.CPIX(
+        periods=cpix.PeriodList(cpix.Period(id="test", index=0))
+    ).pretty_print())
+
+    assert cpix.validate_file(path)[0]
+
+
+def test_validate_file_invalid(tmp_path):
+    path = tmp_path / "cpix.xml"
+    path.write_bytes(b'<CPIX xmlns="urn:dashif:org:cpix"><Unknown/></CPIX>')
+
+    assert not cpix.validate_file(path)[0]
+
+
+def test_write_compressed(tmp_path, make_cpix):
+    document = make_cpix()
+
+    for compression, extension in (("gzip", ".gz"), ("xz", ".xz"),
+                                   ("bz2", ".bz2")):
+        path = tmp_path / ("cpix.xml" + extension)
+        document.write(path)
+        opener = cpix.compression.OPENERS[compression]
+
+        assert cpix.compression.detect(path) == compression
+        with opener(path, "rb") as f:
+            assert f.read() == document.pretty_print()
+        assert cpix.parse_file(path) == document
+        assert cpix.parse_file(str(path), lazy=True) == document
+
+        path = tmp_path / "cpix.xml"
+        document.write(path, compression=compression)
+        with open(path, "rb") as f:
+            assert cpix.parse_file(f) == document
+        assert list(cpix.iterparse(str(path))) == [
+            *document.delivery_datas, *document.content_keys,
+            *document.drm_systems, *document.periods, *document.usage_rules]
+
+
+def test_write_uncompressed(tmp_path, make_cpix):
+    document = make_cpix()
+    path = tmp_path / "cpix.xml"
+
+    document.write(path)
+    assert path.read_bytes() == document.pretty_print()
+
+    with open(path, "wb") as f:
+        document.write(f, compression=None)
+    assert path.read_bytes() == document.pretty_print()
+
+    with pytest.raises(ValueError):
+        document.write(path, compression="zip")
@@ -0,0 +1,86 @@
+import uuid
+import cpix
+
+KIDS = [uuid.UUID("0dc3ec4f-7683-548b-81e7-3c64e582e136"),
+        uuid.UUID("1447b7ed-2f66-572b-bd13-06ce7cf3610d")]
+UNKNOWN_KID = uuid.UUID(int=100)
+PLAYREADY = cpix.PLAYREADY_SYSTEM_ID
+WIDEVINE = cpix.WIDEVINE_SYSTEM_ID
+
+
+def test_indexes(make_cpix):
+    document = make_cpix()
+
+    assert document.content_keys.by_kid[KIDS[1]] is \
+        document.content_keys[1]
+    assert document.content_keys.by_kid[str(KIDS[1])] is \
+        document.content_keys[1]
+    assert "not a kid" not in document.content_keys.by_kid
+    assert document.drm_systems.by_kid_and_system[
+        (str(KIDS[1]), WIDEVINE)] is document.drm_systems[2]
+    assert document.drm_systems.by_system[WIDEVINE] == \
+        document.drm_systems[0::2]
+    assert document.drm_systems.by_system[PLAYREADY] == \
+        document.drm_systems[1:2]
+    assert document.usage_rules.by_kid[KIDS[0]] == \
+        document.usage_rules[:2]
+    assert UNKNOWN_KID not in document.usage_rules.by_kid
+
+
+def test_indexes_follow_changes(make_cpix):
+    document = make_cpix()
+    content_keys = document.content_keys
+    by_kid = content_keys.by_kid
+    assert len(by_kid) == 2
+
+    content_keys.append(cpix.ContentKey(UNKNOWN_KID))
+    assert content_keys.by_kid[UNKNOWN_KID] is content_keys[2]
+
+    content_keys[2].kid = uuid.UUID(int=101)
+    assert UNKNOWN_KID not in content_keys.by_kid
+    assert uuid.UUID(int=101) in content_keys.by_kid
+
+    del content_keys[0]
+    assert KIDS[0] not in content_keys.by_kid
+    assert document.check_usage_rules() == (
+        False, ["usage rule references missing kid: {}".format(KIDS[0])] * 2)
+
+    document.usage_rules[0].kid = KIDS[1]
+    assert len(document.usage_rules.by_kid[KIDS[1]]) == 2
+
+
+def test_held_index_follows_changes(make_cpix):
+    document = make_cpix()
+    by_kid = document.content_keys.by_kid
+    by_system = document.drm_systems.by_system
+    usage_rules = document.usage_rules.by_kid
+    assert len(by_kid) == 2
+
+    document.content_keys.append(cpix.ContentKey(UNKNOWN_KID))
+    del document.drm_systems[1]
+    document.usage_rules[2].kid = KIDS[0]
+
+    assert by_kid[UNKNOWN_KID] is document.content_keys[2]
+    assert len(by_kid) == 3
+    assert PLAYREADY not in by_system
+    assert usage_rules[KIDS[0]] == document.usage_rules[:]
+    assert KIDS[1] not in usage_rules
+
+
+def test_table_by_kid(make_cpix):
+    table = cpix.ContentKeyTable.from_list(make_cpix().content_keys)
+
+    assert table.by_kid[KIDS[1]] == table[1]
+    assert list(table.by_kid) == KIDS
+    assert UNKNOWN_KID not in table.by_kid
+
+
+def test_repr_builds_no_index(make_cpix):
+    document = make_cpix()
+    table = cpix.ContentKeyTable.from_list(document.content_keys)
+    for value in (document, table):
+        assert "by_kid" not in repr(value)
+    assert "by_system" not in repr(document.drm_systems)
+    for value in (document.content_keys, document.drm_systems,
+                  document.usage_rules):
+        assert value._indexes_or_none() is None
@@ -0,0 +1,63 @@
+import threading
+import cpix
+from cpix import parser
+
+
+def test_parser_reused():
+    assert parser.get_parser() is parser.get_parser()
+
+
+def test_parser_per_thread():
+    parsers = []
+    thread = threading.Thread(
+        target=lambda: parsers.append(parser.get_parser()))
+    thread.start()
+    thread.join()
+
+    assert parsers[0] is not parser.get_parser()
+
+
+def test_settings_change_replaces_parser():
+    old_parser = parser.get_parser()
+    parser.settings.huge_tree = True
+    try:
+        assert parser.get_parser() is not old_parser
+        assert parser.settings.options()["huge_tree"]
+    finally:
+        parser.settings.huge_tree = False
+
+
+def test_blank_text_removed():
+    xml = cpix.CPIX(periods=cpix.PeriodList(
+        cpix.Period(id="p0", index=0))).pretty_print()
+
+    element = parser.fromstring(xml)
+
+    assert element.text is None
+    assert element[0].tail is None
+
+
+def test_entities_not_resolved(tmp_path):
+    secret = tmp_path / "secret"
+    secret.write_text("secret")
+    xml = """<!DOCTYPE Label [<!ENTITY e SYSTEM "{path}">]>
+<Label>&e;</Label>""".format(path=secret.as_uri())
+
+    element = parser.fromstring(xml)
+
+    assert "secret" not in (element.text or "")
+
+
+def test_cached_fragments_use_parser(monkeypatch, make_cpix):
+    document = make_cpix()
+    document.pretty_print()
+    document.pretty_print(pretty_print=False)
+    parsers = []
+    get_parser = parser.get_parser
+    monkeypatch.setattr(
+        parser, "get_parser",
+        lambda: parsers.append(get_parser()) or parsers[-1])
+
+    document.element()
+
+    assert parsers and all(p is get_parser() for p in parsers)
@@ -0,0 +1,63 @@
+import copy
+import pickle
+import cpix
+
+
+def test_pickle_round_trip(make_cpix):
+    document = make_cpix()
+
+    loaded = pickle.loads(pickle.dumps(document))
+
+    assert loaded == document
+    assert loaded.pretty_print() == document.pretty_print()
+    assert type(loaded.usage_rules[0]) is cpix.AudioUsageRule
+    assert type(loaded.usage_rules[1]) is cpix.UsageRule
+    assert copy.deepcopy(document) == document
+
+
+def test_pickle_items(make_cpix):
+    document = make_cpix()
+
+    for item in (document.content_keys[0], document.drm_systems[0],
+                 document.periods[0], document.usage_rules[1]):
+        loaded = pickle.loads(pickle.dumps(item))
+        assert type(loaded) is type(item)
+        assert loaded == item
+
+    loaded = pickle.loads(pickle.dumps(document.content_keys))
+    loaded[0].cek = "AAAAAAAAAAAAAAAAAAAAAg=="
+    assert loaded != document.content_keys
+
+
+def test_pickle_lazy(make_cpix):
+    document = make_cpix()
+    lazy = cpix.parse(document.pretty_print(), lazy=True)
+    lazy.content_keys
+
+    loaded = pickle.loads(pickle.dumps(lazy))
+
+    assert "content_keys" not in loaded._lazy_sections
+    assert "drm_systems" in loaded._lazy_sections
+    assert loaded.pretty_print() == lazy.pretty_print()
+    assert loaded == lazy
+
+
+def test_slots(make_cpix):
+    document = make_cpix()
+    delivery_data = document.delivery_datas[0]
+    video_filter = cpix.VideoFilter(max_pixels=442368, hdr=True)
+    objects = [document.content_keys, document.content_keys[0],
+               document.drm_systems[0], document.periods[0],
+               document.usage_rules[0], document.usage_rules[1],
+               delivery_data, delivery_data.delivery_key, video_filter]
+
+    for obj in objects:
+        assert not hasattr(obj, "__dict__")
+        assert copy.copy(obj) == obj
+        assert copy.deepcopy(obj) == obj
+        assert pickle.loads(pickle.dumps(obj)) == obj
+
+    copied = copy.deepcopy(video_filter)
+    copied.hdr = False
+    assert copied != video_filter
+    assert video_filter.hdr is True
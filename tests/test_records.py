@@ -0,0 +1,70 @@
+import uuid
+from base64 import b64encode
+import pytest
+import cpix
+
+KID = uuid.UUID("0dc3ec4f-7683-548b-81e7-3c64e582e136")
+CEK = bytes(range(16))
+PSSH = bytes(range(32))
+
+
+def test_content_key_records():
+    content_keys = cpix.ContentKeyList.from_records([
+        (KID.bytes, CEK),
+        (str(KID), b64encode(CEK).decode("ascii"), "cbcs",
+         memoryview(CEK), None),
+    ])
+
+    assert content_keys == cpix.ContentKeyList([
+        cpix.ContentKey(KID, b64encode(CEK).decode("ascii")),
+        cpix.ContentKey(KID, b64encode(CEK).decode("ascii"), "cbcs",
+                        b64encode(CEK).decode("ascii")),
+    ])
+    table = cpix.ContentKeyTable.from_records([(KID, CEK)])
+    assert isinstance(table, cpix.ContentKeyTable)
+    assert table == cpix.ContentKeyList(content_keys[:1])
+
+
+def test_content_key_record_errors():
+    with pytest.raises(ValueError, match="record 1"):
+        cpix.ContentKeyList.from_records([(KID, CEK), (b"short", CEK)])
+    with pytest.raises(ValueError, match="record 0"):
+        cpix.ContentKeyList.from_records([(KID, "not base64!")])
+    with pytest.raises(TypeError, match="record 1"):
+        cpix.ContentKeyList.from_records([(KID,), (KID, None, "aes")])
+    with pytest.raises(ValueError, match="record 0"):
+        cpix.ContentKeyList.from_records([()])
+
+
+def test_drm_system_records():
+    drm_systems = cpix.DRMSystemList.from_records(
+        [(KID.bytes, cpix.WIDEVINE_SYSTEM_ID.bytes, PSSH)])
+
+    assert drm_systems == cpix.DRMSystemList([
+        cpix.DRMSystem(KID, cpix.WIDEVINE_SYSTEM_ID,
+                       b64encode(PSSH).decode("ascii"))])
+    with pytest.raises(ValueError, match="record 1: system_id is unknown"):
+        cpix.DRMSystemList.from_records(
+            [(KID, cpix.WIDEVINE_SYSTEM_ID), (KID, uuid.UUID(int=1))])
+
+
+def test_usage_rule_records():
+    usage_rules = cpix.UsageRuleList.from_records(
+        [(KID.bytes,), (KID, [cpix.VideoFilter()], "VIDEO")])
+
+    assert usage_rules == cpix.UsageRuleList([
+        cpix.UsageRule(KID),
+        cpix.UsageRule(KID, [cpix.VideoFilter()], "VIDEO")])
+    with pytest.raises(TypeError, match="record 0"):
+        cpix.UsageRuleList.from_records([(KID, ["not a filter"])])
+
+
+def test_list_setter():
+    content_keys = cpix.ContentKeyList()
+    content_key = cpix.ContentKey(KID)
+
+    content_keys.list = [content_key]
+
+    assert content_keys.list == [content_key]
+    with pytest.raises(TypeError):
+        content_keys.list = [cpix.Period("p1")]
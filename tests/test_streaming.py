@@ -0,0 +1,62 @@
+import cpix
+
+
+def test_iterparse_matches_parse(make_cpix):
+    xml = make_cpix().pretty_print()
+    parsed = cpix.CPIX.parse(xml)
+
+    items = list(cpix.iterparse(xml))
+
+    assert [type(item) for item in items] == [
+        cpix.DeliveryData,
+        cpix.ContentKey,
+        cpix.ContentKey,
+        cpix.DRMSystem,
+        cpix.DRMSystem,
+        cpix.DRMSystem,
+        cpix.Period,
+        cpix.Period,
+        cpix.UsageRule,
+        cpix.UsageRule,
+        cpix.UsageRule,
+    ]
+    assert items[0:1] == list(parsed.delivery_datas)
+    assert items[1:3] == list(parsed.content_keys)
+    assert items[3:6] == list(parsed.drm_systems)
+    assert items[6:8] == list(parsed.periods)
+    assert items[8:11] == list(parsed.usage_rules)
+
+
+def test_iterparse_file(tmp_path, make_cpix):
+    path = tmp_path / "cpix.xml"
+    path.write_bytes(make_cpix().pretty_print())
+
+    kids = [item.kid for item in cpix.iterparse(str(path))
+            if isinstance(item, cpix.ContentKey)]
+
+    assert kids == [key.kid for key in make_cpix().content_keys]
+
+
+def test_feed_parser(make_cpix):
+    xml = make_cpix().pretty_print()
+    parser = cpix.CPIXFeedParser()
+
+    items = []
+    for i in range(0, len(xml), 64):
+        items.extend(parser.feed(xml[i:i + 64]))
+    items.extend(parser.close())
+
+    assert items == list(cpix.iterparse(xml))
+
+
+def test_feed_parser_emits_completed_items(make_cpix):
+    xml = make_cpix().pretty_print()
+    end_of_first_key = xml.index(b"</ContentKey>") + len(b"</ContentKey>")
+    parser = cpix.CPIXFeedParser()
+
+    items = parser.feed(xml[:end_of_first_key])
+
+    document = make_cpix()
+    assert items == [document.delivery_datas[0], document.content_keys[0]]
+    assert len(parser.feed(xml[end_of_first_key:])) == 9
+    assert parser.close() == []